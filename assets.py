@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built
+    brotli = None
+
+# Everything the pages and game_client.js load from this server. Nothing outside this list is served.
+ASSET_FILES = ["index.css", "game_client.js", "bg.m4a"] + [f"explosion-{i}.mp3" for i in range(1, 6)]
+
+# Text assets get precompressed variants; audio is already compressed
+COMPRESSIBLE = (".css", ".js")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("audio/mp4", ".m4a")
+mimetypes.add_type("text/javascript", ".js")
+
+@dataclass
+class Asset:
+    name: str
+    body: bytes
+    digest: str
+    content_type: str
+    # Content-Encoding -> precompressed body, only when smaller than the original
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def url(self) -> str:
+        stem, ext = os.path.splitext(self.name)
+        return f"/assets/{stem}.{self.digest}{ext}"
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+# Loaded once at startup: every file is hashed, held in memory and compressed ahead of time.
+# Fingerprinted URLs (/assets/name.<hash>.ext) never change content, so they are cached for a year;
+# the plain names stay available for old clients and revalidate through the ETag.
+class AssetManifest:
+    def __init__(self, assets: List[Asset]):
+        self.assets: Dict[str, Asset] = {a.name: a for a in assets}
+        self.fingerprinted: Dict[str, Asset] = {a.url.rsplit("/", 1)[1]: a for a in assets}
+
+    @classmethod
+    def load(cls, root: str = ".", names: List[str] = ASSET_FILES) -> "AssetManifest":
+        assets = []
+        for name in names:
+            path = os.path.join(root, name)
+            if not os.path.exists(path):
+                print(f"Asset missing: {path}")
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            asset = Asset(name=name, body=body, digest=hashlib.sha256(body).hexdigest()[:12],
+                          content_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+            if name.endswith(COMPRESSIBLE):
+                candidates = {"gzip": gzip.compress(body, 9, mtime=0)}
+                if brotli is not None:
+                    candidates["br"] = brotli.compress(body, quality=11)
+                asset.variants = {enc: data for enc, data in candidates.items() if len(data) < len(body)}
+            assets.append(asset)
+        return cls(assets)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.assets)
+
+    def url(self, name: str) -> str:
+        asset = self.assets.get(name)
+        return asset.url if asset else f"/{name}"
+
+    def urls(self) -> Dict[str, str]:
+        return {name: asset.url for name, asset in self.assets.items()}
+
+    def serve(self, headers, name: str, fingerprinted: bool = False) -> Response:
+        asset = (self.fingerprinted if fingerprinted else self.assets).get(name)
+        if asset is None:
+            return Response(status_code=404)
+        cache = IMMUTABLE if fingerprinted else REVALIDATE
+
+        # Byte ranges are served from the identity body (media seeking); compressed bodies are whole-file only
+        range_header = headers.get("range")
+        if range_header and headers.get("if-range", asset.etag()) == asset.etag():
+            return self._range(asset, range_header, cache)
+
+        encoding = self._encoding(asset, headers.get("accept-encoding", ""))
+        etag = asset.etag(encoding)
+        response_headers = {"ETag": etag, "Cache-Control": cache, "Accept-Ranges": "bytes"}
+        if asset.variants:
+            response_headers["Vary"] = "Accept-Encoding"
+        if {etag, "*"} & set(_etags(headers.get("if-none-match", ""))):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        body = asset.variants[encoding] if encoding else asset.body
+        return Response(body, media_type=asset.content_type, headers=response_headers)
+
+    def _encoding(self, asset: Asset, accept: str) -> Optional[str]:
+        offered = {}
+        for part in accept.split(","):
+            token, _, params = part.strip().partition(";")
+            q = params.strip()[2:] if params.strip().startswith("q=") else "1"
+            try:
+                offered[token.strip().lower()] = float(q)
+            except ValueError:
+                continue
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and offered.get(encoding, offered.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def _range(self, asset: Asset, range_header: str, cache: str) -> Response:
+        size = len(asset.body)
+        headers = {"ETag": asset.etag(), "Cache-Control": cache, "Accept-Ranges": "bytes"}
+        match = RANGE_RE.match(range_header.strip())
+        # Multi-range and malformed headers are answered with the whole body, which RFC 9110 allows
+        if not match or match.groups() == ("", ""):
+            return Response(asset.body, media_type=asset.content_type, headers=headers)
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+        if start >= size or start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(asset.body[start:end + 1], status_code=206, media_type=asset.content_type, headers=headers)
+
+def _etags(header: str) -> List[str]:
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
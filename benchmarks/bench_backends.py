@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import GameManager
+from memory_backend import MemoryGameManager
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_backends.py [iterations] [redis|memory ...]
+# Submit-to-ack latency: from calling submit_word until the word_cleared event reaches a subscribed socket queue.
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+BACKENDS = sys.argv[2:] or ["redis", "memory"]
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+async def wait_for_clear(sub, wid):
+    while True:
+        msg = json.loads(await sub.get())
+        events = msg["events"] if msg["type"] == "batch" else [msg]
+        if any(e["type"] == "word_cleared" and e["word_id"] == wid for e in events):
+            return
+
+async def measure(gm):
+    await gm.load_scripts()
+    code, host = await gm.create_game("Bench", "easy", [])
+    await gm.join_game(code, "Rival")
+    await gm.set_game_status(code, "playing")
+    sub = await gm.events.subscribe(f"game:{code}:events")
+
+    samples = []
+    for i in range(ITERATIONS):
+        wid = f"w{i:07d}"
+        await gm.add_word(code, host, {"text": f"WORD{i}", "id": wid, "x": 0, "y": 10.0, "vx": 0.0, "vy": None,
+                                       "spawn_time": time.time(), "duration": 60.0, "is_special": False})
+        start = time.perf_counter()
+        await gm.submit_word(code, host, f"WORD{i}")
+        await asyncio.wait_for(wait_for_clear(sub, wid), 5)
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    await gm.events.unsubscribe(sub)
+    if gm.redis is not None:
+        for key in await gm.redis.keys(f"game:{code}*"):
+            await gm.redis.delete(key)
+    return samples
+
+async def main():
+    print(f"{'backend':<10} {'mean us':>10} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    for backend in BACKENDS:
+        if backend == "memory":
+            gm = MemoryGameManager()
+        else:
+            gm = GameManager(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        samples = await measure(gm)
+        print(f"{backend:<10} {statistics.mean(samples):>10.1f} {percentile(samples, 0.5):>10.1f} "
+              f"{percentile(samples, 0.95):>10.1f} {percentile(samples, 0.99):>10.1f}")
+        await gm.events.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
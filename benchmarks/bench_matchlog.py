@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_wire import record_match
+from matchlog import MatchReader, MatchStats, MatchWriter
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_matchlog.py [matches]
+# Records one match against Redis, writes it out as many match logs and compares them with JSON lines,
+# then reads every log back and folds them into one set of statistics, reporting the peak memory of the pass.
+MATCHES = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+def main():
+    frames = asyncio.run(record_match())
+    # Spread the frames over a minute of match time, as the recorder would stamp them
+    records = [(1_000_000 + i * 60_000 // len(frames), frame) for i, frame in enumerate(frames)]
+    events = sum(len(msg["events"]) if msg.get("type") == "batch" else 1 for msg in map(json.loads, frames))
+    json_bytes = sum(len(frame.encode()) + 1 for frame in frames)
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        for i in range(MATCHES):
+            writer = MatchWriter(os.path.join(root, f"M{i:04d}.tdm"), f"M{i:04d}", "hard", 1_000_000)
+            writer.write(records)
+            writer.close()
+        write_s = time.perf_counter() - start
+        log_bytes = os.path.getsize(os.path.join(root, "M0000.tdm"))
+
+        start = time.perf_counter()
+        with MatchReader(os.path.join(root, "M0000.tdm")) as reader:
+            decoded = sum(1 for _ in reader)
+        read_one_s = time.perf_counter() - start
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        stats = MatchStats()
+        for name in sorted(os.listdir(root)):
+            stats.add(os.path.join(root, name))
+        stats_s = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    assert decoded == events
+    print(f"one match: {len(frames)} frames, {events} events")
+    print(f"{'format':<12} {'bytes':>8} {'bytes/event':>12}")
+    print(f"{'json lines':<12} {json_bytes:>8} {json_bytes / events:>12.1f}")
+    print(f"{'match log':<12} {log_bytes:>8} {log_bytes / events:>12.1f}")
+    print(f"match log is {log_bytes / json_bytes:.1%} of json lines")
+    print(f"write: {MATCHES * events / write_s:,.0f} events/s   read: {decoded / read_one_s:,.0f} events/s")
+    print(f"stats over {MATCHES} logs: {stats_s:.2f}s, {MATCHES * events / stats_s:,.0f} events/s, "
+          f"peak memory {peak / 1024:.0f} KiB")
+    print(json.dumps(stats.summary()))
+
+if __name__ == "__main__":
+    main()
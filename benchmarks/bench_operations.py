@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from game import GameManager
+from instrumented import RoundTripCounter
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_operations.py [--iterations 100] [--budgets benchmarks/budgets.json]
+# Times each GameManager operation at several player and active-word counts, counts the Redis round trips
+# and commands every call makes, and exits non-zero when a row is over its budget. Budgets are per call:
+# round_trips, commands (+ commands_per_player * players) and optionally us (mean microseconds).
+PLAYER_COUNTS = [1, 2]
+WORD_COUNTS = [0, 50, 500]
+
+def word(text, wid, duration=600.0, spawn_time=None):
+    return {"text": text, "id": wid, "x": 0, "y": 10.0, "vx": 0.0, "vy": None,
+            "spawn_time": spawn_time or time.time(), "duration": duration, "is_special": False}
+
+class Row:
+    def __init__(self, label, players, words):
+        self.label = label
+        self.players = players
+        self.words = words
+        self.calls = 0
+        self.round_trips = 0
+        self.commands = 0
+        self.samples = []
+
+    def per_call(self):
+        return self.round_trips / self.calls, self.commands / self.calls, sum(self.samples) / len(self.samples)
+
+    def over_budget(self, budget):
+        trips, commands, us = self.per_call()
+        limits = []
+        if "round_trips" in budget and trips > budget["round_trips"]:
+            limits.append(f"{trips:.2f} round trips > {budget['round_trips']}")
+        allowed = budget.get("commands", 0) + budget.get("commands_per_player", 0) * self.players
+        if ("commands" in budget or "commands_per_player" in budget) and commands > allowed:
+            limits.append(f"{commands:.2f} commands > {allowed}")
+        if "us" in budget and us > budget["us"]:
+            limits.append(f"{us:.1f} us > {budget['us']}")
+        return limits
+
+async def measure(counter, row, op, iterations, prepare=None):
+    # Only the operation itself is timed and counted; prepare() seeds whatever the next call consumes
+    for i in range(iterations):
+        if prepare:
+            await prepare(i)
+        trips_before, commands_before = counter.snapshot()
+        start = time.perf_counter()
+        await op(i)
+        row.samples.append((time.perf_counter() - start) * 1e6)
+        trips_after, commands_after = counter.snapshot()
+        row.round_trips += trips_after - trips_before
+        row.commands += commands_after - commands_before
+        row.calls += 1
+    return row
+
+async def fill(gm, code, pid, count, prefix):
+    async with gm.redis.pipeline(transaction=False) as pipe:
+        for i in range(count):
+            gm._store_word(pipe, code, pid, word(f"{prefix}{i}", f"{prefix.lower()}{i:05d}"))
+        await pipe.execute()
+
+async def scenario(gm, counter, players, words, iterations):
+    code, host = await gm.create_game("Bench", "easy", [])
+    pids = [host] + [await gm.join_game(code, f"Rival{n}") for n in range(players - 1)]
+    await gm.set_game_status(code, "playing")
+    for n, pid in enumerate(pids):
+        await fill(gm, code, pid, words, f"FILL{n}X")
+    target = pids[-1]
+
+    async def seed_hit(i):
+        await gm.add_word(code, host, word(f"HIT{i}", f"hit{i:05d}"))
+
+    async def warm_state(i):
+        if i == 0:
+            await gm.get_game_state_cached(code)
+
+    async def drop_state(i):
+        gm.state_cache.pop(code, None)
+
+    async def warm_roster(i):
+        if i == 0:
+            await gm._rosters([code])
+
+    rows = [
+        await measure(counter, Row("submit_word (hit)", players, words),
+                      lambda i: gm.submit_word(code, host, f"HIT{i}"), iterations, seed_hit),
+        await measure(counter, Row("submit_word (miss)", players, words),
+                      lambda i: gm.submit_word(code, host, "NOPE"), iterations),
+        # The roster the script is handed is read once per started game, by its first tick or blow, and kept
+        await measure(counter, Row("damage_player", players, words),
+                      lambda i: gm.damage_player(code, target, 0), iterations, warm_roster),
+        await measure(counter, Row("_spawn_word", players, words),
+                      lambda i: gm._spawn_word(code, target, f"SPAWN{i}", duration=600.0), iterations),
+        # The host check on start_game, with the local copy still current (warmed before the first call)
+        await measure(counter, Row("get_game_state_cached (hit)", players, words),
+                      lambda i: gm.get_game_state_cached(code), iterations, warm_state),
+        # The same check without a current local copy, so every call fetches the full state again
+        await measure(counter, Row("get_game_state_cached (miss)", players, words),
+                      lambda i: gm.get_game_state_cached(code), iterations, drop_state),
+        # One pass of start_game_loop's tick callback
+        await measure(counter, Row("tick_game", players, words), lambda i: gm.tick_game(code), iterations),
+    ]
+    if players > 1:
+        # The opponent's word keys come from the roster kept for the game since its first tick
+        rows.append(await measure(counter, Row("trigger_power (barrage)", players, words),
+                                  lambda i: gm.trigger_power(code, host, "barrage"), iterations))
+
+    # One overdue word per player, swept in a single pass (the barrage and tick words are not due yet).
+    # Health is topped up so the sweep never ends the match, which also ranks it once.
+    async def seed_overdue(i):
+        for pid in pids:
+            await gm.redis.hset(gm._player_key(code, pid), "health", 100)
+            await gm.add_word(code, pid, word(f"OLD{i}", f"old{i:05d}", duration=1.0, spawn_time=time.time() - 60))
+    rows.append(await measure(counter, Row("expire_due_words", players, words),
+                              lambda i: gm.expire_due_words(), min(iterations, 20), seed_overdue))
+
+    for key in await gm.redis.keys(f"game:{code}*"):
+        await gm.redis.delete(key)
+    # Words still queued for expiry would otherwise come due during the next scenario's sweep
+    stale = [m for m in await gm.redis.zrange("words:deadlines", 0, -1) if m.startswith(f"{code}:")]
+    if stale:
+        await gm.redis.zrem("words:deadlines", *stale)
+    return rows
+
+async def main(args):
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+
+    gm = GameManager(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    await gm.load_scripts()
+    counter = RoundTripCounter(gm.redis)
+
+    created = []
+    async def create(i):
+        created.append((await gm.create_game("Bench", "easy", []))[0])
+    rows = [await measure(counter, Row("create_game", 1, 0), create, args.iterations)]
+
+    lobbies = []
+    async def open_lobby(i):
+        lobbies.append((await gm.create_game("Bench", "easy", []))[0])
+    rows.append(await measure(counter, Row("join_game", 2, 0), lambda i: gm.join_game(lobbies[i], "Rival"),
+                              args.iterations, open_lobby))
+
+    for players in PLAYER_COUNTS:
+        for words in WORD_COUNTS:
+            rows.extend(await scenario(gm, counter, players, words, args.iterations))
+
+    for c in created + lobbies:
+        for key in await gm.redis.keys(f"game:{c}*"):
+            await gm.redis.delete(key)
+    await gm.events.close()
+
+    print(f"{'operation':<24} {'players':>7} {'words':>6} {'trips/op':>9} {'cmds/op':>8} {'us/op':>9} {'p95 us':>9}  budget")
+    failures = []
+    for row in rows:
+        trips, commands, us = row.per_call()
+        p95 = sorted(row.samples)[min(len(row.samples) - 1, int(len(row.samples) * 0.95))]
+        budget = budgets.get(row.label)
+        over = row.over_budget(budget) if budget else []
+        status = "-" if budget is None else ("OVER" if over else "ok")
+        print(f"{row.label:<24} {row.players:>7} {row.words:>6} {trips:>9.2f} {commands:>8.2f} {us:>9.1f} {p95:>9.1f}  {status}")
+        failures.extend(f"{row.label} ({row.players} players, {row.words} words): {limit}" for limit in over)
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"Budget exceeded: {failure}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time GameManager operations and check their Redis budgets")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--budgets", default=os.path.join(ROOT, "benchmarks", "budgets.json"))
+    asyncio.run(main(parser.parse_args()))
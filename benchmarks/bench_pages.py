@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpx import AsyncClient, ASGITransport
+from main import app, gm, landing_page, lobby_page, rt
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_pages.py [requests]
+# Requests per second through the ASGI app for the landing and lobby pages, cached against the old
+# per-request component render (mounted here under /uncached for comparison).
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+@rt('/uncached/')
+def get():
+    return landing_page()
+
+@rt('/uncached/lobby/{code}')
+async def get(code: str, pid: str):
+    game = await gm.get_game_state(code)
+    is_host = game["host_id"] == pid
+    return lobby_page(code, pid, "true" if is_host else "false", "" if is_host else "display: none;")
+
+async def rate(client, url, n=REQUESTS):
+    await client.get(url)
+    start = time.perf_counter()
+    for _ in range(n):
+        res = await client.get(url)
+        assert res.status_code == 200, res.status_code
+    return n / (time.perf_counter() - start)
+
+async def main():
+    await gm.load_scripts()
+    code, pid = await gm.create_game("Bench", "easy", [])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        rows = [
+            ("landing, rendered per request", "/uncached/"),
+            ("landing, pre-rendered", "/"),
+            ("lobby, rendered per request", f"/uncached/lobby/{code}?pid={pid}"),
+            ("lobby, template", f"/lobby/{code}?pid={pid}"),
+        ]
+        print(f"{'page':<32} {'req/s':>10}")
+        for label, url in rows:
+            print(f"{label:<32} {await rate(client, url):>10.0f}")
+        etag = (await client.get("/")).headers["etag"]
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await client.get("/", headers={"If-None-Match": etag})
+        print(f"{'landing, 304 revalidation':<32} {REQUESTS / (time.perf_counter() - start):>10.0f}")
+    await gm.events.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import GameManager
+from instrumented import RoundTripCounter
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_round_trips.py [iterations]
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+def word(text, wid, duration=10.0, spawn_time=None):
+    return {"text": text, "id": wid, "x": 0, "y": 10.0, "vx": 0.0, "vy": None,
+            "spawn_time": spawn_time or time.time(), "duration": duration, "is_special": False}
+
+async def measure(counter, label, op, n):
+    counter.reset()
+    start = time.perf_counter()
+    for i in range(n):
+        await op(i)
+    elapsed = time.perf_counter() - start
+    trips, commands = counter.snapshot()
+    print(f"{label:<22} {trips / n:>8.2f} {commands / n:>10.2f} {elapsed / n * 1e6:>12.1f}")
+
+async def main():
+    gm = GameManager(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if hasattr(gm, "load_scripts"):
+        await gm.load_scripts()
+    counter = RoundTripCounter(gm.redis)
+
+    code, host = await gm.create_game("Bench", "easy", ["shake"])
+    opponent = await gm.join_game(code, "Rival")
+    await gm.set_game_status(code, "playing")
+
+    # Keep a realistic screen of other words around the target
+    for i in range(30):
+        await gm.add_word(code, host, word(f"FILLER{i}", f"fill{i:04d}"))
+
+    print(f"{'operation':<22} {'trips/op':>8} {'cmds/op':>10} {'us/op':>12}")
+
+    created = []
+    async def create(i):
+        created.append((await gm.create_game("Bench", "easy", []))[0])
+    await measure(counter, "create_game", create, ITERATIONS)
+
+    # Seed outside the measured window so only the submit is counted
+    for i in range(ITERATIONS):
+        await gm.add_word(code, host, word(f"HIT{i}", f"hit{i:05d}"))
+    await measure(counter, "submit_word (hit)", lambda i: gm.submit_word(code, host, f"HIT{i}"), ITERATIONS)
+    await measure(counter, "submit_word (miss)", lambda i: gm.submit_word(code, host, "NOPE"), ITERATIONS)
+
+    async def damage(i):
+        await gm.damage_player(code, opponent, 0)
+    await measure(counter, "damage_player", damage, ITERATIONS)
+
+    await measure(counter, "trigger_power (shake)", lambda i: gm.trigger_power(code, host, "shake"), ITERATIONS)
+
+    # Expiry cost per overdue word, processed in one pass (9 words keep the opponent alive)
+    expiring = 9
+    past = time.time() - 60
+    for i in range(expiring):
+        await gm.add_word(code, opponent, word(f"OLD{i}", f"old{i:05d}", duration=1.0, spawn_time=past))
+    counter.reset()
+    start = time.perf_counter()
+    await gm.expire_due_words()
+    elapsed = time.perf_counter() - start
+    trips, commands = counter.snapshot()
+    print(f"{'expire (per word)':<22} {trips / expiring:>8.2f} {commands / expiring:>10.2f} {elapsed / expiring * 1e6:>12.1f}")
+
+    for c in [code, *created]:
+        for key in await gm.redis.keys(f"game:{c}*"):
+            await gm.redis.delete(key)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire
+from game import GameManager
+
+# Usage: REDIS_URL=redis://localhost:6379/0 python benchmarks/bench_wire.py [recording.jsonl]
+# Compares JSON text frames with the binary protocol over every frame of one match.
+# With a recording path that exists, those frames are replayed; otherwise a match is played against Redis
+# (and saved to the path when one is given).
+TICKS = 150
+
+async def record_match():
+    gm = GameManager(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    await gm.load_scripts()
+    random.seed(7)
+
+    code, host = await gm.create_game("Bench", "hard", ["shake", "barrage", "blindness"])
+    rival = await gm.join_game(code, "Rival")
+    channel = f"game:{code}:events"
+    pubsub = gm.redis.pubsub()
+    await pubsub.subscribe(channel)
+    await gm.set_game_status(code, "playing")
+
+    # Each player clears most of their words; the rest are fast-forwarded past their deadline
+    skill = {host: 0.85, rival: 0.6}
+    for _ in range(TICKS):
+        if not await gm.tick_game(code):
+            break
+        for pid in (host, rival):
+            for word in (await gm.get_words(code, pid)).values():
+                if random.random() < skill[pid]:
+                    await gm.submit_word(code, pid, word["text"])
+                elif random.random() < 0.3:
+                    await gm.redis.zadd("words:deadlines", {f"{code}:{pid}:{word['id']}": 0})
+        await gm.expire_due_words()
+
+    frames = []
+    while True:
+        message = await pubsub.get_message(timeout=0.2)
+        if message is None:
+            break
+        if message["type"] == "message":
+            frames.append(message["data"])
+    await pubsub.aclose()
+    for key in await gm.redis.keys(f"game:{code}*"):
+        await gm.redis.delete(key)
+    return frames
+
+def throughput(fn, frames, rounds=20):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            fn(frame)
+    return len(frames) * rounds / (time.perf_counter() - start)
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    if path and os.path.exists(path):
+        with open(path) as f:
+            frames = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        frames = asyncio.run(record_match())
+        if path:
+            with open(path, "w") as f:
+                f.writelines(frame + "\n" for frame in frames)
+
+    binary = [wire.encode_frame(frame) for frame in frames]
+    events = sum(len(wire.decode_frame(frame)) for frame in binary)
+    json_bytes = sum(len(frame.encode()) for frame in frames)
+    binary_bytes = sum(len(frame) for frame in binary)
+
+    print(f"{len(frames)} frames, {events} events")
+    print(f"{'format':<10} {'bytes':>10} {'bytes/frame':>12} {'deflated':>10} {'enc frames/s':>14} {'dec frames/s':>14}")
+    print(f"{'json':<10} {json_bytes:>10} {json_bytes / len(frames):>12.1f} "
+          f"{len(zlib.compress(''.join(frames).encode())):>10} {'-':>14} {throughput(json.loads, frames):>14.0f}")
+    print(f"{'binary':<10} {binary_bytes:>10} {binary_bytes / len(frames):>12.1f} "
+          f"{len(zlib.compress(b''.join(binary))):>10} {throughput(wire.encode_frame, frames):>14.0f} "
+          f"{throughput(wire.decode_frame, binary):>14.0f}")
+    print(f"binary is {binary_bytes / json_bytes:.1%} of json")
+
+if __name__ == "__main__":
+    main()
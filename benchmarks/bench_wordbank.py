@@ -0,0 +1,67 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wordbank import WordBank, INSANE_SYMBOLS
+
+# Usage: python benchmarks/bench_wordbank.py [samples]
+# Construction time (from the text lists and from a snapshot) and samples per second for every pool,
+# next to the per-spawn random.choice + concatenation the game loop used before.
+SAMPLES = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, "data")
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+def rate(fn, n=SAMPLES):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+def legacy_insane(pool):
+    word = random.choice(pool)
+    symbol = random.choice(INSANE_SYMBOLS)
+    return symbol + word if random.choice([True, False]) else word + symbol
+
+def main():
+    bank, build = timed(lambda: WordBank.load(DATA))
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "words.bank")
+        bank.write_snapshot(snapshot)
+        size = os.path.getsize(snapshot)
+        _, load = timed(lambda: WordBank.read_snapshot(snapshot))
+
+    print(f"{'construction':<28} {'ms':>10}")
+    print(f"{'from text lists':<28} {build * 1000:>10.2f}")
+    print(f"{'from snapshot':<28} {load * 1000:>10.2f}   ({size} bytes)")
+    print()
+
+    # The old lists, rebuilt the way GameManager held them, as the baseline
+    lists = {name: list(pool) for name, pool in bank.pools.items()}
+    on_screen = set(random.sample(lists["easy"], 20))
+
+    print(f"{'sampler':<28} {'samples/s':>12}")
+    rows = [
+        ("legacy easy", lambda: random.choice(lists["easy"])),
+        ("legacy insane", lambda: legacy_insane(lists["bonus_hard"])),
+        ("bank easy", lambda: bank.sample("easy")),
+        ("bank hard", lambda: bank.sample("hard")),
+        ("bank easy bonus", lambda: bank.sample("easy", bonus=True)),
+        ("bank insane", lambda: bank.sample("insane")),
+        ("bank insane bonus", lambda: bank.sample("insane", bonus=True)),
+        ("bank easy, 20 on screen", lambda: bank.sample("easy", avoid=on_screen)),
+    ]
+    for label, fn in rows:
+        print(f"{label:<28} {rate(fn):>12.0f}")
+
+if __name__ == "__main__":
+    main()
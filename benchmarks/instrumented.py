@@ -0,0 +1,44 @@
+from collections import Counter
+
+# Wraps a redis.asyncio client in place and counts what goes over the wire.
+# A single command is one round trip; a pipeline is one round trip carrying several commands.
+class RoundTripCounter:
+    def __init__(self, redis):
+        self.redis = redis
+        self.round_trips = 0
+        self.commands = Counter()
+        self._wrap_client(redis)
+
+    def reset(self):
+        self.round_trips = 0
+        self.commands.clear()
+
+    def snapshot(self):
+        return self.round_trips, sum(self.commands.values())
+
+    def _wrap_client(self, redis):
+        counter = self
+        execute_command = redis.execute_command
+        pipeline = redis.pipeline
+
+        async def counted_execute_command(*args, **options):
+            counter.round_trips += 1
+            counter.commands[str(args[0]).upper()] += 1
+            return await execute_command(*args, **options)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def counted_execute(*eargs, **ekwargs):
+                if pipe.command_stack:
+                    counter.round_trips += 1
+                    for cmd_args, _ in pipe.command_stack:
+                        counter.commands[str(cmd_args[0]).upper()] += 1
+                return await execute(*eargs, **ekwargs)
+
+            pipe.execute = counted_execute
+            return pipe
+
+        redis.execute_command = counted_execute_command
+        redis.pipeline = counted_pipeline
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import wire
+
+# Usage: python benchmarks/loadgen.py --serve [--backend memory] [--matches 50] [--duration 60] [--wpm 60] [--error-rate 0.05]
+#        python benchmarks/loadgen.py --url http://localhost:5001 --server-pid 1234
+# Headless load: N concurrent duels through the real /create, /join and websocket endpoints, each side played
+# by a scripted typist. --serve starts a local server on REDIS_URL, or on the in-process backend with
+# --backend memory when no Redis is around. Reports submit -> word_cleared latency, spawn jitter against the
+# tick interval, dropped connections and server CPU.
+
+def percentiles(samples):
+    if not samples:
+        return "n/a"
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return f"p50 {pick(0.5):8.1f}  p95 {pick(0.95):8.1f}  p99 {pick(0.99):8.1f}  (n={len(ordered)})"
+
+class Stats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.jitter_ms = []
+        self.matches_started = 0
+        self.matches_finished = 0
+        self.submits = 0
+        self.typos = 0
+        self.dropped = 0
+        self.connect_failures = 0
+
+class Typist:
+    def __init__(self, args, stats: Stats, base_ws: str, code: str, pid: str):
+        self.args = args
+        self.stats = stats
+        self.url = f"{base_ws}/ws/game/{code}/{pid}"
+        self.pid = pid
+        # wid -> text of the words currently falling on this player's screen, oldest first
+        self.visible = {}
+        self.pending = {}
+        self.last_spawn = None
+        self.over = asyncio.Event()
+        self.ready = asyncio.Event()
+
+    def handle(self, event):
+        kind = event.get("type")
+        now = time.perf_counter()
+        if kind == "word_spawn" and event["target_pid"] == self.pid:
+            word = event["word"]
+            self.visible[word["id"]] = word["text"]
+            # A tick gives each player one word; barrage bursts land within a few ms and are not ticks
+            if self.last_spawn is not None and now - self.last_spawn > self.args.tick_interval / 2:
+                self.stats.jitter_ms.append(abs(now - self.last_spawn - self.args.tick_interval) * 1000)
+            if self.last_spawn is None or now - self.last_spawn > 0.05:
+                self.last_spawn = now
+        elif kind == "word_cleared" and event["player_id"] == self.pid:
+            self.visible.pop(event["word_id"], None)
+            sent = self.pending.pop(event["word_id"], None)
+            if sent is not None:
+                self.stats.latencies_ms.append((now - sent) * 1000)
+        elif kind == "word_expired" and event["target_pid"] == self.pid:
+            self.visible.pop(event["word_id"], None)
+        elif kind == "effect_clear_screen" and event["target_pid"] == self.pid:
+            self.visible.clear()
+        elif kind == "game_over" or (kind == "status_change" and event.get("status") == "finished"):
+            self.over.set()
+
+    def decode(self, frame):
+        if isinstance(frame, bytes):
+            return wire.decode_frame(frame)
+        msg = json.loads(frame)
+        return msg["events"] if msg.get("type") == "batch" else [msg]
+
+    async def play(self, start: bool, deadline: float):
+        subprotocols = [wire.BINARY_PROTOCOL] if self.args.binary else None
+        try:
+            ws = await websockets.connect(self.url, subprotocols=subprotocols, open_timeout=10)
+        except Exception:
+            self.stats.connect_failures += 1
+            self.over.set()
+            return
+        try:
+            async with ws:
+                reader = asyncio.create_task(self.read(ws))
+                self.ready.set()
+                if start:
+                    await ws.send(json.dumps({"type": "start_game"}))
+                await self.type(ws, deadline)
+                reader.cancel()
+        except websockets.ConnectionClosed:
+            if not self.over.is_set():
+                self.stats.dropped += 1
+            self.over.set()
+
+    async def read(self, ws):
+        try:
+            async for frame in ws:
+                for event in self.decode(frame):
+                    self.handle(event)
+        except websockets.ConnectionClosed:
+            if not self.over.is_set():
+                self.stats.dropped += 1
+        self.over.set()
+
+    async def type(self, ws, deadline: float):
+        # WPM counts five keystrokes per word, as typing tests do
+        chars_per_sec = self.args.wpm * 5 / 60
+        while not self.over.is_set() and time.monotonic() < deadline:
+            if not self.visible:
+                await asyncio.sleep(0.05)
+                continue
+            wid, text = next(iter(self.visible.items()))
+            await asyncio.sleep(len(text) / chars_per_sec)
+            if wid not in self.visible:
+                continue
+            if random.random() < self.args.error_rate:
+                self.stats.typos += 1
+                await ws.send(json.dumps({"type": "submit_word", "word": text[:-1] + "~"}))
+                continue
+            self.pending[wid] = time.perf_counter()
+            self.stats.submits += 1
+            await ws.send(json.dumps({"type": "submit_word", "word": text}))
+
+async def run_match(args, stats: Stats, client: httpx.AsyncClient, deadline: float):
+    base_ws = args.url.replace("http", "ws", 1)
+    res = await client.post("/create", data={"name": "Bot A", "difficulty": args.difficulty, "powers": args.powers})
+    code = res.headers["location"].split("?")[0].split("/")[-1]
+    host_pid = res.headers["location"].split("=")[-1]
+    res = await client.post("/join", data={"name": "Bot B", "code": code})
+    if res.status_code != 303:
+        stats.connect_failures += 1
+        return
+    rival_pid = res.headers["location"].split("=")[-1]
+    stats.matches_started += 1
+
+    host = Typist(args, stats, base_ws, code, host_pid)
+    rival = Typist(args, stats, base_ws, code, rival_pid)
+    rival_task = asyncio.create_task(rival.play(False, deadline))
+    # The host starts the match once the rival's socket is listening
+    await asyncio.wait_for(rival.ready.wait(), 10)
+    await host.play(True, deadline)
+    await rival_task
+    if host.over.is_set() and rival.over.is_set() and time.monotonic() < deadline:
+        stats.matches_finished += 1
+
+async def match_slot(args, stats, client, deadline):
+    # Each slot keeps one duel running until time is up, starting a new one when a match ends
+    while time.monotonic() < deadline:
+        try:
+            await run_match(args, stats, client, deadline)
+        except (httpx.HTTPError, asyncio.TimeoutError, KeyError) as e:
+            stats.connect_failures += 1
+            print(f"Match setup failed: {e!r}")
+            await asyncio.sleep(1.0)
+
+def cpu_seconds(pid):
+    # utime + stime of the server process (Linux /proc), None elsewhere
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+async def sample_cpu(pid, samples, stop: asyncio.Event):
+    last, last_t = cpu_seconds(pid), time.monotonic()
+    while not stop.is_set() and last is not None:
+        await asyncio.sleep(1.0)
+        now, now_t = cpu_seconds(pid), time.monotonic()
+        if now is None:
+            break
+        samples.append((now - last) / (now_t - last_t) * 100)
+        last, last_t = now, now_t
+
+def start_server(args):
+    env = dict(os.environ, PORT=str(args.port), GAME_TICK_INTERVAL=str(args.tick_interval), GAME_BACKEND=args.backend)
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    return server
+
+async def wait_until_up(url, timeout=15.0):
+    end = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < end:
+            try:
+                await client.get("/")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+async def main(args):
+    server = None
+    pid = args.server_pid
+    if args.serve:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+        pid = server.pid
+    try:
+        await wait_until_up(args.url)
+        stats = Stats()
+        cpu = []
+        stop = asyncio.Event()
+        cpu_task = asyncio.create_task(sample_cpu(pid, cpu, stop)) if pid else None
+
+        deadline = time.monotonic() + args.duration
+        limits = httpx.Limits(max_connections=max(10, args.matches))
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=10) as client:
+            await asyncio.gather(*[match_slot(args, stats, client, deadline) for _ in range(args.matches)])
+        stop.set()
+        if cpu_task:
+            await cpu_task
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"matches: {args.matches} concurrent, {stats.matches_started} started, {stats.matches_finished} finished")
+    print(f"submits: {stats.submits} ({stats.typos} typos)")
+    print(f"submit -> word_cleared ms  {percentiles(stats.latencies_ms)}")
+    print(f"spawn jitter ms            {percentiles(stats.jitter_ms)}")
+    print(f"dropped connections: {stats.dropped}, failed connects/setups: {stats.connect_failures}")
+    if cpu:
+        print(f"server cpu %: mean {sum(cpu) / len(cpu):.1f}, max {max(cpu):.1f}")
+    else:
+        print("server cpu %: n/a (pass --serve or --server-pid on Linux)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive concurrent typing duels against a local server")
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--serve", action="store_true", help="start a local server for the run")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--backend", default=os.getenv("GAME_BACKEND", "redis"), choices=["redis", "memory"])
+    parser.add_argument("--server-pid", type=int, help="pid of an already running server, for CPU sampling")
+    parser.add_argument("--matches", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--wpm", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--tick-interval", type=float, default=float(os.getenv("GAME_TICK_INTERVAL", 2.0)),
+                        help="server tick interval the spawn jitter is measured against")
+    parser.add_argument("--difficulty", default="easy", choices=["easy", "hard", "insane"])
+    parser.add_argument("--powers", nargs="*", default=["shake", "barrage"])
+    parser.add_argument("--binary", action="store_true", help="negotiate the binary wire protocol")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+# Frames a socket may have waiting before the overflow policies kick in
+SEND_QUEUE_LIMIT = int(os.getenv("SEND_QUEUE_LIMIT", 256))
+
+# Effects that are over by the time a backed-up socket would show them
+TRANSIENT_EVENTS = ("effect_shake", "effect_blind")
+
+_UNKNOWN = object()
+
+class SlowConsumer(Exception):
+    pass
+
+SEQ_PREFIX = '{"seq": '
+
+def event_seq(data) -> Optional[int]:
+    # Numbered events and batches start with their sequence number, so it is read without parsing the frame
+    if not isinstance(data, str) or not data.startswith(SEQ_PREFIX):
+        return None
+    end = data.find(",", len(SEQ_PREFIX))
+    try:
+        return int(data[len(SEQ_PREFIX):end])
+    except ValueError:
+        return None
+
+# One local recipient of a channel, typically a websocket writer.
+# An encoder turns the published JSON text into the socket's negotiated wire format.
+# The outbound queue is bounded; when it is full, a new frame first tries to make room:
+#   collapse_health  - older health_update frames for the same player give way to the newest
+#   drop_superseded  - older status_change / effect frames with the same target, else the oldest transient effect
+#   disconnect       - nothing can go, so the queue is dropped and the socket is to be closed
+# Word events are never dropped; a client missing one would hold a word the server no longer has.
+class Subscription:
+    def __init__(self, channel: str, encoder: Optional[Callable] = None, limit: int = SEND_QUEUE_LIMIT,
+                 decisions: Optional[Counter] = None):
+        self.channel = channel
+        self.encoder = encoder
+        self.limit = limit
+        self.decisions = decisions if decisions is not None else Counter()
+        # [published text, frame to send, supersede key once computed]
+        self.queue: Deque[List] = deque()
+        self.overflowed = asyncio.Event()
+        self._ready = asyncio.Event()
+        # Set by a resuming socket: frames numbered up to here were already replayed from the log
+        self.resume_after: Optional[int] = None
+        # Optional callback that sees every published text as it arrives, before any overflow policy
+        self.watch: Optional[Callable[[str], None]] = None
+
+    def __len__(self):
+        return len(self.queue)
+
+    @property
+    def watch_only(self) -> bool:
+        # A subscription with no queue exists only for its watch callback (server-side consumers)
+        return self.limit == 0
+
+    def deliver(self, data, frame=None):
+        if self.overflowed.is_set():
+            return
+        if self.watch is not None:
+            self.watch(data)
+        if self.watch_only:
+            return
+        entry = [data, data if frame is None else frame, _UNKNOWN]
+        if len(self.queue) >= self.limit and not self._make_room(entry):
+            self.decisions["disconnect"] += 1
+            self.queue.clear()
+            self.overflowed.set()
+            self._ready.set()
+            return
+        self.queue.append(entry)
+        self._ready.set()
+
+    async def get(self):
+        while True:
+            while not self.queue:
+                if self.overflowed.is_set():
+                    raise SlowConsumer(self.channel)
+                self._ready.clear()
+                await self._ready.wait()
+            entry = self.queue.popleft()
+            if self.resume_after is not None:
+                # Frames the replay already covered are skipped until the first newer one
+                seq = event_seq(entry[0])
+                if seq is not None and seq <= self.resume_after:
+                    continue
+                self.resume_after = None
+            return entry[1]
+
+    def _make_room(self, entry: List) -> bool:
+        # Only runs on a full queue, so frames are parsed here rather than on every delivery
+        key = _supersede_key(entry)
+        if key is not None:
+            kept = deque(e for e in self.queue if _supersede_key(e) != key)
+            if len(kept) < len(self.queue):
+                self.queue = kept
+                self.decisions["collapse_health" if key[0] == "health_update" else "drop_superseded"] += 1
+                return True
+        for i, queued in enumerate(self.queue):
+            queued_key = _supersede_key(queued)
+            if queued_key is not None and queued_key[0] in TRANSIENT_EVENTS:
+                del self.queue[i]
+                self.decisions["drop_superseded"] += 1
+                return True
+        return False
+
+def _supersede_key(entry: List):
+    # Frames carrying the same key replace one another; batches and word events have none
+    if entry[2] is _UNKNOWN:
+        entry[2] = None
+        try:
+            event = json.loads(entry[0])
+        except (TypeError, ValueError):
+            return None
+        kind = event.get("type") if isinstance(event, dict) else None
+        if kind == "health_update":
+            entry[2] = (kind, event.get("player_id"))
+        elif kind in ("status_change", "game_state"):
+            entry[2] = (kind,)
+        elif kind in TRANSIENT_EVENTS:
+            entry[2] = (kind, event.get("target_pid"))
+    return entry[2]
+
+# A single Redis pub/sub connection per process, fanned out to local subscriptions.
+# Channels are subscribed on the first local subscriber and dropped with the last one.
+class EventDispatcher:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages_in = 0
+        self.messages_out = 0
+        # Overflow policy decisions across every subscription, by policy
+        self.overflow_decisions: Counter = Counter()
+        self._routes: Dict[str, Set[Subscription]] = {}
+        self._pubsub = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._routes.get(channel, ()))
+
+    @property
+    def channels(self):
+        return list(self._routes)
+
+    def subscriptions(self):
+        for subs in self._routes.values():
+            yield from subs
+
+    async def subscribe(self, channel: str, encoder: Optional[Callable] = None) -> Subscription:
+        self._ensure_running()
+        sub = Subscription(channel, encoder, decisions=self.overflow_decisions)
+        async with self._lock:
+            subs = self._routes.setdefault(channel, set())
+            subs.add(sub)
+            if len(subs) == 1:
+                await self._pubsub.subscribe(channel)
+                self._wakeup.set()
+        return sub
+
+    async def unsubscribe(self, sub: Subscription):
+        async with self._lock:
+            subs = self._routes.get(sub.channel)
+            if subs is None or sub not in subs:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._routes[sub.channel]
+                await self._pubsub.unsubscribe(sub.channel)
+
+    def dispatch(self, channel: str, data: str):
+        # Each payload is encoded at most once per wire format and shared by every recipient using it
+        self.messages_in += 1
+        encoded = {None: data}
+        for sub in self._routes.get(channel, ()):
+            if sub.watch_only:
+                sub.deliver(data)
+                continue
+            if sub.encoder not in encoded:
+                try:
+                    encoded[sub.encoder] = sub.encoder(data)
+                except Exception as e:
+                    print(f"Dispatcher encode error: {e}")
+                    encoded[sub.encoder] = data
+            sub.deliver(data, encoded[sub.encoder])
+            self.messages_out += 1
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._routes.clear()
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        # Connections and primitives belong to the loop that created them
+        self._routes.clear()
+        self._pubsub = self.redis.pubsub()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            if not self._pubsub.subscribed:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                print(f"Dispatcher read error: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message and message["type"] == "message":
+                self.dispatch(message["channel"], message["data"])
+
+# The same fan-out for a single process without Redis: publishing hands the payload straight to local queues
+class LocalEventDispatcher(EventDispatcher):
+    def __init__(self):
+        super().__init__(None)
+
+    async def subscribe(self, channel: str, encoder: Optional[Callable] = None) -> Subscription:
+        sub = Subscription(channel, encoder, decisions=self.overflow_decisions)
+        self._routes.setdefault(channel, set()).add(sub)
+        return sub
+
+    async def unsubscribe(self, sub: Subscription):
+        subs = self._routes.get(sub.channel)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._routes[sub.channel]
+
+    def publish(self, channel: str, data: str):
+        self.dispatch(channel, data)
+
+    async def close(self):
+        self._routes.clear()
@@ -1,13 +1,45 @@
 import json
 import asyncio
 import random
+import secrets
 import string
 import time
 import os
+from functools import partial
 from redis.asyncio import Redis
+from redis.exceptions import NoScriptError, ResponseError
+from scheduler import TickScheduler
+from dispatcher import EventDispatcher, LocalEventDispatcher
+from wordbank import WordBank
+from spawnplan import SEEDED_SPAWNS, new_seed, plan_word
+from metrics import Metrics, instrument_redis
+from ownership import LeaseTable
+from matchlog import MatchRecorder
+from leaderboard import Leaderboards, MemoryLeaderboards, leaderboard_key, names_key
+from wordcache import WordCache, GameWords, compare
+from game_scripts import SCRIPTS, SCRIPT_SHAS, CODE_SPACE, LEGACY_PLAYERS, ROSTER_CHANGED
 from dataclasses import dataclass, asdict, field
 from typing import List, Dict, Optional
 
+# Lifetime of a game's keys, and of the lease on its code
+GAME_TTL = 3600
+
+# Codes tried per allocation round trip, and round trips before giving up on a nearly full pool
+CODE_CANDIDATES = 16
+CODE_ROUNDS = 8
+
+# Games whose state (and roster) is kept for version-checked lookups; the oldest entry goes first
+STATE_CACHE_SIZE = 1024
+
+# Event types that change game fields or a player, and what they touch; word events only touch word sets
+DELTA_FIELDS = {"status_change": ("status", "start_time", "end_time", "spawn_seed", "spawn_interval")}
+DELTA_PLAYER = {"player_joined": lambda e: e["player"]["id"], "word_cleared": lambda e: e["player_id"],
+                "health_update": lambda e: e["player_id"]}
+
+def random_code() -> str:
+    # From the OS generator: codes handed out must not reveal the ones that come next
+    return "".join(secrets.choice(string.ascii_uppercase) for _ in range(4))
+
 @dataclass
 class Player:
     name: str
@@ -18,45 +50,230 @@ class Player:
     combo: int = 0
     is_ready: bool = False
 
+@dataclass
+class Roster:
+    # What the scripts that can end a match are told about its players (game_scripts.py)
+    difficulty: str
+    pids: List[str]
+
 @dataclass
 class GameConfig:
     difficulty: str
     allowed_powers: List[str]
 
+def create_game_manager(redis_url: str) -> "GameManager":
+    # GAME_BACKEND=memory keeps every game in this process, for single-node deployments
+    if os.getenv("GAME_BACKEND", "redis") == "memory":
+        from memory_backend import MemoryGameManager
+        return MemoryGameManager()
+    return GameManager(redis_url)
+
 class GameManager:
-    def __init__(self, redis_url: str):
-        self.redis = Redis.from_url(redis_url, decode_responses=True)
-        self.easy_words = self._load_words("data/easy_words.txt")
-        self.hard_words = self._load_words("data/hard_words.txt")
-        self.default_words = ["HELLO", "WORLD", "TYPING", "DUEL", "FAST", "HTML", "CODE", "PYTHON", "REDIS", "THREEJS"]
-        
-        # Extra words for Hard Bonus (8-10 chars)
-        self.extra_hard_words = [
-            "COMPUTER", "KEYBOARD", "DEVELOPER", "ENGINEER", "DATABASE", 
-            "FRONTEND", "BACKEND", "PLATFORM", "VARIABLE", "FUNCTION", 
-            "ITERATION", "PROTOCOL", "SECURITY", "SOFTWARE", "HARDWARE", 
-            "INTERNET", "WIRELESS", "GRAPHICS", "OVERLOAD", "TERMINAL"
-        ]
-        
-        # Create Bonus Pools
-        all_words = set(self.easy_words + self.hard_words + self.default_words + self.extra_hard_words)
-        self.bonus_easy = [w for w in all_words if 5 <= len(w) <= 8]
-        self.bonus_hard = [w for w in all_words if 8 <= len(w) <= 10]
-        
-        if not self.bonus_easy: self.bonus_easy = ["BONUS"]
-        if not self.bonus_hard: self.bonus_hard = ["SUPERBONUS"]
+    def __init__(self, redis_url: Optional[str]):
+        # Without a URL there is no Redis at all; MemoryGameManager holds the state itself
+        self.redis = Redis.from_url(redis_url, decode_responses=True) if redis_url else None
+        # Shared pub/sub connection that fans game events out to local websockets
+        self.events = EventDispatcher(self.redis) if self.redis else LocalEventDispatcher()
+        # One scheduler drives the tick of every active game
+        self.scheduler = TickScheduler(interval=float(os.getenv("GAME_TICK_INTERVAL", 2.0)))
+        # Running games are ticked by whichever node holds their lease; the memory backend is a single node
+        self.leases = LeaseTable(self.redis, self._run_script) if self.redis else None
+        # Optional mode: events from one tick or action go out as a single {"type": "batch"} frame
+        self.batch_events = os.getenv("EVENT_BATCHING", "0") == "1"
+        # Optional mode: spawns follow a per-game seed and go out as one spawn_tick marker per tick (spawnplan.py)
+        self.seeded_spawns = SEEDED_SPAWNS
+        # Expiry runs on its own cadence so damage lands within this many seconds of a word's deadline
+        self.expiry_interval = float(os.getenv("WORD_EXPIRY_INTERVAL", 0.1))
+        # Word pools are built once, from a prebuilt snapshot when WORD_BANK_SNAPSHOT points at a fresh one
+        self.words = WordBank.load("data", os.getenv("WORD_BANK_SNAPSHOT"))
+        # Active words of the games ticked here, kept current from their events; the memory backend is all local
+        self.word_cache = WordCache() if self.redis else None
+        # Optional: every event of the games ticked here also goes to a compact per-match log (matchlog.py)
+        log_dir = os.getenv("MATCH_LOG_DIR")
+        self.recorder = MatchRecorder(log_dir) if log_dir else None
+        # Boards per difficulty and window (leaderboard.py), written when a match ends
+        self.leaderboards = Leaderboards(self.redis) if self.redis else MemoryLeaderboards()
+        # Read-only game states by code, valid while the game's version (its event seq) is unchanged
+        self.state_cache: Dict[str, Dict] = {}
+        # Rosters of started games by code; players only join in the lobby, so a roster read once stays valid
+        # (the scripts refuse one that went stale, say when its code was handed out again)
+        self.rosters: Dict[str, Roster] = {}
+        # Live counters and histograms served at /metrics
+        self.metrics = Metrics()
+        self.scheduler.metrics = self.metrics
+        self.leaderboards.metrics = self.metrics
+        if self.redis is not None:
+            instrument_redis(self.redis, self.metrics, SCRIPT_SHAS)
+        self._register_gauges()
 
-    def _load_words(self, path):
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return [line.strip().upper() for line in f if line.strip()]
-        return []
+    def _register_gauges(self):
+        m = self.metrics
+        # Named jobs such as words:expiry share the scheduler with the games but are not games
+        m.callback("typingduel_active_games", "Games ticked by this process",
+                   lambda: sum(1 for key in self.scheduler if ":" not in key))
+        m.callback("typingduel_websockets", "Open game websockets",
+                   lambda: sum(1 for sub in self.events.subscriptions() if not sub.watch_only))
+        m.callback("typingduel_pubsub_messages_in_total", "Event payloads received for local subscribers",
+                   lambda: self.events.messages_in, kind="counter")
+        m.callback("typingduel_pubsub_messages_out_total", "Event frames queued to websockets",
+                   lambda: self.events.messages_out, kind="counter")
+        m.callback("typingduel_send_queue_depth", "Frames waiting in websocket send queues",
+                   self._send_queue_depths, label="stat")
+        m.callback("typingduel_send_queue_overflow_total", "Overflow policy decisions on full send queues",
+                   lambda: {policy: self.events.overflow_decisions[policy]
+                            for policy in ("collapse_health", "drop_superseded", "disconnect")},
+                   kind="counter", label="policy")
 
-    async def create_game(self, host_name: str, difficulty: str, powers: List[str]) -> tuple[str, str]:
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase, k=4))
-            if not await self.redis.exists(f"game:{code}"):
+    def _send_queue_depths(self) -> Dict[str, int]:
+        depths = [len(sub) for sub in self.events.subscriptions()]
+        return {"sum": sum(depths), "max": max(depths, default=0)}
+
+    async def load_scripts(self):
+        # Called once at startup; EVALSHA falls back to this again if Redis lost its script cache
+        for name, src in SCRIPTS.items():
+            await self.redis.script_load(src)
+
+    async def _run_script(self, name: str, keys: List[str], args: List):
+        args = [*args, int(self.batch_events)]
+        try:
+            return await self.redis.evalsha(SCRIPT_SHAS[name], len(keys), *keys, *args)
+        except NoScriptError:
+            await self.load_scripts()
+        except ResponseError as e:
+            # Refused before any write: the game still has legacy players, whose keys only its field names
+            if LEGACY_PLAYERS not in str(e):
+                raise
+            await self._migrate_players(keys[0].split(":")[1])
+        return await self.redis.evalsha(SCRIPT_SHAS[name], len(keys), *keys, *args)
+
+    async def migrate_legacy_games(self):
+        # Games created before per-player storage keep their players in a JSON field on the game hash
+        migrated = 0
+        async for key in self.redis.scan_iter(match="game:????", _type="HASH", count=500):
+            if await self.redis.hexists(key, "players"):
+                await self._migrate_players(key.split(":")[1])
+                migrated += 1
+        if migrated:
+            print(f"Migrated {migrated} in-flight games to per-player storage")
+
+    async def _migrate_players(self, code: str):
+        # The script is handed every player's key, so the pids are read from the field first; it declines when
+        # the field changed in between
+        game_key = f"game:{code}"
+        for _ in range(3):
+            blob, host_id = await self.redis.hmget(game_key, "players", "host_id")
+            if blob is None:
+                return
+            pids = sorted(json.loads(blob), key=lambda pid: pid != host_id)
+            keys = [game_key, f"{game_key}:pids", *[self._player_key(code, pid) for pid in pids]]
+            if await self._run_script("migrate_players", keys, pids):
+                return
+
+    def _player_key(self, code: str, pid: str) -> str:
+        return f"game:{code}:player:{pid}"
+
+    def _encode_player(self, player: Player) -> Dict:
+        data = asdict(player)
+        data["is_ready"] = int(player.is_ready)
+        return data
+
+    def _decode_player(self, data: Dict) -> Dict:
+        return asdict(Player(
+            name=data["name"],
+            id=data["id"],
+            health=int(data["health"]),
+            power=int(data["power"]),
+            words_cleared=int(data["words_cleared"]),
+            combo=int(data["combo"]),
+            is_ready=data.get("is_ready") == "1"
+        ))
+
+    def _publish(self, pipe, code: str, events: List[Dict]) -> List[str]:
+        # Queued as a script so the events are numbered and logged to the game's stream inside the same MULTI
+        payloads = [json.dumps(event) for event in events]
+        pipe.evalsha(SCRIPT_SHAS["publish_events"], 2, *self._game_keys(code), *payloads, int(self.batch_events))
+        return payloads
+
+    async def _execute_publishing(self, pipe, code: str, payloads: List[str]):
+        try:
+            return await pipe.execute()
+        except NoScriptError:
+            # The rest of the transaction was applied; only the events have to go out again
+            await self._run_script("publish_events", self._game_keys(code), payloads)
+
+    def _game_keys(self, code: str) -> List[str]:
+        # Every script that emits events starts with these two
+        return [f"game:{code}", f"game:{code}:stream"]
+
+    def _word_keys(self, code: str, pid: str) -> List[str]:
+        return [*self._game_keys(code), self._player_key(code, pid),
+                f"game:{code}:{pid}:words", f"game:{code}:{pid}:index", "words:deadlines"]
+
+    def _roster_keys(self, code: str, roster: Roster) -> List[str]:
+        # Appended to the keys of the scripts that can end a match, which rank it in the same step
+        boards = [leaderboard_key(roster.difficulty, window) for window in ("all", "daily", "weekly")]
+        return [f"game:{code}:pids", *boards, names_key(roster.difficulty),
+                *[self._player_key(code, pid) for pid in roster.pids]]
+
+    def _remember_roster(self, code: str, status: Optional[str], difficulty: Optional[str], pids: List[str]) -> Roster:
+        roster = Roster(difficulty or "easy", pids)
+        if status not in (None, "lobby") and pids:
+            if code not in self.rosters and len(self.rosters) >= STATE_CACHE_SIZE:
+                del self.rosters[next(iter(self.rosters))]
+            self.rosters[code] = roster
+        return roster
+
+    async def _rosters(self, codes) -> Dict[str, Roster]:
+        # The rosters not kept yet are read in one round trip
+        rosters = {code: self.rosters[code] for code in codes if code in self.rosters}
+        missing = [code for code in codes if code not in rosters]
+        if missing:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for code in missing:
+                    pipe.hmget(f"game:{code}", "status", "difficulty")
+                    pipe.lrange(f"game:{code}:pids", 0, -1)
+                replies = await pipe.execute()
+            for code, (status, difficulty), pids in zip(missing, replies[0::2], replies[1::2]):
+                rosters[code] = self._remember_roster(code, status, difficulty, pids)
+        return rosters
+
+    async def _run_with_roster(self, name: str, code: str, build):
+        # build(roster) gives the keys and args of the call, or None when there is nothing to run; a roster the
+        # script refuses is read again once
+        for attempt in range(2):
+            call = build((await self._rosters([code]))[code])
+            if call is None:
+                return None
+            keys, args = call
+            try:
+                return await self._run_script(name, keys, args)
+            except ResponseError as e:
+                if ROSTER_CHANGED not in str(e) or attempt:
+                    raise
+                self.rosters.pop(code, None)
+
+    async def allocate_code(self) -> str:
+        # Reserves a code atomically with a lease that lapses with the game, returning it to the pool
+        for _ in range(CODE_ROUNDS):
+            candidates = [random_code() for _ in range(CODE_CANDIDATES)]
+            keys = ["codes:leases", *[key for c in candidates for key in (f"game:{c}", f"code:{c}")]]
+            code = await self._run_script("allocate_code", keys, [GAME_TTL, time.time(), *candidates])
+            if code:
+                return code
+            stats = await self.code_pool_stats()
+            if stats["free"] == 0:
                 break
+        raise RuntimeError("No free game codes")
+
+    async def code_pool_stats(self) -> Dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore("codes:leases", "-inf", time.time())
+            pipe.zcard("codes:leases")
+            _, leased = await pipe.execute()
+        return {"capacity": CODE_SPACE, "leased": leased, "free": CODE_SPACE - leased, "occupancy": leased / CODE_SPACE}
+
+    async def create_game(self, host_name: str, difficulty: str, powers: List[str]) -> tuple[str, str]:
+        code = await self.allocate_code()
         
         host_id = self._generate_id()
         host_player = Player(name=host_name, id=host_id, is_ready=True)
@@ -66,12 +283,17 @@ class GameManager:
             "host_id": host_id,
             "difficulty": difficulty,
             "status": "lobby",
-            "powers": json.dumps(powers),
-            "players": json.dumps({host_id: asdict(host_player)})
+            "powers": json.dumps(powers)
         }
         
-        await self.redis.hset(f"game:{code}", mapping=game_data)
-        await self.redis.expire(f"game:{code}", 3600)
+        game_key = f"game:{code}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(game_key, mapping=game_data)
+            pipe.hset(self._player_key(code, host_id), mapping=self._encode_player(host_player))
+            pipe.rpush(f"{game_key}:pids", host_id)
+            for key in (game_key, self._player_key(code, host_id), f"{game_key}:pids"):
+                pipe.expire(key, GAME_TTL)
+            await pipe.execute()
         
         return code, host_id
 
@@ -81,57 +303,174 @@ class GameManager:
         return code, host_id
 
     async def join_game(self, code: str, player_name: str) -> Optional[str]:
-        game_key = f"game:{code}"
-        if not await self.redis.exists(game_key):
-            return None
-            
-        status = await self.redis.hget(game_key, "status")
-        if status != "lobby":
-            return None 
-            
-        players_json = await self.redis.hget(game_key, "players")
-        players = json.loads(players_json) if players_json else {}
-        
-        if len(players) >= 2:
-            return None 
-            
         player_id = self._generate_id()
         new_player = Player(name=player_name, id=player_id, is_ready=True)
-        
-        players[player_id] = asdict(new_player)
-        await self.redis.hset(game_key, "players", json.dumps(players))
-        
-        await self.redis.publish(f"game:{code}:events", json.dumps({"type": "player_joined", "player": asdict(new_player)}))
+
+        # Status and capacity checks happen in the same atomic step as the insert
+        keys = [*self._game_keys(code), f"game:{code}:pids", self._player_key(code, player_id)]
+        joined = await self._run_script("join_game", keys, [player_id, json.dumps(asdict(new_player))])
+        if not joined:
+            return None
         
         return player_id
 
+    async def get_player(self, code: str, pid: str) -> Optional[Dict]:
+        data = await self.redis.hgetall(self._player_key(code, pid))
+        return self._decode_player(data) if data else None
+
+    async def get_words(self, code: str, pid: str) -> Dict[str, Dict]:
+        words = await self.redis.hgetall(f"game:{code}:{pid}:words")
+        return {wid: json.loads(data) for wid, data in words.items()}
+
+    async def _get_players(self, code: str, pids: List[str]) -> Dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pid in pids:
+                pipe.hgetall(self._player_key(code, pid))
+            rows = await pipe.execute()
+        return {pid: self._decode_player(row) for pid, row in zip(pids, rows) if row}
+
     async def get_game_state(self, code: str) -> Optional[Dict]:
         game_key = f"game:{code}"
-        if not await self.redis.exists(game_key):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(game_key)
+            pipe.lrange(f"{game_key}:pids", 0, -1)
+            data, pids = await pipe.execute()
+        if not data:
             return None
         
-        data = await self.redis.hgetall(game_key)
+        # Compatibility view: players are still returned as one {pid: player} mapping
         if "players" in data:
             data["players"] = json.loads(data["players"])
+        else:
+            data["players"] = await self._get_players(code, pids)
+            self._remember_roster(code, data.get("status"), data.get("difficulty"), pids)
         if "powers" in data:
             data["powers"] = json.loads(data["powers"])
+        data["seq"] = int(data.get("seq", 0))
+        if "spawn_seed" in data:
+            data["spawn_seed"] = int(data["spawn_seed"])
+            data["spawn_interval"] = float(data["spawn_interval"])
+            data["spawn_tick"] = int(data.get("spawn_tick", 0))
         return data
 
+    async def state_version(self, code: str) -> Optional[int]:
+        # Every change to a game goes out as a numbered event, so the event seq doubles as its version
+        host_id, seq = await self.redis.hmget(f"game:{code}", "host_id", "seq")
+        return None if host_id is None else int(seq or 0)
+
+    async def get_game_state_cached(self, code: str) -> Optional[Dict]:
+        # For lookups such as the host check: one field is read to validate the local copy, and the full
+        # state is fetched again only when the version has moved on. Callers must not modify the result.
+        version = await self.state_version(code)
+        if version is None:
+            self.state_cache.pop(code, None)
+            return None
+        game = self.state_cache.get(code)
+        if game is not None and game["seq"] == version:
+            self.metrics.state_cache.labels("hit").inc()
+            return game
+
+        self.metrics.state_cache.labels("miss").inc()
+        game = await self.get_game_state(code)
+        if game is None:
+            self.state_cache.pop(code, None)
+            return None
+        if code not in self.state_cache and len(self.state_cache) >= STATE_CACHE_SIZE:
+            del self.state_cache[next(iter(self.state_cache))]
+        self.state_cache[code] = game
+        return game
+
+    async def state_delta(self, code: str, since: int) -> Optional[Dict]:
+        # The game fields and players changed after version `since`, with their current values, worked out from
+        # the event log. None when the log does not reach back that far and only a snapshot will do.
+        events = await self.events_since(code, since)
+        if events is None:
+            return None
+        game = await self.get_game_state_cached(code)
+        if game is None:
+            return None
+        fields, pids = set(), set()
+        for payload in events:
+            event = json.loads(payload)
+            fields.update(DELTA_FIELDS.get(event.get("type"), ()))
+            if event.get("type") in DELTA_PLAYER:
+                pids.add(DELTA_PLAYER[event["type"]](event))
+        # Values are at least as new as the events folded in, so the delta claims only their range
+        return {"type": "game_delta", "since": since, "version": since + len(events),
+                "game": {f: game[f] for f in sorted(fields) if f in game},
+                "players": {pid: game["players"][pid] for pid in sorted(pids) if pid in game["players"]}}
+
+    async def get_snapshot(self, code: str) -> Optional[Dict]:
+        # Full state for a (re)connecting client: the game, plus every word on screen with its age in seconds
+        game = await self.get_game_state(code)
+        if not game:
+            return None
+        cached = self.word_cache.get(code, game["seq"]) if self.word_cache is not None else None
+        now = time.time()
+        game["words"] = {}
+        for pid in game["players"]:
+            words = cached.players.get(pid, {}) if cached is not None else await self.get_words(code, pid)
+            game["words"][pid] = [dict(word, age=max(0.0, now - word["spawn_time"])) for word in words.values()]
+        return game
+
+    async def events_since(self, code: str, last_seq: int) -> Optional[List[str]]:
+        # The events numbered after last_seq, or None when the log no longer reaches back that far
+        game_key = f"game:{code}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(game_key, "seq")
+            pipe.xrange(f"{game_key}:stream", min=f"0-{last_seq + 1}")
+            current, entries = await pipe.execute()
+        current = int(current or 0)
+        if last_seq > current:
+            return None
+        if last_seq == current:
+            return []
+        if not entries or entries[0][0] != f"0-{last_seq + 1}":
+            return None
+        return [fields["e"] for _, fields in entries]
+
+    def _start_fields(self) -> Dict:
+        # Clients learn the seed from the status change, so they can expand the spawn_tick markers that follow
+        if not self.seeded_spawns:
+            return {}
+        return {"spawn_seed": new_seed(), "spawn_interval": self.scheduler.interval}
+
     async def set_game_status(self, code: str, status: str):
         mapping = {"status": status}
+        event = {"type": "status_change", "status": status}
         if status == "playing":
             mapping["start_time"] = time.time()
+            seeded = self._start_fields()
+            mapping.update(seeded)
+            event.update(seeded)
             
-        await self.redis.hset(f"game:{code}", mapping=mapping)
-        await self.redis.publish(f"game:{code}:events", json.dumps({"type": "status_change", "status": status}))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"game:{code}", mapping=mapping)
+            payloads = self._publish(pipe, code, [event])
+            await self._execute_publishing(pipe, code, payloads)
 
-    async def _spawn_word(self, code, pid, word_text, x=None, y=10.0, vx=0.0, vy=None, duration=10.0, is_special=False):
+    def _index_member(self, word_data: Dict) -> str:
+        # Index entries sort by text, then by deadline, so duplicates on screen resolve to the one expiring first
+        deadline_ms = int((word_data["spawn_time"] + word_data["duration"]) * 1000)
+        return f"{word_data['text']}\x00{deadline_ms:013d}\x00{word_data['id']}"
+
+    def _store_word(self, pipe, code: str, pid: str, word_data: Dict):
+        # Words hash, text index and deadline queue are always written together
+        pipe.hset(f"game:{code}:{pid}:words", word_data["id"], json.dumps(word_data))
+        pipe.zadd(f"game:{code}:{pid}:index", {self._index_member(word_data): 0})
+        pipe.zadd("words:deadlines", {f"{code}:{pid}:{word_data['id']}": word_data["spawn_time"] + word_data["duration"]})
+
+    async def add_word(self, code: str, pid: str, word_data: Dict):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._store_word(pipe, code, pid, word_data)
+            await pipe.execute()
+
+    def _new_word(self, word_text, x=None, y=10.0, vx=0.0, vy=None, duration=10.0, is_special=False) -> Dict:
         if x is None:
             x = random.uniform(-4, 4)
-        word_id = self._generate_id()
-        word_data = {
+        return {
             "text": word_text,
-            "id": word_id,
+            "id": self._generate_id(),
             "x": x,
             "y": y,
             "vx": vx,
@@ -140,196 +479,370 @@ class GameManager:
             "duration": duration,
             "is_special": is_special
         }
-        await self.redis.hset(f"game:{code}:{pid}:words", word_id, json.dumps(word_data))
-        await self.redis.publish(f"game:{code}:events", json.dumps({
-            "type": "word_spawn",
-            "target_pid": pid,
-            "word": word_data
-        }))
-
-    async def start_game_loop(self, code: str):
-        try:
-            while True:
-                # Fetch full game state for start_time
-                game = await self.redis.hgetall(f"game:{code}")
-                if game.get("status") != "playing":
-                    break
-                
-                status = game["status"]
-                
-                # Determine word list based on difficulty
-                difficulty = game.get("difficulty", "easy")
-                if difficulty == "hard":
-                    words_pool = self.hard_words or self.default_words
-                elif difficulty == "insane":
-                    words_pool = self.bonus_hard # Base pool is 8-10 chars
-                else:
-                    words_pool = self.easy_words or self.default_words
 
-                players_json = game.get("players")
-                players = json.loads(players_json) if players_json else {}
-                
-                now = time.time()
-                start_time = float(game.get("start_time", now))
-                elapsed = now - start_time
-                
-                for pid, p_data in players.items():
-                    if p_data["health"] <= 0:
-                        continue 
-                    
-                    # 1. Spawn Word
-                    # Speed Scaling: 10s -> 3s over 3 mins (180s)
-                    duration = max(3.0, 10.0 - (elapsed / 18.0 * 7.0)) 
-                    
-                    if random.random() < 0.1: # 10% Special
-                        is_left = random.choice([True, False])
-                        sx = -6 if is_left else 6
-                        svx = 0.05 if is_left else -0.05
-                        sy = random.uniform(2, 8)
-                        
-                        # Select Bonus Word based on difficulty
-                        if difficulty == "hard" or difficulty == "insane":
-                            bonus_text = random.choice(self.bonus_hard)
-                        else:
-                            bonus_text = random.choice(self.bonus_easy)
-                        
-                        if difficulty == "insane":
-                             symbol = random.choice("!@#$%^&*?")
-                             if random.choice([True, False]):
-                                 bonus_text = symbol + bonus_text
-                             else:
-                                 bonus_text = bonus_text + symbol
-                            
-                        await self._spawn_word(code, pid, bonus_text, x=sx, y=sy, vx=svx, vy=0.0, duration=5.0, is_special=True)
-                    else:
-                        word_text = random.choice(words_pool)
-                        if difficulty == "insane":
-                             symbol = random.choice("!@#$%^&*?")
-                             if random.choice([True, False]):
-                                 word_text = symbol + word_text
-                             else:
-                                 word_text = word_text + symbol
-                        
-                        await self._spawn_word(code, pid, word_text, duration=duration)
-                    
-                    # 2. Check Expiration
-                    active_words = await self.redis.hgetall(f"game:{code}:{pid}:words")
-                    for wid, w_json in active_words.items():
-                        w = json.loads(w_json)
-                        if now > w["spawn_time"] + w["duration"]:
-                            await self.damage_player(code, pid, 10)
-                            await self.redis.hdel(f"game:{code}:{pid}:words", wid)
-                            
-                            await self.redis.publish(f"game:{code}:events", json.dumps({
-                                "type": "word_expired",
-                                "target_pid": pid,
-                                "word_id": wid
-                            }))
-
-                await asyncio.sleep(2) 
-        except Exception as e:
-            print(f"Game Loop Error: {e}")
+    async def _spawn_word(self, code, pid, word_text, x=None, y=10.0, vx=0.0, vy=None, duration=10.0, is_special=False):
+        word_data = self._new_word(word_text, x=x, y=y, vx=vx, vy=vy, duration=duration, is_special=is_special)
+        await self._spawn_words(code, [(pid, word_data)])
 
-    async def submit_word(self, code: str, pid: str, word_text: str):
-        print(f"DEBUG: submit_word called for {pid} with '{word_text}'")
-        active_words = await self.redis.hgetall(f"game:{code}:{pid}:words")
-        print(f"DEBUG: active_words keys: {list(active_words.keys())}")
-        
-        for wid, w_json in active_words.items():
-            w = json.loads(w_json)
-            # print(f"DEBUG: checking against '{w['text']}'")
-            if w["text"] == word_text:
-                print(f"DEBUG: MATCH FOUND for '{word_text}' (id: {wid})")
-                await self.redis.hdel(f"game:{code}:{pid}:words", wid)
-                
-                players_json = await self.redis.hget(f"game:{code}", "players")
-                players = json.loads(players_json)
-                
-                if pid in players:
-                    bonus = 50 if w.get("is_special") else 0
-                    players[pid]["power"] += 10 + bonus # 25 for testing
-                    players[pid]["words_cleared"] += 1
-                    
-                    triggered_power = None
-                    if players[pid]["power"] >= 100:
-                        players[pid]["power"] = 0 
-                        powers_json = await self.redis.hget(f"game:{code}", "powers")
-                        powers = json.loads(powers_json) if powers_json else []
-                        if powers:
-                            triggered_power = random.choice(powers)
-                            await self.trigger_power(code, pid, triggered_power)
-                    
-                    await self.redis.hset(f"game:{code}", "players", json.dumps(players))
-                    
-                    await self.redis.publish(f"game:{code}:events", json.dumps({
-                        "type": "word_cleared",
-                        "player_id": pid,
-                        "word_id": wid,
-                        "new_power": players[pid]["power"],
-                        "triggered_power": triggered_power,
-                        "combo": players[pid]["combo"]
-                    }))
-                    return True
-        return False
+    def _spawn_events(self, spawns: List[tuple[str, Dict]], tick: Optional[int]) -> List[Dict]:
+        # Seeded spawns are announced by tick number alone; everyone who knows the seed can work out the words
+        if tick is not None:
+            return [{"type": "spawn_tick", "tick": tick, "targets": [pid for pid, _ in spawns]}]
+        return [{"type": "word_spawn", "target_pid": pid, "word": word_data} for pid, word_data in spawns]
 
-    async def trigger_power(self, code: str, attacker_pid: str, power_type: str):
-        if power_type == "clear_screen":
-            await self.redis.delete(f"game:{code}:{attacker_pid}:words")
-            await self.redis.publish(f"game:{code}:events", json.dumps({
-                "type": "effect_clear_screen",
-                "target_pid": attacker_pid
-            }))
+    async def _spawn_words(self, code: str, spawns: List[tuple[str, Dict]], tick: Optional[int] = None):
+        # All spawns of one tick share a single MULTI, with their events published together
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for pid, word_data in spawns:
+                self._store_word(pipe, code, pid, word_data)
+            if tick is not None:
+                pipe.hset(f"game:{code}", "spawn_tick", tick)
+            payloads = self._publish(pipe, code, self._spawn_events(spawns, tick))
+            await self._execute_publishing(pipe, code, payloads)
+        if self.word_cache is not None:
+            for pid, word_data in spawns:
+                self.word_cache.add(code, pid, word_data)
+
+    async def start_game(self, code: str) -> bool:
+        # Returns False when a node already runs the game, which is then left as it is: the lease comes first
+        if self.leases is not None and not await self.leases.acquire(code):
+            return False
+        # Recording starts before the status change so the log opens with the event that starts the match
+        await self._start_recording(code)
+        await self.set_game_status(code, "playing")
+        return self.start_game_loop(code)
+
+    def start_game_loop(self, code: str) -> bool:
+        self.scheduler.register("words:expiry", self.expire_due_words, interval=self.expiry_interval)
+        # Returns False if the game is already being ticked
+        return self.scheduler.register(code, self._tick_owned)
+
+    async def _tick_owned(self, code: str) -> bool:
+        if self.leases is None:
+            return await self.tick_game(code)
+        # Without a lease renewed in time another node may be ticking the game already
+        if not self.leases.holds(code):
+            print(f"Lease on {code} lapsed, no longer ticking it")
+            await self._release_game(code)
+            return False
+        keep = await self.tick_game(code)
+        if not keep:
+            await self.leases.release([code])
+        return keep
+
+    async def join_cluster(self):
+        # Startup hook: sweep right away, which also picks up games left behind by a node that went down
+        if self.leases is not None:
+            self.scheduler.register("games:leases", self.sweep_leases, interval=self.leases.sweep_interval)
+
+    async def leave_cluster(self):
+        # Shutdown hook: hand every game back so the other nodes take over without waiting for the leases to lapse
+        if self.leases is not None:
+            self.scheduler.unregister("games:leases")
+            codes = list(self.leases.held)
+            for code in codes:
+                self.scheduler.unregister(code)
+                await self._release_game(code)
+            await self.leases.release(codes, leave=True)
+            if codes:
+                print(f"Released {len(codes)} games on shutdown")
+        # Match logs are finished with whatever is still buffered, including games no other node takes over
+        if self.recorder is not None:
+            for code in list(self.recorder.subs):
+                await self._stop_recording(code)
+            await self.recorder.flush()
+
+    async def sweep_leases(self, key: str = "games:leases") -> bool:
+        for code in await self.leases.renew():
+            self.scheduler.unregister(code)
+            await self._release_game(code)
+            print(f"Lost the lease on {code}")
+
+        claimed, share = await self.leases.claim()
+        for code in claimed:
+            self.metrics.game_takeovers.inc()
+            await self._start_recording(code)
+            print(f"Took over game {code}")
+
+        # Games beyond the fair share go back to the pool for nodes with room; they claim them on their next sweep
+        surplus = list(self.leases.held)[share:]
+        if surplus:
+            for code in surplus:
+                self.scheduler.unregister(code)
+                await self._release_game(code)
+            await self.leases.release(surplus)
+            print(f"Handed back {len(surplus)} games to rebalance")
+
+        # Claimed games start ticking here, as do held games whose tick stopped while a renewal was late
+        for code in self.leases.held:
+            self.start_game_loop(code)
+        return True
+
+    async def tick_game(self, code: str) -> bool:
+        snapshot = await self._tick_snapshot(code)
+        if snapshot is None:
+            await self._stop_recording(code)
+            return False
+        game, players = snapshot
+        if "spawn_seed" in game:
+            # The tick number lives on the game, so a node taking the game over carries on the same schedule
+            tick = int(game.get("spawn_tick", 0)) + 1
+            spawns = self._plan_seeded_spawns(game, players, tick)
+        else:
+            tick = None
+            spawns = self._plan_spawns(game, players)
+        if spawns:
+            await self._spawn_words(code, spawns, tick)
+            self.metrics.words_spawned.inc(len(spawns))
+        return True
+
+    async def _tick_snapshot(self, code: str):
+        # Returns the game hash and (pid, health, texts on screen) per player, or None once it stops playing
+        game_key = f"game:{code}"
+        game = await self.redis.hgetall(game_key)
+        if game.get("status") != "playing":
+            await self._untrack_words(code)
+            return None
+        if "players" in game:
+            await self._migrate_players(code)
+
+        # Health decides who gets a word. The texts already on screen come from the word cache when it has seen
+        # every event up to the game's seq; otherwise the words are read in the same round trip and cached.
+        pids = await self.redis.lrange(f"{game_key}:pids", 0, -1)
+        self._remember_roster(code, game["status"], game.get("difficulty"), pids)
+        seq = int(game.get("seq", 0))
+        cached = self.word_cache.get(code, seq)
+        self.metrics.word_cache.labels("miss" if cached is None else "hit").inc()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pid in pids:
+                pipe.hget(self._player_key(code, pid), "health")
+                if cached is None:
+                    pipe.hgetall(f"{game_key}:{pid}:words")
+            replies = await pipe.execute()
+
+        if cached is None:
+            healths = replies[0::2]
+            words = {pid: {wid: json.loads(data) for wid, data in row.items()} for pid, row in zip(pids, replies[1::2])}
+            cached = await self._track_words(code, seq, words)
+        else:
+            healths = replies
+            if self.word_cache.check:
+                await self.verify_word_cache(code)
+        return game, list(zip(pids, healths, [cached.texts(pid) for pid in pids]))
+
+    async def _track_words(self, code: str, seq: int, words: Dict[str, Dict[str, Dict]]) -> GameWords:
+        entry = GameWords(seq, words)
+        for evicted in self.word_cache.track(code, entry):
+            await self.events.unsubscribe(evicted.sub)
+        if entry.sub is None:
+            # Events missed before this subscription show up as a gap, which marks the entry for reloading
+            entry.sub = await self.events.subscribe(f"game:{code}:events")
+            entry.sub.limit = 0
+            entry.sub.watch = partial(self.word_cache.observe, code)
+        return entry
+
+    async def _release_game(self, code: str):
+        # Another node ticks the game from here on; the local views of it go
+        await self._untrack_words(code)
+        await self._stop_recording(code)
+
+    async def _start_recording(self, code: str):
+        if self.recorder is None or code in self.recorder:
+            return
+        game = await self.get_game_state_cached(code)
+        sub = await self.events.subscribe(f"game:{code}:events")
+        sub.limit = 0
+        sub.watch = partial(self.recorder.observe, code)
+        self.recorder.start(code, game.get("difficulty", "easy") if game else "", sub)
+        self.scheduler.register("matches:flush", self.recorder.flush, interval=self.recorder.flush_interval)
+
+    async def _stop_recording(self, code: str, discard: bool = False):
+        sub = self.recorder.stop(code, discard) if self.recorder is not None else None
+        if sub is not None:
+            await self.events.unsubscribe(sub)
+
+    async def _untrack_words(self, code: str):
+        entry = self.word_cache.drop(code) if self.word_cache is not None else None
+        if entry is not None and entry.sub is not None:
+            await self.events.unsubscribe(entry.sub)
+
+    async def verify_word_cache(self, code: str):
+        # Consistency check: a cached entry that has caught up with the game's seq must match Redis exactly
+        entry = self.word_cache.get(code)
+        if entry is None:
             return
+        pids = list(entry.players)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(f"game:{code}", "seq")
+            for pid in pids:
+                pipe.hgetall(f"game:{code}:{pid}:words")
+            seq, *rows = await pipe.execute()
+        if int(seq or 0) == entry.seq:
+            compare(code, entry, {pid: {wid: json.loads(d) for wid, d in row.items()} for pid, row in zip(pids, rows)})
 
-        players_json = await self.redis.hget(f"game:{code}", "players")
-        players = json.loads(players_json)
+    def _plan_spawns(self, game: Dict, players: List[tuple]) -> List[tuple[str, Dict]]:
+        difficulty = game.get("difficulty", "easy")
+        now = time.time()
+        start_time = float(game.get("start_time", now))
+        elapsed = now - start_time
         
-        opponent_pid = next((pid for pid in players if pid != attacker_pid), None)
-        if not opponent_pid: return
-
-        if power_type == "shake":
-            await self.redis.publish(f"game:{code}:events", json.dumps({
-                "type": "effect_shake",
-                "target_pid": opponent_pid,
-                "duration": 3000
-            }))
-        elif power_type == "barrage":
-            difficulty = await self.redis.hget(f"game:{code}", "difficulty")
-            pool = self.hard_words if difficulty == "hard" else self.easy_words
-            # Fallback
-            if not pool: pool = self.default_words
+        spawns = []
+        for pid, health, on_screen in players:
+            if health is None or int(health) <= 0:
+                continue 
+            
+            # 1. Spawn Word
+            # Speed Scaling: 10s -> 3s over 3 mins (180s)
+            duration = max(3.0, 10.0 - (elapsed / 18.0 * 7.0)) 
             
-            for _ in range(5):
-                await self._spawn_word(code, opponent_pid, random.choice(pool), duration=5.0) # Fast barrage
-        elif power_type == "blindness":
-             await self.redis.publish(f"game:{code}:events", json.dumps({
-                "type": "effect_blind",
-                "target_pid": opponent_pid,
-                "duration": 5000
-            }))
+            if random.random() < 0.1: # 10% Special
+                is_left = random.choice([True, False])
+                sx = -6 if is_left else 6
+                svx = 0.05 if is_left else -0.05
+                sy = random.uniform(2, 8)
+                
+                # Bonus tier and insane symbol come from the word bank
+                bonus_text = self.words.sample(difficulty, bonus=True, avoid=on_screen)
+                spawns.append((pid, self._new_word(bonus_text, x=sx, y=sy, vx=svx, vy=0.0, duration=5.0, is_special=True)))
+            else:
+                word_text = self.words.sample(difficulty, avoid=on_screen)
+                spawns.append((pid, self._new_word(word_text, duration=duration)))
+        return spawns
+
+    def _plan_seeded_spawns(self, game: Dict, players: List[tuple], tick: int) -> List[tuple[str, Dict]]:
+        # No redraws against the words on screen: clients cannot know them at the same instant, so a repeat
+        # stays on screen twice and the index clears the one expiring first
+        seed, interval = int(game["spawn_seed"]), float(game["spawn_interval"])
+        difficulty = game.get("difficulty", "easy")
+        now = time.time()
+        spawns = []
+        for pid, health, _ in players:
+            if health is None or int(health) <= 0:
+                continue
+            word = plan_word(self.words, difficulty, seed, tick, pid, interval)
+            word["spawn_time"] = now
+            spawns.append((pid, word))
+        return spawns
+
+    async def expire_due_words(self, key: str = "words:expiry", batch: int = 500) -> bool:
+        # Only words whose deadline has passed are fetched, across every game at once
+        now = time.time()
+        due = await self.redis.zrangebyscore("words:deadlines", "-inf", now, start=0, num=batch)
+        if not due:
+            return True
+
+        # Overdue words are grouped per player; each group is claimed, damaged and published atomically,
+        # and every group shares one round trip
+        groups: Dict[tuple[str, str], List[str]] = {}
+        for member in due:
+            code, pid, wid = member.split(":")
+            groups.setdefault((code, pid), []).append(wid)
+
+        for attempt in range(3):
+            # An expiry can end the match, which ranks it in the same script, so each group gets its game's roster
+            rosters = await self._rosters({code for code, _ in groups})
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for (code, pid), wids in groups.items():
+                    roster = rosters[code]
+                    keys = [*self._word_keys(code, pid), *self._roster_keys(code, roster)]
+                    pipe.evalsha(SCRIPT_SHAS["expire_words"], len(keys), *keys, pid, 10, roster.difficulty, *wids,
+                                 int(self.batch_events))
+                replies = await pipe.execute(raise_on_error=False)
+            # Groups refused without a write (scripts not loaded, legacy players, a stale roster) go again once
+            # that is fixed
+            retry = {}
+            for ((code, pid), wids), reply in zip(groups.items(), replies):
+                if isinstance(reply, NoScriptError):
+                    retry[code, pid] = wids
+                elif isinstance(reply, ResponseError) and LEGACY_PLAYERS in str(reply):
+                    await self._migrate_players(code)
+                    retry[code, pid] = wids
+                elif isinstance(reply, ResponseError) and ROSTER_CHANGED in str(reply):
+                    self.rosters.pop(code, None)
+                    retry[code, pid] = wids
+                elif isinstance(reply, Exception):
+                    raise reply
+                else:
+                    self.metrics.words_expired.inc(reply)
+            if not retry:
+                break
+            if any(isinstance(reply, NoScriptError) for reply in replies):
+                await self.load_scripts()
+            groups = retry
+        return True
+
+    async def submit_word(self, code: str, pid: str, word_text: str):
+        if not word_text or "\x00" in word_text:
+            self.metrics.submits.labels("invalid").inc()
+            return False
+
+        start = time.perf_counter()
+        try:
+            # In the process ticking the game a text nobody sees on screen is a miss without running the script.
+            # Events from other nodes (a barrage) may still be on their way here, so the cache only decides once
+            # it has caught up with the game's seq, which one field read tells; otherwise the script does.
+            cached = self.word_cache.get(code) if self.word_cache is not None else None
+            if cached is not None:
+                if self.word_cache.check:
+                    await self.verify_word_cache(code)
+                if not cached.has_text(pid, word_text):
+                    version = await self.state_version(code)
+                    cached = self.word_cache.get(code, version) if version is not None else None
+                self.metrics.word_cache.labels("miss" if cached is None else "hit").inc()
+                if cached is not None and not cached.has_text(pid, word_text):
+                    self.metrics.submits.labels("miss").inc()
+                    return False
+            result = await self._claim_word(code, pid, word_text)
+            if not result:
+                self.metrics.submits.labels("miss").inc()
+                return False
+
+            wid, triggered_power = result
+            self.metrics.submits.labels("hit").inc()
+            if triggered_power:
+                await self.trigger_power(code, pid, triggered_power)
+            return True
+        finally:
+            self.metrics.submit_latency.observe(time.perf_counter() - start)
+
+    async def _claim_word(self, code: str, pid: str, word_text: str):
+        # Lookup, removal, scoring and the word_cleared event happen in one atomic script call
+        return await self._run_script("submit_word", self._word_keys(code, pid), [word_text, pid, code, random.random()])
+
+    async def trigger_power(self, code: str, attacker_pid: str, power_type: str):
+        # Barrage words are generated up front for both pools; the backend picks by the game's difficulty
+        barrage = []
+        if power_type == "barrage":
+            for difficulty in ("easy", "hard"):
+                for _ in range(5):
+                    barrage.append(self._new_word(self.words.sample(difficulty), duration=5.0)) # Fast barrage
+
+        affected = await self._apply_power(code, attacker_pid, power_type, barrage)
+        if barrage and affected:
+            # Five of the ten candidates land, picked by the game's difficulty
+            self.metrics.words_spawned.inc(5)
+
+    async def _apply_power(self, code: str, attacker_pid: str, power_type: str, barrage: List[Dict]):
+        game_key = f"game:{code}"
+        keys = [*self._game_keys(code), f"{game_key}:pids", f"{game_key}:{attacker_pid}:words",
+                f"{game_key}:{attacker_pid}:index", "words:deadlines"]
+        if power_type != "barrage":
+            return await self._run_script("trigger_power", keys, [power_type, attacker_pid, code, ""])
+
+        # The barrage lands in the opponent's words, so their keys go in too, from the game's roster
+        def build(roster: Roster):
+            opponent = next((pid for pid in roster.pids if pid != attacker_pid), None)
+            if opponent is None:
+                return None
+            return ([*keys, f"{game_key}:{opponent}:words", f"{game_key}:{opponent}:index"],
+                    [power_type, attacker_pid, code, opponent, *[json.dumps(w) for w in barrage]])
+        return await self._run_with_roster("trigger_power", code, build)
 
     async def damage_player(self, code: str, pid: str, amount: int):
-        players_json = await self.redis.hget(f"game:{code}", "players")
-        players = json.loads(players_json)
-        
-        if pid in players:
-            players[pid]["combo"] = 0
-            players[pid]["health"] -= amount
-            if players[pid]["health"] <= 0:
-                players[pid]["health"] = 0
-                await self.set_game_status(code, "finished")
-                await self.redis.publish(f"game:{code}:events", json.dumps({
-                    "type": "game_over",
-                    "loser": pid
-                }))
-                
-            await self.redis.hset(f"game:{code}", "players", json.dumps(players))
-            await self.redis.publish(f"game:{code}:events", json.dumps({
-                "type": "health_update",
-                "player_id": pid,
-                "new_health": players[pid]["health"],
-                "combo": players[pid]["combo"]
-            }))
+        def build(roster: Roster):
+            keys = [*self._game_keys(code), self._player_key(code, pid), *self._roster_keys(code, roster)]
+            return keys, [pid, amount, roster.difficulty]
+        return await self._run_with_roster("damage_player", code, build)
 
     def _generate_id(self):
         return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
\ No newline at end of file
@@ -14,47 +14,287 @@ let currentInput = "";
 let gameRunning = false;
 let scene; // Global scene variable
 
+// Fingerprinted asset URLs come from the lobby page; plain paths still work without them
+function assetUrl(name) {
+    return (window.ASSET_URLS && window.ASSET_URLS[name]) || `/${name}`;
+}
+
 // WebSocket Setup
 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
 const wsUrl = `${protocol}//${window.location.host}/ws/game/${gameCode}/${playerId}`;
-const ws = new WebSocket(wsUrl);
+
+// Events are numbered per game; after a dropped connection the server replays everything after lastSeq
+let lastSeq = 0;
+let gameOver = false;
+let reconnectDelay = 500;
+let ws;
 
 // HUD Elements
 let inputDisplay, healthDisplay, powerDisplay;
 
-ws.onopen = () => {
-    console.log("Connected to Game Server");
-    lobbyStatus.innerText = "Connected! Waiting for opponent...";
-};
+function connect() {
+    const url = lastSeq > 0 ? `${wsUrl}?last_seq=${lastSeq}` : wsUrl;
+    // Offer the compact binary encoding first; servers without it answer in JSON text frames
+    ws = new WebSocket(url, ['typingduel.bin.2', 'typingduel.json']);
+    ws.binaryType = 'arraybuffer';
+
+    ws.onopen = () => {
+        console.log("Connected to Game Server");
+        reconnectDelay = 500;
+        if (!gameRunning) lobbyStatus.innerText = "Connected! Waiting for opponent...";
+    };
+
+    ws.onmessage = (event) => {
+        try {
+            if (event.data instanceof ArrayBuffer) {
+                decodeFrame(event.data).forEach(receive);
+                return;
+            }
+
+            const msg = JSON.parse(event.data);
+            
+            // Batched mode: one frame carries every event of a server tick or action, in order
+            if (msg.type === 'batch') {
+                msg.events.forEach(receive);
+            } else {
+                receive(msg);
+            }
+        } catch (e) {
+            console.log("Error:", e);
+        }
+    };
+
+    ws.onerror = (error) => {
+        console.error("WS Error:", error);
+        if (!gameRunning) lobbyStatus.innerText = "Connection Error. Check console.";
+    };
+
+    ws.onclose = () => {
+        if (gameOver) return;
+        // Back off up to 8s between attempts; the replay fills in whatever happened meanwhile
+        setTimeout(connect, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 8000);
+    };
+}
 
-ws.onmessage = (event) => {
+// Events already seen (a replay overlapping the live stream) are skipped. A gap means the server dropped
+// superseded frames for a backed-up socket; a sync asks for the state changed since, as a compact delta.
+let syncPending = false;
+
+function receive(msg) {
+    if (msg.seq !== undefined) {
+        if (msg.seq <= lastSeq) return;
+        if (lastSeq > 0 && msg.seq > lastSeq + 1 && !syncPending && ws.readyState === WebSocket.OPEN) {
+            syncPending = true;
+            ws.send(JSON.stringify({type: "sync", since: lastSeq}));
+        }
+        lastSeq = msg.seq;
+    }
+    handleMessage(msg);
+}
+
+// Binary frames (see wire.py): a run of records, each a one byte tag followed by its fields.
+// Strings are a u8 length plus UTF-8, integers little-endian, coordinates fixed point.
+const textDecoder = new TextDecoder();
+
+function decodeFrame(buffer) {
+    const view = new DataView(buffer);
+    const bytes = new Uint8Array(buffer);
+    let pos = 0;
+    let seq = null;
+    const u8 = () => view.getUint8(pos++);
+    const u16 = () => { const v = view.getUint16(pos, true); pos += 2; return v; };
+    const i16 = () => { const v = view.getInt16(pos, true); pos += 2; return v; };
+    const str = () => {
+        const n = u8();
+        pos += n;
+        return textDecoder.decode(bytes.subarray(pos - n, pos));
+    };
+
+    const events = [];
+    while (pos < bytes.length) {
+        const tag = u8();
+        if (tag === 10) {
+            seq = view.getUint32(pos, true) || null;
+            pos += 4;
+            continue;
+        }
+        if (tag === 0) {
+            const n = view.getUint32(pos, true);
+            pos += 4 + n;
+            events.push(JSON.parse(textDecoder.decode(bytes.subarray(pos - n, pos))));
+        } else if (tag === 1) {
+            const target_pid = str(), id = str(), text = str();
+            const flags = u8(), x = i16(), y = i16(), vx = i16(), vy = i16(), duration = u16();
+            events.push({type: 'word_spawn', target_pid, word: {
+                id, text, x: x / 1000, y: y / 1000, vx: vx / 10000,
+                vy: (flags & 2) ? vy / 10000 : null, duration: duration / 1000, is_special: (flags & 1) !== 0
+            }});
+        } else if (tag === 2) {
+            const player_id = str(), word_id = str(), new_power = u8(), combo = u16();
+            events.push({type: 'word_cleared', player_id, word_id, new_power, combo, triggered_power: str() || null});
+        } else if (tag === 3) {
+            events.push({type: 'word_expired', target_pid: str(), word_id: str()});
+        } else if (tag === 4) {
+            const player_id = str(), new_health = i16(), combo = u16();
+            const msg = {type: 'health_update', player_id, new_health};
+            if (combo !== 0xFFFF) msg.combo = combo;
+            events.push(msg);
+        } else if (tag === 5) {
+            events.push({type: 'status_change', status: str()});
+        } else if (tag === 6) {
+            events.push({type: 'game_over', loser: str()});
+        } else if (tag === 7 || tag === 8) {
+            const target_pid = str();
+            events.push({type: tag === 7 ? 'effect_shake' : 'effect_blind', target_pid, duration: u16()});
+        } else if (tag === 9) {
+            events.push({type: 'effect_clear_screen', target_pid: str()});
+        } else if (tag === 11) {
+            const tick = view.getUint32(pos, true);
+            pos += 4;
+            const targets = [];
+            for (let n = u8(); n > 0; n--) targets.push(str());
+            events.push({type: 'spawn_tick', tick, targets});
+        } else {
+            throw new Error(`Unknown record tag ${tag}`);
+        }
+        if (seq !== null) events[events.length - 1].seq = seq++;
+    }
+    return events;
+}
+
+// Seeded spawns (see spawnplan.py): a spawn_tick names a tick, and the word it gives this player is worked out
+// here from the game's seed, with the same generator and the same word pools as the server. Everything from
+// fnv1a to planWord must stay bit-for-bit in step with the Python side; tests/test_spawnplan.py compares them.
+function fnv1a(text) {
+    let h = 0x811c9dc5;
+    for (const byte of new TextEncoder().encode(text)) {
+        h = Math.imul(h ^ byte, 0x01000193) >>> 0;
+    }
+    return h;
+}
+
+function mulberry32(state) {
+    let a = state >>> 0;
+    return () => {
+        a = (a + 0x6D2B79F5) >>> 0;
+        let t = Math.imul(a ^ (a >>> 15), 1 | a);
+        t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+        return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+    };
+}
+
+function spawnRng(seed, tick, pid) {
+    return mulberry32(seed ^ Math.imul(tick, 0x9E3779B1) ^ fnv1a(pid));
+}
+
+function spawnDuration(tick, interval) {
+    const elapsed = tick * interval;
+    return Math.max(3.0, 10.0 - (elapsed / 18.0 * 7.0));
+}
+
+function sampleWord(pool, pools, rng) {
+    const i = Math.floor(rng() * (pool.length * pools.variants));
+    if (pools.variants === 1) return pool[i];
+    const word = pool[Math.floor(i / pools.variants)], variant = i % pools.variants;
+    const symbol = pools.symbols[variant >> 1];
+    return (variant & 1) ? symbol + word : word + symbol;
+}
+
+function planWord(pools, seed, interval, tick, pid) {
+    const rng = spawnRng(seed, tick, pid);
+    const word = {id: `t${tick}-${pid}`, vy: null, vx: 0.0, y: 10.0};
+    if (rng() < 0.1) {
+        const isLeft = rng() < 0.5;
+        Object.assign(word, {x: isLeft ? -6 : 6, vx: isLeft ? 0.05 : -0.05, y: 2 + 6 * rng(),
+                             vy: 0.0, duration: 5.0, is_special: true});
+        word.text = sampleWord(pools.bonus, pools, rng);
+    } else {
+        word.text = sampleWord(pools.pool, pools, rng);
+        Object.assign(word, {x: -4 + 8 * rng(), duration: spawnDuration(tick, interval), is_special: false});
+    }
+    return word;
+}
+
+// Ticks that arrive before the pools have loaded wait for them; words cleared or expired meanwhile are not shown
+let gameDifficulty = 'easy';
+let spawnPlan = null;
+
+function startSpawnPlan(seed, interval) {
+    if (spawnPlan && spawnPlan.seed === seed) return;
+    const plan = spawnPlan = {seed, interval, pools: null, pending: [], gone: new Set()};
+    fetch(`/spawn-pools/${gameDifficulty}`)
+        .then(r => r.json())
+        .then(pools => {
+            plan.pools = pools;
+            plan.pending.forEach(spawnTick);
+            plan.pending = [];
+        })
+        .catch(e => console.log("Spawn pools failed:", e));
+}
+
+function spawnTick(tick) {
+    if (!spawnPlan.pools) {
+        spawnPlan.pending.push(tick);
+        return;
+    }
+    const word = planWord(spawnPlan.pools, spawnPlan.seed, spawnPlan.interval, tick, playerId);
+    if (!activeWords.has(word.id) && !spawnPlan.gone.has(word.id)) spawnWord(word);
+}
+
+function forgetWord(wordId) {
+    if (spawnPlan && !spawnPlan.pools) spawnPlan.gone.add(wordId);
+}
+
+function handleMessage(msg) {
     try {
-        const msg = JSON.parse(event.data);
-        
         if (msg.type === 'game_state') {
+            // A full snapshot: numbering restarts from it
+            lastSeq = msg.game.seq || 0;
+            syncPending = false;
+            gameDifficulty = msg.game.difficulty || gameDifficulty;
+            if (msg.game.spawn_seed !== undefined) startSpawnPlan(msg.game.spawn_seed, msg.game.spawn_interval);
             const players = msg.game.players || {};
             const count = Object.keys(players).length;
             lobbyStatus.innerText = `Lobby: ${count} Player(s) connected.`;
             
             if (msg.game.status === 'playing') {
                 initGame();
+                syncGame(msg.game);
             } else if (count >= 2 || msg.game.mode === 'practice') {
                 lobbyStatus.innerText += " Ready to start.";
                 if (isHost && startBtn) startBtn.disabled = false;
             }
         }
 
+        if (msg.type === 'game_delta') {
+            syncPending = false;
+            if (msg.game.spawn_seed !== undefined) startSpawnPlan(msg.game.spawn_seed, msg.game.spawn_interval);
+            if (msg.game.status === 'playing') initGame();
+            Object.values(msg.players).forEach(p => {
+                const opponent = p.id !== playerId;
+                updateHealth(p.health, opponent);
+                updatePower(p.power, opponent);
+                if (!opponent) updateCombo(p.combo);
+            });
+        }
+
         if (msg.type === 'player_joined') {
             lobbyStatus.innerText = `Player ${msg.player.name} joined! Ready to start.`;
             if (isHost && startBtn) startBtn.disabled = false;
         }
         
         if (msg.type === 'status_change' && msg.status === 'playing') {
+            if (msg.spawn_seed !== undefined) startSpawnPlan(msg.spawn_seed, msg.spawn_interval);
             initGame();
         }
         
+        if (msg.type === 'spawn_tick' && gameRunning && spawnPlan) {
+            if (msg.targets.includes(playerId)) spawnTick(msg.tick);
+        }
+        
         if (msg.type === 'word_spawn' && gameRunning) {
-            if (msg.target_pid === playerId) {
+            if (msg.target_pid === playerId && !activeWords.has(msg.word.id)) {
                 spawnWord(msg.word);
             }
         }
@@ -67,6 +307,7 @@ ws.onmessage = (event) => {
             }
             
             removeWord(msg.word_id, true); // True for explosion
+            forgetWord(msg.word_id);
             if (msg.player_id === playerId) {
                 updatePower(msg.new_power);
                 updateCombo(msg.combo);
@@ -80,6 +321,7 @@ ws.onmessage = (event) => {
         
         if (msg.type === 'word_expired') {
             removeWord(msg.word_id, false);
+            forgetWord(msg.word_id);
         }
         
         if (msg.type === 'health_update') {
@@ -110,11 +352,13 @@ ws.onmessage = (event) => {
                 activeWords.forEach((data, id) => {
                     removeWord(id, true);
                 });
+                if (spawnPlan) spawnPlan.pending = [];
                 showNotification("SCREEN CLEARED!");
             }
         }
         
         if (msg.type === 'game_over') {
+            gameOver = true;
             if (bgAudio) {
                 bgAudio.pause();
                 bgAudio.currentTime = 0;
@@ -152,21 +396,44 @@ ws.onmessage = (event) => {
             btn.style.color = 'white';
             btn.style.border = '2px solid white';
             btn.onclick = () => window.location.href = '/';
+
+            const ranks = document.createElement('a');
+            ranks.innerText = "Leaderboard";
+            ranks.href = `/leaderboard?difficulty=${gameDifficulty}&window=daily&player=${encodeURIComponent(playerId)}`;
+            ranks.style.marginTop = '20px';
+            ranks.style.fontFamily = 'monospace';
+            ranks.style.fontSize = '20px';
+            ranks.style.color = 'white';
             
             div.appendChild(h1);
             div.appendChild(btn);
+            div.appendChild(ranks);
             document.body.appendChild(div);
         }
 
     } catch (e) {
         console.log("Error:", e);
     }
-};
+}
+
+// Brings a running game in line with a snapshot: words, health and power as the server has them
+function syncGame(game) {
+    const words = (game.words && game.words[playerId]) || [];
+    const ids = new Set(words.map(w => w.id));
+    Array.from(activeWords.keys()).forEach(id => {
+        if (!ids.has(id)) removeWord(id, false);
+    });
+    words.forEach(w => {
+        if (!activeWords.has(w.id)) spawnWord(w);
+    });
+    Object.values(game.players || {}).forEach(p => {
+        const opponent = p.id !== playerId;
+        updateHealth(p.health, opponent);
+        updatePower(p.power, opponent);
+    });
+}
 
-ws.onerror = (error) => {
-    console.error("WS Error:", error);
-    lobbyStatus.innerText = "Connection Error. Check console.";
-};
+connect();
 
 if (startBtn) {
     startBtn.onclick = () => {
@@ -182,7 +449,7 @@ function startMusic() {
     if (bgAudio && !bgAudio.paused) return;
     
     if (!bgAudio) {
-        bgAudio = new Audio('/bg.m4a');
+        bgAudio = new Audio(assetUrl('bg.m4a'));
         bgAudio.loop = true;
         bgAudio.volume = 1.0;
     }
@@ -307,6 +574,12 @@ function initGame() {
         // Standard falling speed if vy not provided
         const stdSpeed = 15.0 / (duration * 60.0);
         const vy = (wordData.vy !== undefined && wordData.vy !== null) ? wordData.vy : stdSpeed;
+        // Words from a snapshot have been on screen for `age` seconds already
+        if (wordData.age) {
+            const frames = wordData.age * 60;
+            sprite.position.x += (wordData.vx || 0) * frames;
+            sprite.position.y -= vy * frames;
+        }
         
         activeWords.set(wordData.id, {
             sprite: sprite,
@@ -325,7 +598,7 @@ function initGame() {
                 spawnExplosion(data.sprite.position.x, data.sprite.position.y, 0x00ff00, scene);
                 
                 // Play random explosion sound
-                const explosionSound = new Audio(`/explosion-${Math.floor(Math.random() * 5) + 1}.mp3`);
+                const explosionSound = new Audio(assetUrl(`explosion-${Math.floor(Math.random() * 5) + 1}.mp3`));
                 explosionSound.volume = 0.5; // Adjust volume as needed
                 explosionSound.play().catch(e => console.log("Explosion audio failed:", e));
             }
@@ -0,0 +1,473 @@
+import hashlib
+from typing import Dict
+
+from leaderboard import WINDOW_TTL
+
+# Lua sources for the atomic state transitions in GameManager.
+# Each script reads, updates and publishes in a single round trip, so a submit from the websocket
+# and an expiry from the game loop can no longer overwrite each other's changes to player state.
+#
+# Every key a script reads or writes is passed in KEYS; none is built inside Lua. Scripts still mix a game's keys
+# with shared ones (words:deadlines, codes:leases, games:running), so they assume a single Redis instance,
+# with or without replicas: Redis Cluster would reject them as cross-slot.
+#
+# Players live in game:{code}:player:{pid} hashes, in join order in the game:{code}:pids list. Games from the
+# previous layout keep them in a JSON `players` field instead. Scripts that touch players stop before writing
+# anything on such a game and answer LEGACY_PLAYERS; GameManager then runs migrate_players with every
+# player's key and tries again.
+#
+# Events are numbered per game: the `seq` field of the game hash counts them, every event carries its number
+# as a leading "seq" key, and a capped stream game:{code}:stream keeps the recent ones under ID 0-{seq}
+# so reconnecting clients can replay what they missed. Scripts that emit events take the game as KEYS[1]
+# and its stream as KEYS[2].
+#
+# The step that ends a match also ranks its players on the leaderboards (leaderboard.py), once per game. Scripts
+# that can end a match take a roster after their own keys: the pids list, the game's all-time, daily and weekly
+# boards and the names of their members, then every player's hash in join order. GameManager keeps rosters between calls, so a script checks
+# its roster against the game before any write and answers ROSTER_CHANGED when it is out of date.
+
+# Error reply of scripts refusing a game with legacy players
+LEGACY_PLAYERS = "LEGACY_PLAYERS"
+# Error reply of scripts handed a roster that no longer matches the game
+ROSTER_CHANGED = "ROSTER_CHANGED"
+
+# Events kept per game for replay (approximate; trimming works in whole stream nodes)
+STREAM_LEN = 500
+
+_HELPERS = r"""
+local function events_channel(game_key)
+    return game_key .. ':events'
+end
+
+-- The last ARGV of every call says whether events go out one PUBLISH each or as a single batch frame
+local BATCH = ARGV[#ARGV] == '1'
+local pending = {}
+local pending_seq = 0
+
+local function emit(payload)
+    -- Payloads are JSON objects; the sequence number goes in front. A game that is gone gets no number.
+    local game_key, stream = KEYS[1], KEYS[2]
+    if redis.call('EXISTS', game_key) == 1 then
+        local seq = redis.call('HINCRBY', game_key, 'seq', 1)
+        payload = '{"seq": ' .. seq .. ', ' .. string.sub(payload, 2)
+        redis.call('XADD', stream, 'MAXLEN', '~', STREAM_LEN, '0-' .. seq, 'e', payload)
+        if seq == 1 then
+            local ttl = redis.call('TTL', game_key)
+            if ttl > 0 then redis.call('EXPIRE', stream, ttl) end
+        end
+        pending_seq = seq
+    end
+    if BATCH then
+        table.insert(pending, payload)
+    else
+        redis.call('PUBLISH', events_channel(game_key), payload)
+    end
+end
+
+local function flush(game_key)
+    if #pending == 1 then
+        redis.call('PUBLISH', events_channel(game_key), pending[1])
+    elseif #pending > 1 then
+        -- A batch carries the number of its last event
+        redis.call('PUBLISH', events_channel(game_key),
+            '{"seq": ' .. pending_seq .. ', "type": "batch", "events": [' .. table.concat(pending, ', ') .. ']}')
+    end
+    pending = {}
+end
+
+local function last_field(member)
+    local pos = 0
+    while true do
+        local nxt = string.find(member, '\0', pos + 1, true)
+        if not nxt then break end
+        pos = nxt
+    end
+    return string.sub(member, pos + 1)
+end
+
+local function index_member(w, wid)
+    local deadline_ms = math.floor((w.spawn_time + w.duration) * 1000)
+    return w.text .. '\0' .. string.format('%013d', deadline_ms) .. '\0' .. wid
+end
+
+local function store_word(words_key, index_key, deadlines_key, code, pid, w_json)
+    local w = cjson.decode(w_json)
+    redis.call('HSET', words_key, w.id, w_json)
+    redis.call('ZADD', index_key, 0, index_member(w, w.id))
+    redis.call('ZADD', deadlines_key, string.format('%.17g', w.spawn_time + w.duration), code .. ':' .. pid .. ':' .. w.id)
+end
+
+-- Returned before any write when the game still keeps its players in the legacy JSON field
+local LEGACY = {err = 'LEGACY_PLAYERS'}
+
+local function legacy(game_key)
+    return redis.call('HEXISTS', game_key, 'players') == 1
+end
+
+local function write_player(player_key, p)
+    local is_ready = '0'
+    if p.is_ready == true then is_ready = '1' end
+    redis.call('HSET', player_key, 'name', p.name, 'id', p.id, 'health', p.health,
+        'power', p.power, 'words_cleared', p.words_cleared, 'combo', p.combo, 'is_ready', is_ready)
+end
+
+-- Returned before any write when the roster starting at KEYS[first] is not the game's, or its boards are for
+-- another difficulty
+local ROSTER_CHANGED = {err = 'ROSTER_CHANGED'}
+
+local function roster_matches(game_key, first, difficulty)
+    local current = redis.call('HGET', game_key, 'difficulty')
+    if current and current ~= difficulty then return false end
+    local pids = redis.call('LRANGE', KEYS[first], 0, -1)
+    if #pids ~= #KEYS - first - 4 then return false end
+    for i, pid in ipairs(pids) do
+        if redis.call('HGET', KEYS[first + 4 + i], 'id') ~= pid then return false end
+    end
+    return true
+end
+
+-- Every player's score goes on the roster's boards under their pid, keeping their best per window, and their
+-- display name in the names hash. The score is leaderboard.match_score over the match from start_time to
+-- end_time; a game is ranked once however many times it ends.
+local function rank_players(game_key, first)
+    if redis.call('HGET', game_key, 'mode') == 'practice' then return end
+    if redis.call('HSETNX', game_key, 'ranked', 1) == 0 then return end
+    local times = redis.call('HMGET', game_key, 'start_time', 'end_time')
+    local elapsed = math.max(tonumber(times[2]) - tonumber(times[1] or times[2]), 1)
+    for i = first + 5, #KEYS do
+        local p = redis.call('HMGET', KEYS[i], 'id', 'name', 'words_cleared', 'health')
+        if p[1] then
+            local cleared, health = tonumber(p[3]) or 0, math.max(tonumber(p[4]) or 0, 0)
+            local score = cleared * 10 + health + math.floor(cleared / (elapsed / 60))
+            for board = first + 1, first + 3 do
+                redis.call('ZADD', KEYS[board], 'GT', score, p[1])
+            end
+            redis.call('HSET', KEYS[first + 4], p[1], p[2])
+        end
+    end
+    redis.call('EXPIRE', KEYS[first + 2], DAILY_TTL)
+    redis.call('EXPIRE', KEYS[first + 3], WEEKLY_TTL)
+end
+
+-- roster is the index of the caller's roster in KEYS
+local function damage(game_key, player_key, pid, amount, roster)
+    if redis.call('EXISTS', player_key) == 0 then return false end
+
+    redis.call('HSET', player_key, 'combo', 0)
+    local health = redis.call('HINCRBY', player_key, 'health', -amount)
+    if health <= 0 then
+        health = 0
+        redis.call('HSET', player_key, 'health', 0)
+        redis.call('HSET', game_key, 'status', 'finished')
+        -- Players are scored on the first end of the match, however late it is ranked
+        local t = redis.call('TIME')
+        redis.call('HSETNX', game_key, 'end_time', string.format('%.17g', tonumber(t[1]) + tonumber(t[2]) / 1000000))
+        rank_players(game_key, roster)
+        emit(cjson.encode({type = 'status_change', status = 'finished'}))
+        emit(cjson.encode({type = 'game_over', loser = pid}))
+    end
+
+    emit(cjson.encode({type = 'health_update', player_id = pid, new_health = health, combo = 0}))
+    return health
+end
+"""
+
+def _script(body: str) -> str:
+    # Bodies run inside a function so every return path still flushes batched events
+    helpers = (_HELPERS.replace("STREAM_LEN", str(STREAM_LEN)).replace("DAILY_TTL", str(WINDOW_TTL["daily"]))
+               .replace("WEEKLY_TTL", str(WINDOW_TTL["weekly"])))
+    return helpers + "local function run()\n" + body + "end\n\nlocal result = run()\nflush(KEYS[1])\nreturn result\n"
+
+# KEYS: game, stream, player, words, index, deadlines
+# ARGV: text, pid, code, roll in [0, 1) used to pick the triggered power
+# Returns {word_id, triggered_power or ''} or nil when nothing matched
+SUBMIT_WORD = _script(r"""
+local text, pid, code, roll = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+if legacy(KEYS[1]) then return LEGACY end
+local matches = redis.call('ZRANGEBYLEX', KEYS[5], '[' .. text .. '\0', '[' .. text .. '\1', 'LIMIT', 0, 1)
+if #matches == 0 then return false end
+
+local member = matches[1]
+local wid = last_field(member)
+local w_json = redis.call('HGET', KEYS[4], wid)
+redis.call('HDEL', KEYS[4], wid)
+redis.call('ZREM', KEYS[5], member)
+redis.call('ZREM', KEYS[6], code .. ':' .. pid .. ':' .. wid)
+if not w_json then return false end
+
+local pkey = KEYS[3]
+if redis.call('EXISTS', pkey) == 0 then return false end
+
+local w = cjson.decode(w_json)
+local bonus = 0
+if w.is_special == true then bonus = 50 end
+local power = redis.call('HINCRBY', pkey, 'power', 10 + bonus)
+redis.call('HINCRBY', pkey, 'words_cleared', 1)
+
+local triggered = cjson.null
+if power >= 100 then
+    power = 0
+    redis.call('HSET', pkey, 'power', 0)
+    local powers = cjson.decode(redis.call('HGET', KEYS[1], 'powers') or '[]')
+    if #powers > 0 then
+        triggered = powers[math.min(#powers, math.floor(roll * #powers) + 1)]
+    end
+end
+
+emit(cjson.encode({
+    type = 'word_cleared', player_id = pid, word_id = wid,
+    new_power = power, triggered_power = triggered, combo = tonumber(redis.call('HGET', pkey, 'combo'))
+}))
+
+if triggered == cjson.null then triggered = '' end
+return {wid, triggered}
+""")
+
+# KEYS: game, stream, player, then the roster
+# ARGV: pid, amount, difficulty the roster's boards are for
+# Returns the new health or nil for an unknown player
+DAMAGE_PLAYER = _script(r"""
+if legacy(KEYS[1]) then return LEGACY end
+if not roster_matches(KEYS[1], 4, ARGV[3]) then return ROSTER_CHANGED end
+return damage(KEYS[1], KEYS[3], ARGV[1], tonumber(ARGV[2]), 4)
+""")
+
+# KEYS: game, stream, player, words, index, deadlines, then the roster
+# ARGV: pid, damage amount per word, difficulty the roster's boards are for, then the overdue word ids of that player
+# Returns the number of words that dealt damage; words someone else already claimed are skipped
+EXPIRE_WORDS = _script(r"""
+local code = string.sub(KEYS[1], 6)
+local pid, amount = ARGV[1], tonumber(ARGV[2])
+if legacy(KEYS[1]) then return LEGACY end
+local playing = redis.call('HGET', KEYS[1], 'status') == 'playing'
+if playing and not roster_matches(KEYS[1], 7, ARGV[3]) then return ROSTER_CHANGED end
+
+local expired = 0
+for i = 4, #ARGV - 1 do
+    local wid = ARGV[i]
+    if redis.call('ZREM', KEYS[6], code .. ':' .. pid .. ':' .. wid) == 1 then
+        local w_json = redis.call('HGET', KEYS[4], wid)
+        if w_json then
+            redis.call('HDEL', KEYS[4], wid)
+            redis.call('ZREM', KEYS[5], index_member(cjson.decode(w_json), wid))
+
+            -- Words left over from a finished game are dropped silently
+            playing = playing and redis.call('HGET', KEYS[1], 'status') == 'playing'
+            if playing then
+                damage(KEYS[1], KEYS[3], pid, amount, 7)
+                emit(cjson.encode({type = 'word_expired', target_pid = pid, word_id = wid}))
+                expired = expired + 1
+            end
+        end
+    end
+end
+return expired
+""")
+
+# KEYS: game, stream, pids, attacker words, attacker index, deadlines, then for a barrage the opponent's words and index
+# ARGV: power type, attacker pid, code, for a barrage the opponent pid from the caller's roster ('' otherwise),
+#       then barrage words as JSON (5 from the easy pool, 5 from the hard pool)
+# Returns the affected pid or nil when there is no opponent
+TRIGGER_POWER = _script(r"""
+local power_type, attacker, code = ARGV[1], ARGV[2], ARGV[3]
+
+if power_type == 'clear_screen' then
+    local wids = redis.call('HKEYS', KEYS[4])
+    for _, wid in ipairs(wids) do
+        redis.call('ZREM', KEYS[6], code .. ':' .. attacker .. ':' .. wid)
+    end
+    redis.call('DEL', KEYS[4], KEYS[5])
+    emit(cjson.encode({type = 'effect_clear_screen', target_pid = attacker}))
+    return attacker
+end
+
+if legacy(KEYS[1]) then return LEGACY end
+local opponent = nil
+for _, pid in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+    if pid ~= attacker then
+        opponent = pid
+        break
+    end
+end
+-- A barrage only lands on the opponent whose keys the caller passed
+if power_type == 'barrage' and ARGV[4] ~= (opponent or '') then return ROSTER_CHANGED end
+if not opponent then return false end
+
+if power_type == 'shake' then
+    emit(cjson.encode({type = 'effect_shake', target_pid = opponent, duration = 3000}))
+elseif power_type == 'barrage' then
+    local first = 5
+    if redis.call('HGET', KEYS[1], 'difficulty') == 'hard' then first = 10 end
+    for i = first, first + 4 do
+        store_word(KEYS[7], KEYS[8], KEYS[6], code, opponent, ARGV[i])
+        emit('{"type": "word_spawn", "target_pid": ' .. cjson.encode(opponent) .. ', "word": ' .. ARGV[i] .. '}')
+    end
+elseif power_type == 'blindness' then
+    emit(cjson.encode({type = 'effect_blind', target_pid = opponent, duration = 5000}))
+end
+return opponent
+""")
+
+# KEYS: game, stream, pids, new player
+# ARGV: pid, player as JSON
+# Returns 1 when the player was added, nil when the game is missing, already started or full
+JOIN_GAME = _script(r"""
+if legacy(KEYS[1]) then return LEGACY end
+if redis.call('HGET', KEYS[1], 'status') ~= 'lobby' then return false end
+if redis.call('LLEN', KEYS[3]) >= 2 then return false end
+
+local p = cjson.decode(ARGV[2])
+write_player(KEYS[4], p)
+redis.call('RPUSH', KEYS[3], ARGV[1])
+local ttl = redis.call('TTL', KEYS[1])
+if ttl > 0 then redis.call('EXPIRE', KEYS[4], ttl) end
+emit('{"type": "player_joined", "player": ' .. ARGV[2] .. '}')
+return 1
+""")
+
+# KEYS: game, pids, then the player hash of each pid in ARGV
+# ARGV: the pids of the legacy `players` field, host first
+# Moves the field into per-player hashes. Returns 1 when the game has no legacy field left, nil when the field
+# does not hold exactly the pids passed, so the caller reads it again.
+MIGRATE_PLAYERS = _script(r"""
+local blob = redis.call('HGET', KEYS[1], 'players')
+if not blob then return 1 end
+
+local players = cjson.decode(blob)
+local count = 0
+for _ in pairs(players) do count = count + 1 end
+if count ~= #ARGV - 1 then return false end
+for i = 1, #ARGV - 1 do
+    if not players[ARGV[i]] then return false end
+end
+
+local ttl = redis.call('TTL', KEYS[1])
+redis.call('DEL', KEYS[2])
+for i = 1, #ARGV - 1 do
+    local pid = ARGV[i]
+    players[pid].id = pid
+    write_player(KEYS[i + 2], players[pid])
+    redis.call('RPUSH', KEYS[2], pid)
+    if ttl > 0 then redis.call('EXPIRE', KEYS[i + 2], ttl) end
+end
+if ttl > 0 then redis.call('EXPIRE', KEYS[2], ttl) end
+redis.call('HDEL', KEYS[1], 'players')
+return 1
+""")
+
+# KEYS: game, stream
+# ARGV: events as JSON objects
+# Numbers, logs and publishes events produced outside the other scripts (status changes, spawns)
+PUBLISH_EVENTS = _script(r"""
+for i = 1, #ARGV - 1 do
+    emit(ARGV[i])
+end
+return #ARGV - 1
+""")
+
+# Game codes are four letters. Lobby codes are the only thing keeping strangers out of a game, so the caller
+# draws the candidates at random and a code handed out says nothing about the next one.
+CODE_SPACE = 26 ** 4
+
+# KEYS: leases, then game:{code} and code:{code} for each candidate
+# ARGV: lease ttl in seconds, now, then the candidate codes
+# Returns the first candidate reserved, or nil when every one is taken
+ALLOCATE_CODE = _script(r"""
+local ttl, now = tonumber(ARGV[1]), tonumber(ARGV[2])
+
+-- Leases of expired games go back to the pool
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= %(space)d then return false end
+
+for i = 3, #ARGV - 1 do
+    local game_key, code_key = KEYS[2 * i - 4], KEYS[2 * i - 3]
+    -- Games from before the allocator hold their code without a lease
+    if redis.call('EXISTS', game_key) == 0 and redis.call('SET', code_key, '1', 'NX', 'EX', ttl) then
+        redis.call('ZADD', KEYS[1], now + ttl, ARGV[i])
+        return ARGV[i]
+    end
+end
+return false
+""" % {"space": CODE_SPACE})
+
+# Game ownership across nodes (see ownership.py). Lease keys are game:{code}:owner holding the node id.
+
+# KEYS: alive nodes, then the lease of each code in ARGV
+# ARGV: node, lease ms, now, then the codes the node believes it holds
+# Refreshes the node's heartbeat and extends its leases; returns the codes whose lease it no longer has
+RENEW_LEASES = _script(r"""
+local node, ttl, now = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+redis.call('ZADD', KEYS[1], now + ttl / 1000, node)
+local lost = {}
+for i = 4, #ARGV - 1 do
+    local owner_key = KEYS[i - 2]
+    if redis.call('GET', owner_key) == node then
+        redis.call('PEXPIRE', owner_key, ttl)
+    else
+        table.insert(lost, ARGV[i])
+    end
+end
+return lost
+""")
+
+# KEYS: running games, alive nodes, then the game hash and lease of each code in ARGV
+# ARGV: node, lease ms, now, number of games the node holds, then the codes listed as running
+# Forgets dead nodes and games no longer playing, then claims unowned games until the node holds its
+# fair share, ceil(running / live nodes). A game still in its lobby stays listed: the node holding its lease
+# is starting it. Returns {share, claimed codes...}
+CLAIM_GAMES = _script(r"""
+local node, ttl, now, held = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local nodes = math.max(redis.call('ZCARD', KEYS[2]), 1)
+
+local running = {}
+for i = 5, #ARGV - 1 do
+    local game_key, owner_key = KEYS[2 * i - 7], KEYS[2 * i - 6]
+    local status = redis.call('HGET', game_key, 'status')
+    if status == 'playing' then
+        table.insert(running, {ARGV[i], owner_key})
+    elseif status ~= 'lobby' then
+        redis.call('SREM', KEYS[1], ARGV[i])
+    end
+end
+
+local share = math.ceil(#running / nodes)
+local result = {share}
+for _, game in ipairs(running) do
+    if held >= share then break end
+    if redis.call('SET', game[2], node, 'NX', 'PX', ttl) then
+        table.insert(result, game[1])
+        held = held + 1
+    end
+end
+return result
+""")
+
+# KEYS: alive nodes, then the lease of each code in ARGV
+# ARGV: node, 1 when the node is leaving the cluster, then the codes to give up
+RELEASE_LEASES = _script(r"""
+local node = ARGV[1]
+for i = 3, #ARGV - 1 do
+    local owner_key = KEYS[i - 1]
+    if redis.call('GET', owner_key) == node then redis.call('DEL', owner_key) end
+end
+if ARGV[2] == '1' then redis.call('ZREM', KEYS[1], node) end
+return 1
+""")
+
+SCRIPTS: Dict[str, str] = {
+    "allocate_code": ALLOCATE_CODE,
+    "join_game": JOIN_GAME,
+    "migrate_players": MIGRATE_PLAYERS,
+    "submit_word": SUBMIT_WORD,
+    "damage_player": DAMAGE_PLAYER,
+    "expire_words": EXPIRE_WORDS,
+    "trigger_power": TRIGGER_POWER,
+    "publish_events": PUBLISH_EVENTS,
+    "renew_leases": RENEW_LEASES,
+    "claim_games": CLAIM_GAMES,
+    "release_leases": RELEASE_LEASES,
+}
+
+# SHA1 digests are what EVALSHA expects, so they can be computed without asking Redis
+SCRIPT_SHAS: Dict[str, str] = {name: hashlib.sha1(src.encode()).hexdigest() for name, src in SCRIPTS.items()}
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+# Cheap checks on websocket input, run before anything reaches the game backend.
+
+# Messages a socket may send per second, and how many it may send in a burst
+INPUT_RATE = float(os.getenv("INPUT_RATE", 10))
+INPUT_BURST = int(os.getenv("INPUT_BURST", 20))
+
+class TokenBucket:
+    def __init__(self, rate: float = INPUT_RATE, burst: int = INPUT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+# The texts currently on one player's screen, kept up to date from the game events their socket receives.
+# A submit whose text is not here cannot match, so it is answered without a backend call.
+class VisibleWords:
+    def __init__(self, pid: str):
+        self.pid = pid
+        self.ids: Dict[str, str] = {}
+        # Texts can be on screen more than once
+        self.texts: Counter = Counter()
+        # Seeded games announce spawns by tick: planner(seed, tick, pid, interval) works out the word a tick
+        # gives the player, once the seed is known from the game state or the status change that starts it
+        self.planner: Optional[Callable[[int, int, str, float], Dict]] = None
+        self.seed: Optional[int] = None
+        self.interval = 0.0
+
+    def seeded(self, seed: int, interval: float):
+        self.seed = seed
+        self.interval = interval
+
+    def __contains__(self, text: str) -> bool:
+        return self.texts[text] > 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self, words: Dict[str, Dict]):
+        for word in words.values():
+            self._add(word["id"], word["text"])
+
+    def observe(self, data: str):
+        # Called with every published frame; only word, spawn and clear-screen events are parsed
+        if '"word_' not in data and "effect_clear_screen" not in data and "spawn_" not in data:
+            return
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return
+        for event in msg["events"] if msg.get("type") == "batch" else [msg]:
+            kind = event.get("type")
+            if kind == "word_spawn" and event.get("target_pid") == self.pid:
+                self._add(event["word"]["id"], event["word"]["text"])
+            elif kind == "spawn_tick" and self.pid in event["targets"]:
+                if self.planner is not None and self.seed is not None:
+                    word = self.planner(self.seed, event["tick"], self.pid, self.interval)
+                    self._add(word["id"], word["text"])
+            elif kind == "status_change" and "spawn_seed" in event:
+                self.seeded(event["spawn_seed"], event["spawn_interval"])
+            elif kind == "word_cleared" and event.get("player_id") == self.pid:
+                self._remove(event["word_id"])
+            elif kind == "word_expired" and event.get("target_pid") == self.pid:
+                self._remove(event["word_id"])
+            elif kind == "effect_clear_screen" and event.get("target_pid") == self.pid:
+                self.ids.clear()
+                self.texts.clear()
+
+    def _add(self, wid: str, text: str):
+        if wid not in self.ids:
+            self.ids[wid] = text
+            self.texts[text] += 1
+
+    def _remove(self, wid: str):
+        text = self.ids.pop(wid, None)
+        if text is not None:
+            self.texts[text] -= 1
+            if self.texts[text] <= 0:
+                del self.texts[text]
@@ -0,0 +1,129 @@
+import bisect
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Leaderboards per difficulty and time window, one sorted set each:
+#   leaderboard:{difficulty}:all, leaderboard:{difficulty}:daily:{day}, leaderboard:{difficulty}:weekly:{week}
+# Days count from the Unix epoch in UTC and weeks start on Monday. Members are player ids with their best
+# score in the window; two players may pick the same name, so display names live apart, in the hash
+# leaderboard:{difficulty}:names. Boards are written once per match, in the same script that ends it
+# (game_scripts.py, rank_players); practice games are not ranked. Reads never scan: the top N is a range from
+# the head and a player's neighbourhood is a rank lookup plus a short range, both O(log n).
+
+WINDOWS = ("daily", "weekly", "all")
+DIFFICULTIES = ("easy", "hard", "insane")
+
+# A window's board lingers this long after its last write, then Redis drops it
+WINDOW_TTL = {"daily": 2 * 86400, "weekly": 15 * 86400, "all": 0}
+
+# The top N page is served from process memory for this many seconds
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", 5.0))
+TOP_N = 20
+
+def window_id(window: str, now: float) -> str:
+    day = int(now // 86400)
+    if window == "daily":
+        return f"daily:{day}"
+    if window == "weekly":
+        # Day 0 was a Thursday
+        return f"weekly:{(day + 3) // 7}"
+    return "all"
+
+def leaderboard_key(difficulty: str, window: str, now: Optional[float] = None) -> str:
+    return f"leaderboard:{difficulty}:{window_id(window, time.time() if now is None else now)}"
+
+def names_key(difficulty: str) -> str:
+    return f"leaderboard:{difficulty}:names"
+
+def match_score(words_cleared: int, health: int, elapsed: float) -> int:
+    # Ten points a word, one per health point left, plus words per minute over the match (at least a second)
+    wpm = words_cleared / (max(elapsed, 1.0) / 60)
+    return words_cleared * 10 + max(health, 0) + math.floor(wpm)
+
+class Leaderboards:
+    def __init__(self, redis, cache_ttl: float = LEADERBOARD_CACHE_TTL):
+        self.redis = redis
+        self.cache_ttl = cache_ttl
+        # key -> (expiry on the monotonic clock, entries requested, entries)
+        self.cache: Dict[str, Tuple[float, int, List[Dict]]] = {}
+        self.metrics = None  # Optional metrics.Metrics counting cache hits and misses
+
+    async def top(self, difficulty: str, window: str, n: int = TOP_N) -> List[Dict]:
+        key = leaderboard_key(difficulty, window)
+        now = time.monotonic()
+        cached = self.cache.get(key)
+        # A cached board shorter than what was asked for is the whole board, so it answers any n
+        hit = cached is not None and cached[0] > now and (cached[1] >= n or len(cached[2]) < cached[1])
+        if self.metrics is not None:
+            self.metrics.leaderboard_cache.labels("hit" if hit else "miss").inc()
+        if hit:
+            return cached[2][:n]
+        entries = await self._range(difficulty, key, 0, n - 1)
+        # Boards of past windows stop being asked for; their entries go once they have expired
+        for stale in [k for k, (expiry, _, _) in self.cache.items() if expiry <= now]:
+            del self.cache[stale]
+        self.cache[key] = (now + self.cache_ttl, n, entries)
+        return entries
+
+    async def around(self, difficulty: str, window: str, player: str, radius: int = 5) -> Optional[List[Dict]]:
+        # The player's entry with up to `radius` neighbours on each side; None when they are not on the board
+        key = leaderboard_key(difficulty, window)
+        rank = await self.redis.zrevrank(key, player)
+        if rank is None:
+            return None
+        start = max(0, rank - radius)
+        return await self._range(difficulty, key, start, rank + radius)
+
+    async def _range(self, difficulty: str, key: str, start: int, stop: int) -> List[Dict]:
+        rows = await self.redis.zrevrange(key, start, stop, withscores=True)
+        names = await self.redis.hmget(names_key(difficulty), [player for player, _ in rows]) if rows else []
+        return [{"rank": start + i + 1, "player": player, "name": name or player, "score": int(score)}
+                for i, ((player, score), name) in enumerate(zip(rows, names))]
+
+# The same boards in process memory for the memory backend: per key a score per player and the entries kept
+# sorted by (-score, player), so ranks come from a binary search
+class MemoryLeaderboards(Leaderboards):
+    def __init__(self, cache_ttl: float = LEADERBOARD_CACHE_TTL):
+        super().__init__(None, cache_ttl)
+        self.scores: Dict[str, Dict[str, int]] = {}
+        self.order: Dict[str, List[Tuple[int, str]]] = {}
+        # difficulty -> player -> display name
+        self.names: Dict[str, Dict[str, str]] = {}
+
+    def record(self, difficulty: str, results: List[Tuple[str, str, int]], now: Optional[float] = None):
+        # Results are (player, name, score). Keeps each player's best score, like ZADD GT; windows that have
+        # ended are dropped with their keys
+        now = time.time() if now is None else now
+        self.names.setdefault(difficulty, {}).update((player, name) for player, name, _ in results)
+        live = {leaderboard_key(difficulty, window, now) for window in WINDOWS}
+        for key in [k for k in self.scores if k.startswith(f"leaderboard:{difficulty}:") and k not in live]:
+            del self.scores[key], self.order[key]
+        for key in live:
+            scores = self.scores.setdefault(key, {})
+            order = self.order.setdefault(key, [])
+            for player, _, score in results:
+                old = scores.get(player)
+                if old is not None and old >= score:
+                    continue
+                if old is not None:
+                    del order[bisect.bisect_left(order, (-old, player))]
+                scores[player] = score
+                bisect.insort(order, (-score, player))
+
+    async def around(self, difficulty: str, window: str, player: str, radius: int = 5) -> Optional[List[Dict]]:
+        key = leaderboard_key(difficulty, window)
+        score = self.scores.get(key, {}).get(player)
+        if score is None:
+            return None
+        rank = bisect.bisect_left(self.order[key], (-score, player))
+        start = max(0, rank - radius)
+        return await self._range(difficulty, key, start, rank + radius)
+
+    async def _range(self, difficulty: str, key: str, start: int, stop: int) -> List[Dict]:
+        # A stop of -1 is the end of the board, as in ZREVRANGE
+        rows = self.order.get(key, [])[start:stop + 1 or None]
+        names = self.names.get(difficulty, {})
+        return [{"rank": start + i + 1, "player": player, "name": names.get(player, player), "score": -neg}
+                for i, (neg, player) in enumerate(rows)]
@@ -1,26 +1,40 @@
 from fasthtml.common import *
 from starlette.websockets import WebSocket, WebSocketDisconnect
-from game import GameManager
+from game import create_game_manager
+from dispatcher import SlowConsumer
+from assets import AssetManifest
+from pages import StaticPage, PageTemplate
+from inputguard import TokenBucket, VisibleWords
+from spawnplan import plan_word, spawn_pools
+from leaderboard import DIFFICULTIES, WINDOWS
+from functools import partial
+import wire
 import os
 import asyncio
+import hashlib
 import json
-import time
 
 # Init GameManager
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-gm = GameManager(redis_url)
+gm = create_game_manager(redis_url)
+
+# Static files are fingerprinted and loaded into memory once, from an explicit list
+assets = AssetManifest.load(os.path.dirname(os.path.abspath(__file__)))
 
 app, rt = fast_app(
     hdrs=(
         Link(rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/materialize/1.0.0/css/materialize.min.css'),
         Script(src='https://cdnjs.cloudflare.com/ajax/libs/materialize/1.0.0/js/materialize.min.js'),
-        Link(rel='stylesheet', href='index.css'),
+        Link(rel='stylesheet', href=assets.url('index.css')),
     ), 
-    pico=False
+    pico=False,
+    on_startup=[gm.load_scripts, gm.migrate_legacy_games, gm.join_cluster],
+    on_shutdown=[gm.leave_cluster]
 )
+# fast_app always mounts a catch-all file route for static extensions; only manifest assets are served here
+app.router.routes = [r for r in app.router.routes if getattr(r, "path", None) != "/{fname:path}.{ext:static}"]
 
-@rt('/')
-def get():
+def landing_page():
     return Title("Typing Duel 3D"), Div(
         H1("Typing Duel 3D", cls="center-align teal-text text-lighten-2"),
         Div(
@@ -136,10 +150,16 @@ def get():
             ),
             cls="row"
         ),
+        P(A("Leaderboards", href="/leaderboard", cls="teal-text"), cls="center-align"),
         cls="container", style="margin-top: 5vh;"
     )
 
+# The landing page never changes while the process runs, so it is rendered once
+landing = StaticPage(landing_page)
 
+@rt('/')
+def get(req):
+    return landing.response(req)
 
 @rt('/create')
 async def post(name: str, difficulty: str, powers: list[str] = None):
@@ -167,14 +187,7 @@ async def post(name: str, code: str):
         return Title("Error"), Div(H4("Could not join game"), P("Invalid code or game full."), A("Back", href="/join", cls="btn"), cls="container")
     return RedirectResponse(f"/lobby/{code}?pid={pid}", status_code=303)
 
-@rt('/lobby/{code}')
-async def get(code: str, pid: str):
-    game = await gm.get_game_state(code)
-    if not game:
-        return RedirectResponse("/", status_code=303)
-    
-    is_host = (game["host_id"] == pid)
-    
+def lobby_page(code: str, pid: str, is_host: str, start_style: str):
     return Title(f"Lobby {code}"), Div(
         H2(f"Lobby: {code}", cls="center-align"),
         Div(id="lobby-status", cls="center-align flow-text"),
@@ -183,9 +196,9 @@ async def get(code: str, pid: str):
              # Hidden inputs to pass data to JS
              Input(type="hidden", id="game-code", value=code),
              Input(type="hidden", id="player-id", value=pid),
-             Input(type="hidden", id="is-host", value="true" if is_host else "false"),
+             Input(type="hidden", id="is-host", value=is_host),
              
-             Button("Start Game", id="start-btn", cls="btn-large pulse", style="display: none;" if not is_host else "", disabled=True),
+             Button("Start Game", id="start-btn", cls="btn-large pulse", style=start_style, disabled=True),
              
              cls="center-align"
         ),
@@ -193,62 +206,185 @@ async def get(code: str, pid: str):
         Div(id="game-container", style="width: 100%; height: 600px; display: none;"),
         
         Script(src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/three.min.js"),
-        Script(src=f"/game_client.js?v={int(time.time())}"), 
+        # Fingerprinted URLs for the audio the client loads at runtime
+        Script(f"window.ASSET_URLS = {json.dumps(assets.urls())};"),
+        Script(src=assets.url("game_client.js")),
         cls="container"
     )
 
-# Serve static files
-@rt("/{fname:path}.{ext:static}")
-async def get(fname: str, ext: str): 
-    return FileResponse(f'{fname}.{ext}')
+# Only the code, the pid and the host flag differ between lobbies
+lobby = PageTemplate(lobby_page, ["code", "pid", "is_host", "start_style"], "/lobby/{code}?pid={pid}")
+
+@rt('/lobby/{code}')
+async def get(req, code: str, pid: str):
+    game = await gm.get_game_state_cached(code)
+    if not game:
+        return RedirectResponse("/", status_code=303)
+    
+    is_host = (game["host_id"] == pid)
+    return lobby.response(req, code=code, pid=pid, is_host="true" if is_host else "false",
+                          start_style="" if is_host else "display: none;")
+
+@rt('/metrics')
+def get():
+    # Prometheus text exposition, rendered from in-process counters
+    return Response(gm.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-@rt("/{fname:path}.m4a")
-async def get(fname: str): 
-    return FileResponse(f'{fname}.m4a')
+def leaderboard_table(entries, highlight=None):
+    rows = [Tr(Td(e["rank"]), Td(e["name"]), Td(e["score"]), cls="teal lighten-4" if e["player"] == highlight else "")
+            for e in entries]
+    return Table(Thead(Tr(Th("#"), Th("Player"), Th("Score"))), Tbody(*rows), cls="striped")
+
+@rt('/leaderboard')
+async def get(difficulty: str = "easy", window: str = "daily", player: str = ""):
+    # `player` is a player id; the game over screen links here with the player's own
+    if difficulty not in DIFFICULTIES or window not in WINDOWS:
+        return Response(status_code=404)
+    titles = {"daily": "Today", "weekly": "This week", "all": "All time"}
+    suffix = f"&player={player}" if player else ""
+    tabs = Div(*[A(f"{d.title()} · {titles[w]}", href=f"/leaderboard?difficulty={d}&window={w}{suffix}",
+                   cls="btn-small" + ("" if (d, w) == (difficulty, window) else " btn-flat"), style="margin: 2px;")
+                 for d in DIFFICULTIES for w in WINDOWS], cls="center-align")
+    top = await gm.leaderboards.top(difficulty, window)
+    content = [leaderboard_table(top, player) if top else P("No matches yet.", cls="grey-text center-align")]
+    if player:
+        around = await gm.leaderboards.around(difficulty, window, player)
+        content += [H5("Around you"), leaderboard_table(around, player) if around else P("Not ranked here yet.", cls="grey-text")]
+    return Title("Leaderboards"), Div(H2("Leaderboards", cls="center-align"), tabs, *content,
+                                      P(A("Back", href="/", cls="btn"), cls="center-align"), cls="container")
+
+# Word pools for clients generating seeded spawns themselves; built once per difficulty
+spawn_pool_bodies = {}
+
+@rt('/spawn-pools/{difficulty}')
+def get(req, difficulty: str):
+    if difficulty not in ("easy", "hard", "insane"):
+        return Response(status_code=404)
+    if difficulty not in spawn_pool_bodies:
+        body = json.dumps(spawn_pools(gm.words, difficulty)).encode()
+        spawn_pool_bodies[difficulty] = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+    body, etag = spawn_pool_bodies[difficulty]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if req.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# Serve static files from the asset manifest only
+@rt('/assets/{fname}')
+def get(req, fname: str):
+    return assets.serve(req.headers, fname, fingerprinted=True)
+
+def plain_asset(name):
+    def get(req):
+        return assets.serve(req.headers, name)
+    return get
+
+for name in assets.names:
+    rt(f"/{name}")(plain_asset(name))
 
 async def ws_game(ws: WebSocket):
     code = ws.path_params['code']
     pid = ws.path_params['pid']
     
-    await ws.accept()
-    
-    # Subscribe to Redis channel
-    pubsub = gm.redis.pubsub()
-    await pubsub.subscribe(f"game:{code}:events")
+    # Clients offering the binary subprotocol get compact frames, everyone else keeps JSON text
+    subprotocol = wire.negotiate(ws.scope.get("subprotocols", []))
+    await ws.accept(subprotocol=subprotocol)
+    encoder = wire.CODECS.get(subprotocol)
     
-    # Send current state
-    game = await gm.get_game_state(code)
+    # Register with the process-wide dispatcher instead of opening a Redis subscription per socket
+    sub = await gm.events.subscribe(f"game:{code}:events", encoder)
+    # The words on this player's screen follow the socket's own events from here on
+    visible = VisibleWords(pid)
+    sub.watch = visible.observe
+    game = await gm.get_game_state_cached(code)
     if game:
-         await ws.send_text(json.dumps({"type": "game_state", "game": game}))
+        visible.planner = partial(plan_word, gm.words, game.get("difficulty", "easy"))
+        if "spawn_seed" in game:
+            visible.seeded(game["spawn_seed"], game["spawn_interval"])
+    
+    async def send(frame):
+        if isinstance(frame, bytes):
+            await ws.send_bytes(frame)
+        else:
+            await ws.send_text(frame)
+    
+    # A reconnecting client names the last event it saw and gets only the missing tail from the game's log;
+    # anyone else, or a client the log no longer reaches back to, gets a full snapshot
+    last_seq = ws.query_params.get("last_seq", "")
+    missed = await gm.events_since(code, int(last_seq)) if last_seq.isdigit() else None
+    if missed is not None:
+        sub.resume_after = int(last_seq) + len(missed)
+        if missed:
+            replay = f'{{"seq": {sub.resume_after}, "type": "batch", "events": [{", ".join(missed)}]}}'
+            await send(encoder(replay) if encoder else replay)
+    else:
+        game = await gm.get_snapshot(code)
+        if game:
+            sub.resume_after = game["seq"]
+            state = json.dumps({"type": "game_state", "game": game})
+            await send(encoder(state) if encoder else state)
+    visible.load(await gm.get_words(code, pid))
+    # Every message spends a token; a client sending faster than the refill rate has the excess dropped
+    bucket = TokenBucket()
     
-    async def redis_reader():
+    async def socket_writer():
         try:
-            async for message in pubsub.listen():
-                if message["type"] == "message":
-                    await ws.send_text(message["data"])
+            while True:
+                await send(await sub.get())
+        except SlowConsumer:
+            pass
+        except Exception as e:
+            print(f"Socket writer error: {e}")
+
+    async def slow_consumer_guard():
+        # The bounded queue could not make room; the writer may be stuck in a send, so it is not waited for
+        await sub.overflowed.wait()
+        writer_task.cancel()
+        print(f"Disconnecting slow consumer {pid}")
+        try:
+            await asyncio.wait_for(ws.close(code=1013), 1.0)
         except Exception as e:
-            print(f"Redis reader error: {e}")
+            print(f"Close error for {pid}: {e}")
 
-    # Start reader task
-    reader_task = asyncio.create_task(redis_reader())
+    # Start writer task
+    writer_task = asyncio.create_task(socket_writer())
+    guard_task = asyncio.create_task(slow_consumer_guard())
     
     try:
         while True:
             data = await ws.receive_text()
+            if not bucket.take():
+                gm.metrics.input_rejected.labels("rate_limited").inc()
+                continue
             try:
                 msg = json.loads(data)
                 if msg.get("type") == "start_game":
                     # Verify host
-                    game = await gm.get_game_state(code)
-                    if game and game["host_id"] == pid:
-                         await gm.set_game_status(code, "playing")
-                         asyncio.create_task(gm.start_game_loop(code))
+                    game = await gm.get_game_state_cached(code)
+                    # A repeated start_game must not reset start_time or spawn a second loop, here or on another node
+                    if game and game["host_id"] == pid and game["status"] != "playing" and code not in gm.scheduler:
+                         await gm.start_game(code)
                 
                 elif msg.get("type") == "submit_word":
                     word = msg.get("word")
-                    if word:
+                    # A text that is not on the player's screen cannot match, so the backend is not asked
+                    if word and word not in visible:
+                        gm.metrics.input_rejected.labels("no_match").inc()
+                    elif word:
                         await gm.submit_word(code, pid, word)
                 
+                elif msg.get("type") == "sync":
+                    # The client saw a gap in the event numbers and asks what changed since the last one it trusts
+                    since = msg.get("since")
+                    state = await gm.state_delta(code, since) if isinstance(since, int) and since >= 0 else None
+                    if state is None:
+                        game = await gm.get_snapshot(code)
+                        state = {"type": "game_state", "game": game} if game else None
+                    if state:
+                        # Queued behind the frames already waiting, so it never lands before older events
+                        text = json.dumps(state)
+                        sub.deliver(text, encoder(text) if encoder else None)
+                
                 elif msg.get("type") == "debug_log":
                     print(f"CLIENT DEBUG ({pid}): {msg.get('msg')}")
 
@@ -260,13 +396,14 @@ async def ws_game(ws: WebSocket):
         print(f"WebSocket error for {pid}: {e}")
     finally:
         print(f"Cleaning up connection for {pid}")
-        reader_task.cancel()
-        try:
-            await reader_task
-        except asyncio.CancelledError:
-            pass
-        await pubsub.unsubscribe()
-        await pubsub.close()
+        writer_task.cancel()
+        guard_task.cancel()
+        for task in (writer_task, guard_task):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await gm.events.unsubscribe(sub)
 
 app.add_websocket_route("/ws/game/{code}/{pid}", ws_game)
 
@@ -0,0 +1,476 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import wire
+from spawnplan import plan_word
+from wire import POS_SCALE, VEL_SCALE, SPECIAL_FLAG, VY_FLAG
+from wordbank import WordBank
+
+# Append-only recordings of every event a match publishes, one file per game and recording node.
+#
+# File: magic, then the game code, difficulty and start time, then records until the end of the file.
+# Record: varint milliseconds since the previous record (the start time for the first), a one byte tag, fields.
+# Integers are varints, signed ones zigzagged. Player ids, word ids and word texts are interned: a varint
+# reference, where 0 introduces a new string (varint length plus UTF-8) that takes the next number, so a text
+# or id is spelled out once per file. Coordinates use the fixed point of wire.py; spawn_time is not kept,
+# the record time stands in for it. A SEQ record sets the number of the next event, and each event after it
+# counts up by one, as in the binary wire protocol. Events without a layout are stored as JSON.
+#
+# A node that takes over a running game starts a file of its own; each file is a valid log from its first event.
+
+MAGIC = b"TDM1"
+SUFFIX = ".tdm"
+
+# How often buffered events are handed to the writer thread
+MATCH_FLUSH_INTERVAL = float(os.getenv("MATCH_FLUSH_INTERVAL", 1.0))
+
+TAG_JSON = 0
+TAG_WORD_SPAWN = 1
+TAG_WORD_CLEARED = 2
+TAG_WORD_EXPIRED = 3
+TAG_HEALTH_UPDATE = 4
+TAG_SPAWN_TICK = 5
+TAG_SEQ = 6
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def _zigzag(n: int) -> bytes:
+    return _varint(n * 2 if n >= 0 else -n * 2 - 1)
+
+def _text(value: str) -> bytes:
+    data = value.encode()
+    return _varint(len(data)) + data
+
+def _fixed(value, scale) -> int:
+    return round(float(value) * scale)
+
+class MatchWriter:
+    def __init__(self, path: str, code: str, difficulty: str, start_ms: int):
+        self.path = path
+        self.f = open(path, "wb")
+        self.f.write(MAGIC + _text(code) + _text(difficulty) + _varint(start_ms))
+        self.strings: Dict[str, int] = {}
+        self.last_ms = start_ms
+        self.next_seq: Optional[int] = None
+
+    def _ref(self, value) -> bytes:
+        value = "" if value is None else str(value)
+        ref = self.strings.get(value)
+        if ref is not None:
+            return _varint(ref)
+        self.strings[value] = len(self.strings) + 1
+        return b"\x00" + _text(value)
+
+    def _event(self, event: Dict) -> bytes:
+        kind = event.get("type")
+        if kind == "word_spawn":
+            w = event["word"]
+            flags = (SPECIAL_FLAG if w.get("is_special") else 0) | (VY_FLAG if w.get("vy") is not None else 0)
+            return (bytes([TAG_WORD_SPAWN]) + self._ref(event["target_pid"]) + self._ref(w["id"]) + self._ref(w["text"])
+                    + bytes([flags]) + _zigzag(_fixed(w["x"], POS_SCALE)) + _zigzag(_fixed(w["y"], POS_SCALE))
+                    + _zigzag(_fixed(w.get("vx") or 0.0, VEL_SCALE)) + _zigzag(_fixed(w.get("vy") or 0.0, VEL_SCALE))
+                    + _varint(round(float(w["duration"]) * 1000)))
+        if kind == "word_cleared":
+            return (bytes([TAG_WORD_CLEARED]) + self._ref(event["player_id"]) + self._ref(event["word_id"])
+                    + _varint(event["new_power"]) + _varint(event.get("combo") or 0) + self._ref(event.get("triggered_power")))
+        if kind == "word_expired":
+            return bytes([TAG_WORD_EXPIRED]) + self._ref(event["target_pid"]) + self._ref(event["word_id"])
+        if kind == "health_update":
+            combo = event.get("combo")
+            return (bytes([TAG_HEALTH_UPDATE]) + self._ref(event["player_id"]) + _zigzag(event["new_health"])
+                    + _varint(0 if combo is None else combo + 1))
+        if kind == "spawn_tick":
+            targets = event["targets"]
+            return bytes([TAG_SPAWN_TICK]) + _varint(event["tick"]) + _varint(len(targets)) + b"".join(map(self._ref, targets))
+        raise ValueError(kind)
+
+    def encode(self, t_ms: int, event: Dict) -> bytes:
+        out = []
+        seq = event.pop("seq", None)
+        if seq != self.next_seq:
+            out.append(_varint(0) + bytes([TAG_SEQ]) + _varint(seq or 0))
+        self.next_seq = seq + 1 if seq else None
+        # Clocks of different nodes can disagree by a little; the log never goes backwards
+        delta = max(0, t_ms - self.last_ms)
+        self.last_ms += delta
+        try:
+            body = self._event(event)
+        except (KeyError, TypeError, ValueError):
+            body = bytes([TAG_JSON]) + _text(json.dumps(event))
+        out.append(_varint(delta) + body)
+        return b"".join(out)
+
+    def write(self, records: List[Tuple[int, str]]):
+        # Published texts as they came off the channel: single events or batches
+        out = []
+        for t_ms, data in records:
+            msg = json.loads(data)
+            for event in msg["events"] if msg.get("type") == "batch" else [msg]:
+                out.append(self.encode(t_ms, event))
+        self.f.write(b"".join(out))
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+# Buffers the events of the games recorded here and writes them out in batches on a worker thread, so the
+# event loop only appends to a list. Subscriptions are opened by the GameManager, which calls observe.
+class MatchRecorder:
+    def __init__(self, directory: str, flush_interval: float = MATCH_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        # code -> (difficulty, start ms) for the file header, kept until the file is finished
+        self.headers: Dict[str, Tuple[str, int]] = {}
+        # code -> watch subscription of the games being recorded
+        self.subs: Dict[str, object] = {}
+        self.pending: Dict[str, List[Tuple[int, str]]] = {}
+        self.closing: Set[str] = set()
+        # Only touched on the writer thread, one flush at a time
+        self.writers: Dict[str, MatchWriter] = {}
+        self.lock = asyncio.Lock()
+        self.bytes_written = 0
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.subs
+
+    def start(self, code: str, difficulty: str, sub):
+        # A game recorded here again before its file was finished carries on in the same file
+        self.headers.setdefault(code, (difficulty, now_ms()))
+        self.subs[code] = sub
+        self.closing.discard(code)
+
+    def observe(self, code: str, data: str):
+        # Frames still in flight to a subscription being closed are not recorded
+        if code not in self.subs:
+            return
+        self.pending.setdefault(code, []).append((now_ms(), data))
+
+    def stop(self, code: str, discard: bool = False):
+        # Returns the subscription to close; the file is finished by the next flush
+        sub = self.subs.pop(code, None)
+        if discard:
+            self.pending.pop(code, None)
+        self.closing.add(code)
+        return sub
+
+    async def flush(self, key: str = "matches:flush") -> bool:
+        async with self.lock:
+            batches, self.pending = self.pending, {}
+            closing, self.closing = self.closing, set()
+            headers = {code: self.headers[code] for code in batches}
+            for code in closing:
+                self.headers.pop(code, None)
+            if batches or closing:
+                await asyncio.to_thread(self._write, batches, headers, closing)
+        return True
+
+    def _write(self, batches: Dict[str, List[Tuple[int, str]]], headers: Dict[str, Tuple[str, int]], closing: Set[str]):
+        for code, records in batches.items():
+            writer = self.writers.get(code)
+            if writer is None:
+                difficulty, start_ms = headers[code]
+                path = os.path.join(self.directory, f"{code}-{start_ms}{SUFFIX}")
+                writer = self.writers[code] = MatchWriter(path, code, difficulty, start_ms)
+            before = writer.f.tell()
+            try:
+                writer.write(records)
+            except (OSError, ValueError) as e:
+                print(f"Match log write failed for {code}: {e}")
+            self.bytes_written += writer.f.tell() - before
+        for code in closing:
+            writer = self.writers.pop(code, None)
+            if writer is not None:
+                writer.close()
+
+# Streams a log back without reading it whole: records are decoded from a small buffer refilled as it drains
+class MatchReader:
+    CHUNK = 1 << 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self.f = open(path, "rb")
+        self.buf = b""
+        self.pos = 0
+        if self._take(4) != MAGIC:
+            self.f.close()
+            raise ValueError(f"{path} is not a match log")
+        self.code = self._str()
+        self.difficulty = self._str()
+        self.start_ms = self._varint()
+        self.strings: List[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def _fill(self, n: int) -> bool:
+        if len(self.buf) - self.pos >= n:
+            return True
+        self.buf = self.buf[self.pos:] + self.f.read(max(n, self.CHUNK))
+        self.pos = 0
+        return len(self.buf) >= n
+
+    def _take(self, n: int) -> bytes:
+        if not self._fill(n):
+            raise EOFError(self.path)
+        self.pos += n
+        return self.buf[self.pos - n:self.pos]
+
+    def _byte(self) -> int:
+        if self.pos >= len(self.buf) and not self._fill(1):
+            raise EOFError(self.path)
+        self.pos += 1
+        return self.buf[self.pos - 1]
+
+    def _varint(self) -> int:
+        n = shift = 0
+        while True:
+            b = self._byte()
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def _signed(self) -> int:
+        n = self._varint()
+        return (n >> 1) ^ -(n & 1)
+
+    def _str(self) -> str:
+        return self._take(self._varint()).decode()
+
+    def _ref(self) -> str:
+        ref = self._varint()
+        if ref == 0:
+            self.strings.append(self._str())
+            return self.strings[-1]
+        return self.strings[ref - 1]
+
+    def _event(self, tag: int) -> Dict:
+        if tag == TAG_JSON:
+            return json.loads(self._str())
+        if tag == TAG_WORD_SPAWN:
+            pid, wid, text, flags = self._ref(), self._ref(), self._ref(), self._byte()
+            x, y, vx, vy = self._signed(), self._signed(), self._signed(), self._signed()
+            return {"type": "word_spawn", "target_pid": pid, "word": {
+                "id": wid, "text": text, "x": x / POS_SCALE, "y": y / POS_SCALE, "vx": vx / VEL_SCALE,
+                "vy": vy / VEL_SCALE if flags & VY_FLAG else None, "duration": self._varint() / 1000,
+                "is_special": bool(flags & SPECIAL_FLAG)}}
+        if tag == TAG_WORD_CLEARED:
+            pid, wid, power, combo = self._ref(), self._ref(), self._varint(), self._varint()
+            return {"type": "word_cleared", "player_id": pid, "word_id": wid, "new_power": power, "combo": combo,
+                    "triggered_power": self._ref() or None}
+        if tag == TAG_WORD_EXPIRED:
+            return {"type": "word_expired", "target_pid": self._ref(), "word_id": self._ref()}
+        if tag == TAG_HEALTH_UPDATE:
+            pid, health, combo = self._ref(), self._signed(), self._varint()
+            event = {"type": "health_update", "player_id": pid, "new_health": health}
+            if combo:
+                event["combo"] = combo - 1
+            return event
+        if tag == TAG_SPAWN_TICK:
+            tick = self._varint()
+            return {"type": "spawn_tick", "tick": tick, "targets": [self._ref() for _ in range(self._varint())]}
+        raise ValueError(f"Unknown record tag {tag} in {self.path}")
+
+    def __iter__(self) -> Iterator[Tuple[int, Optional[int], Dict]]:
+        # (time in ms, event seq or None, event); a log cut off mid-record by a crash ends at its last whole record
+        t_ms, seq = self.start_ms, None
+        while self._fill(1):
+            try:
+                t_ms += self._varint()
+                tag = self._byte()
+                if tag == TAG_SEQ:
+                    seq = self._varint() or None
+                    continue
+                event = self._event(tag)
+            except EOFError:
+                return
+            yield t_ms, seq, event
+            if seq is not None:
+                seq += 1
+
+async def replay(path: str, speed: float = 1.0, protocol: Optional[str] = None):
+    # The frames a websocket client would have received, spaced as recorded; speed 0 sends them all at once
+    encoder = wire.CODECS.get(protocol)
+    last = None
+    with MatchReader(path) as reader:
+        for t_ms, seq, event in reader:
+            if speed > 0 and last is not None and t_ms > last:
+                await asyncio.sleep((t_ms - last) / 1000 / speed)
+            last = t_ms
+            text = json.dumps({"seq": seq, **event} if seq else event)
+            yield encoder(text) if encoder else text
+
+# Fixed-width histogram: constant memory however many matches are folded in
+class Histogram:
+    def __init__(self, width: float, buckets: int):
+        self.width = width
+        self.counts = [0] * buckets
+        self.total = 0.0
+        self.n = 0
+
+    def add(self, value: float):
+        self.counts[min(int(max(value, 0) / self.width), len(self.counts) - 1)] += 1
+        self.total += value
+        self.n += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        # Upper edge of the bucket holding the p-th value
+        if not self.n:
+            return None
+        rank, seen = p / 100 * self.n, 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return round((i + 1) * self.width, 6)
+        return len(self.counts) * self.width
+
+    def summary(self) -> Dict:
+        return {"n": self.n, "mean": self.total / self.n if self.n else None,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99)}
+
+class MatchStats:
+    # WPM and accuracy per player per match, reaction time (spawn to clear) per word. Accuracy counts words:
+    # the share of a player's words cleared rather than left to expire, since mistyped submits are not events.
+    def __init__(self):
+        self.matches = 0
+        self.wpm = Histogram(5, 60)
+        self.accuracy = Histogram(0.05, 20)
+        self.reaction = Histogram(0.1, 200)
+        self.words = None
+
+    def _planner(self, difficulty: str, seed: int, interval: float):
+        # Seeded games logged spawn ticks only; their words come from the same plan the server used
+        if self.words is None:
+            self.words = WordBank.load("data", os.getenv("WORD_BANK_SNAPSHOT"))
+        return lambda tick, pid: plan_word(self.words, difficulty, seed, tick, pid, interval)
+
+    def add(self, path: str):
+        # Words on screen are the only per-match state, so a match of any length takes a few kilobytes
+        on_screen: Dict[str, Tuple[int, str, str]] = {}
+        chars: Dict[str, int] = {}
+        cleared: Dict[str, int] = {}
+        expired: Dict[str, int] = {}
+        started = ended = None
+        planner = None
+        with MatchReader(path) as reader:
+            for t_ms, _, event in reader:
+                kind = event.get("type")
+                if kind == "status_change" and event.get("status") == "playing":
+                    started = t_ms
+                    if "spawn_seed" in event:
+                        planner = self._planner(reader.difficulty, event["spawn_seed"], event["spawn_interval"])
+                elif kind == "word_spawn":
+                    on_screen[event["word"]["id"]] = (t_ms, event["target_pid"], event["word"]["text"])
+                elif kind == "spawn_tick" and planner is not None:
+                    for pid in event["targets"]:
+                        word = planner(event["tick"], pid)
+                        on_screen[word["id"]] = (t_ms, pid, word["text"])
+                elif kind == "word_cleared":
+                    spawned = on_screen.pop(event["word_id"], None)
+                    pid = event["player_id"]
+                    cleared[pid] = cleared.get(pid, 0) + 1
+                    if spawned is not None:
+                        chars[pid] = chars.get(pid, 0) + len(spawned[2])
+                        self.reaction.add((t_ms - spawned[0]) / 1000)
+                elif kind == "word_expired":
+                    on_screen.pop(event["word_id"], None)
+                    expired[event["target_pid"]] = expired.get(event["target_pid"], 0) + 1
+                elif kind == "effect_clear_screen":
+                    for wid in [w for w, (_, pid, _) in on_screen.items() if pid == event["target_pid"]]:
+                        del on_screen[wid]
+                elif kind == "game_over":
+                    ended = t_ms
+                if started is None and kind in ("word_spawn", "spawn_tick"):
+                    # A log picked up mid-match by another node starts at its first spawn
+                    started = t_ms
+                last = t_ms
+        if started is None:
+            return
+        self.matches += 1
+        minutes = ((ended or last) - started) / 60000
+        for pid in set(cleared) | set(expired):
+            if minutes > 0:
+                self.wpm.add(chars.get(pid, 0) / 5 / minutes)
+            self.accuracy.add(cleared.get(pid, 0) / (cleared.get(pid, 0) + expired.get(pid, 0)))
+
+    def summary(self) -> Dict:
+        return {"matches": self.matches, "wpm": self.wpm.summary(), "accuracy": self.accuracy.summary(),
+                "reaction_seconds": self.reaction.summary()}
+
+def log_paths(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, f"*{SUFFIX}")))
+        else:
+            yield path
+
+async def serve_replay(path: str, speed: float, port: int):
+    # Each client that connects gets the match from the start, in the subprotocol it negotiates.
+    # Only the replay server needs websockets, so the game server does not import it through here.
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+
+    async def handler(ws):
+        try:
+            async for frame in replay(path, speed, ws.subprotocol):
+                await ws.send(frame)
+        except ConnectionClosed:
+            pass
+
+    async with serve(handler, "0.0.0.0", port, select_subprotocol=lambda ws, offered: wire.negotiate(offered)) as server:
+        print(f"Replaying {path} on ws://0.0.0.0:{port}")
+        await server.serve_forever()
+
+async def print_replay(path: str, speed: float, protocol: Optional[str]):
+    async for frame in replay(path, speed, protocol):
+        print(frame.hex() if isinstance(frame, bytes) else frame, flush=True)
+
+if __name__ == "__main__":
+    # Usage: python matchlog.py replay LOG [--speed 4] [--protocol typingduel.bin.2] [--serve 5002]
+    #        python matchlog.py stats LOG_OR_DIR [...]
+    parser = argparse.ArgumentParser(description="Replay and summarise recorded matches")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_cmd = commands.add_parser("replay", help="print or serve the frames of one match")
+    replay_cmd.add_argument("log")
+    replay_cmd.add_argument("--speed", type=float, default=1.0, help="playback rate; 0 sends everything at once")
+    replay_cmd.add_argument("--protocol", choices=sorted(wire.CODECS), help="binary frames, printed as hex")
+    replay_cmd.add_argument("--serve", type=int, metavar="PORT", help="serve the replay to websocket clients")
+    stats_cmd = commands.add_parser("stats", help="WPM, accuracy and reaction times across matches")
+    stats_cmd.add_argument("logs", nargs="+", help="log files or directories of them")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        if args.serve:
+            asyncio.run(serve_replay(args.log, args.speed, args.serve))
+        else:
+            asyncio.run(print_replay(args.log, args.speed, args.protocol))
+    else:
+        stats = MatchStats()
+        for path in log_paths(args.logs):
+            try:
+                stats.add(path)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+        print(json.dumps(stats.summary(), indent=2))
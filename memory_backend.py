@@ -0,0 +1,390 @@
+import bisect
+from collections import deque
+import heapq
+import json
+import random
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from game import GameManager, GAME_TTL, CODE_CANDIDATES, CODE_ROUNDS, Player, random_code
+from leaderboard import match_score
+from game_scripts import CODE_SPACE, STREAM_LEN
+
+# Authoritative in-process state for single-node deployments (GAME_BACKEND=memory).
+# Every operation runs to completion on the event loop without awaiting in between, which gives the same
+# atomicity the Redis backend gets from its Lua scripts. Rules mirror game_scripts.py; events are the
+# same JSON frames, delivered through in-memory queues instead of pub/sub.
+
+class WordState:
+    __slots__ = ("id", "text", "x", "y", "vx", "vy", "spawn_time", "duration", "is_special")
+
+    def __init__(self, data: Dict):
+        self.id = data["id"]
+        self.text = data["text"]
+        self.x = data.get("x", 0)
+        self.y = data.get("y", 10.0)
+        self.vx = data.get("vx", 0.0)
+        self.vy = data.get("vy")
+        self.spawn_time = data["spawn_time"]
+        self.duration = data["duration"]
+        self.is_special = data.get("is_special", False)
+
+    @property
+    def deadline(self) -> float:
+        return self.spawn_time + self.duration
+
+    def as_dict(self) -> Dict:
+        return {"text": self.text, "id": self.id, "x": self.x, "y": self.y, "vx": self.vx, "vy": self.vy,
+                "spawn_time": self.spawn_time, "duration": self.duration, "is_special": self.is_special}
+
+class PlayerState:
+    __slots__ = ("name", "id", "health", "power", "words_cleared", "combo", "is_ready", "words", "index")
+
+    def __init__(self, player: Player):
+        self.name = player.name
+        self.id = player.id
+        self.health = player.health
+        self.power = player.power
+        self.words_cleared = player.words_cleared
+        self.combo = player.combo
+        self.is_ready = player.is_ready
+        self.words: Dict[str, WordState] = {}
+        # text -> [(deadline, wid)] kept sorted, so duplicates resolve to the one expiring first
+        self.index: Dict[str, List[tuple]] = {}
+
+    def as_dict(self) -> Dict:
+        return asdict(Player(name=self.name, id=self.id, health=self.health, power=self.power,
+                             words_cleared=self.words_cleared, combo=self.combo, is_ready=self.is_ready))
+
+    def add_word(self, word: WordState):
+        self.words[word.id] = word
+        bisect.insort(self.index.setdefault(word.text, []), (word.deadline, word.id))
+
+    def remove_word(self, word: WordState):
+        del self.words[word.id]
+        entries = self.index[word.text]
+        entries.remove((word.deadline, word.id))
+        if not entries:
+            del self.index[word.text]
+
+    def clear_words(self):
+        self.words.clear()
+        self.index.clear()
+
+class GameState:
+    __slots__ = ("code", "host_id", "difficulty", "status", "powers", "start_time", "end_time", "mode", "players",
+                 "expires_at", "seq", "log", "spawn_seed", "spawn_interval", "spawn_tick", "ranked")
+
+    def __init__(self, code: str, host_id: str, difficulty: str, powers: List[str], expires_at: float):
+        self.code = code
+        self.host_id = host_id
+        self.difficulty = difficulty
+        self.status = "lobby"
+        self.powers = powers
+        self.start_time: Optional[float] = None
+        # When the match first ended; its players are scored over start_time to end_time
+        self.end_time: Optional[float] = None
+        self.mode: Optional[str] = None
+        # Insertion order is join order
+        self.players: Dict[str, PlayerState] = {}
+        self.expires_at = expires_at
+        # Event numbering and the recent events kept for replay, as in the Redis stream
+        self.seq = 0
+        self.log: deque = deque(maxlen=STREAM_LEN)
+        # Seeded spawns only: the seed, the tick cadence it was planned for, and the last tick spawned
+        self.spawn_seed: Optional[int] = None
+        self.spawn_interval: Optional[float] = None
+        self.spawn_tick = 0
+        # Set once the match's players are on the leaderboards
+        self.ranked = False
+
+    def as_dict(self) -> Dict:
+        data = {"code": self.code, "host_id": self.host_id, "difficulty": self.difficulty,
+                "status": self.status, "powers": self.powers}
+        if self.start_time is not None:
+            data["start_time"] = self.start_time
+        if self.end_time is not None:
+            data["end_time"] = self.end_time
+        if self.mode is not None:
+            data["mode"] = self.mode
+        if self.spawn_seed is not None:
+            data.update(spawn_seed=self.spawn_seed, spawn_interval=self.spawn_interval, spawn_tick=self.spawn_tick)
+        data["players"] = {pid: p.as_dict() for pid, p in self.players.items()}
+        data["seq"] = self.seq
+        return data
+
+class MemoryGameManager(GameManager):
+    def __init__(self):
+        super().__init__(None)
+        self.games: Dict[str, GameState] = {}
+        # (deadline, code, pid, wid); entries for words already cleared are skipped when they come up
+        self.deadlines: List[tuple] = []
+        # Reserved game code -> expiry, with a heap to return lapsed codes to the pool
+        self.code_reservations: Dict[str, float] = {}
+        self.reservation_heap: List[tuple] = []
+
+    async def load_scripts(self):
+        pass
+
+    async def migrate_legacy_games(self):
+        pass
+
+    def _send(self, code: str, events: List[Dict]):
+        channel = f"game:{code}:events"
+        game = self.games.get(code)
+        payloads = []
+        for event in events:
+            if game is not None:
+                game.seq += 1
+                event = {"seq": game.seq, **event}
+            payload = json.dumps(event)
+            if game is not None:
+                game.log.append((game.seq, payload))
+            payloads.append(payload)
+        if self.batch_events and len(payloads) > 1:
+            head = f'{{"seq": {game.seq}, ' if game is not None else "{"
+            self.events.publish(channel, f'{head}"type": "batch", "events": [{", ".join(payloads)}]}}')
+        else:
+            for payload in payloads:
+                self.events.publish(channel, payload)
+
+    async def state_version(self, code: str) -> Optional[int]:
+        game = self._game(code)
+        return game.seq if game else None
+
+    async def events_since(self, code: str, last_seq: int) -> Optional[List[str]]:
+        game = self._game(code)
+        if game is None or last_seq > game.seq:
+            return None
+        if last_seq == game.seq:
+            return []
+        if not game.log or game.log[0][0] > last_seq + 1:
+            return None
+        return [payload for seq, payload in game.log if seq > last_seq]
+
+    def _game(self, code: str) -> Optional[GameState]:
+        game = self.games.get(code)
+        if game is not None and game.expires_at <= time.time():
+            self._release_expired()
+            return None
+        return game
+
+    def _release_expired(self):
+        now = time.time()
+        while self.reservation_heap and self.reservation_heap[0][0] <= now:
+            expires_at, code = heapq.heappop(self.reservation_heap)
+            if self.code_reservations.get(code) == expires_at:
+                del self.code_reservations[code]
+                self.games.pop(code, None)
+
+    async def allocate_code(self) -> str:
+        # Random candidates as in the Redis allocator; a code is taken while its reservation runs
+        self._release_expired()
+        if len(self.code_reservations) < CODE_SPACE:
+            for _ in range(CODE_ROUNDS * CODE_CANDIDATES):
+                code = random_code()
+                if code not in self.code_reservations:
+                    expires_at = time.time() + GAME_TTL
+                    self.code_reservations[code] = expires_at
+                    heapq.heappush(self.reservation_heap, (expires_at, code))
+                    return code
+        raise RuntimeError("No free game codes")
+
+    async def code_pool_stats(self) -> Dict:
+        self._release_expired()
+        leased = len(self.code_reservations)
+        return {"capacity": CODE_SPACE, "leased": leased, "free": CODE_SPACE - leased, "occupancy": leased / CODE_SPACE}
+
+    async def create_game(self, host_name: str, difficulty: str, powers: List[str]) -> tuple[str, str]:
+        code = await self.allocate_code()
+        host_id = self._generate_id()
+        game = GameState(code, host_id, difficulty, list(powers), self.code_reservations[code])
+        game.players[host_id] = PlayerState(Player(name=host_name, id=host_id, is_ready=True))
+        self.games[code] = game
+        return code, host_id
+
+    async def create_practice_game(self, host_name: str, difficulty: str = "easy") -> tuple[str, str]:
+        code, host_id = await self.create_game(host_name, difficulty, ["clear_screen"])
+        self.games[code].mode = "practice"
+        return code, host_id
+
+    async def join_game(self, code: str, player_name: str) -> Optional[str]:
+        game = self._game(code)
+        if game is None or game.status != "lobby" or len(game.players) >= 2:
+            return None
+        player = Player(name=player_name, id=self._generate_id(), is_ready=True)
+        game.players[player.id] = PlayerState(player)
+        self._send(code, [{"type": "player_joined", "player": asdict(player)}])
+        return player.id
+
+    async def get_player(self, code: str, pid: str) -> Optional[Dict]:
+        game = self._game(code)
+        player = game.players.get(pid) if game else None
+        return player.as_dict() if player else None
+
+    async def get_words(self, code: str, pid: str) -> Dict[str, Dict]:
+        game = self._game(code)
+        player = game.players.get(pid) if game else None
+        return {wid: w.as_dict() for wid, w in player.words.items()} if player else {}
+
+    async def get_game_state(self, code: str) -> Optional[Dict]:
+        game = self._game(code)
+        return game.as_dict() if game else None
+
+    async def set_game_status(self, code: str, status: str):
+        game = self._game(code)
+        if game is None:
+            return
+        game.status = status
+        event = {"type": "status_change", "status": status}
+        if status == "playing":
+            game.start_time = time.time()
+            seeded = self._start_fields()
+            if seeded:
+                game.spawn_seed, game.spawn_interval = seeded["spawn_seed"], seeded["spawn_interval"]
+            event.update(seeded)
+        self._send(code, [event])
+
+    def _store_word(self, game: GameState, pid: str, word_data: Dict):
+        player = game.players.get(pid)
+        if player is None:
+            return
+        word = WordState(word_data)
+        if word.id in player.words:
+            player.remove_word(player.words[word.id])
+        player.add_word(word)
+        heapq.heappush(self.deadlines, (word.deadline, game.code, pid, word.id))
+
+    async def add_word(self, code: str, pid: str, word_data: Dict):
+        game = self._game(code)
+        if game is not None:
+            self._store_word(game, pid, word_data)
+
+    async def _spawn_words(self, code: str, spawns: List[tuple[str, Dict]], tick: Optional[int] = None):
+        game = self._game(code)
+        if game is None:
+            return
+        for pid, word_data in spawns:
+            self._store_word(game, pid, word_data)
+        if tick is not None:
+            game.spawn_tick = tick
+        self._send(code, self._spawn_events(spawns, tick))
+
+    async def _tick_snapshot(self, code: str):
+        game = self._game(code)
+        if game is None or game.status != "playing":
+            return None
+        players = [(pid, p.health, p.index.keys()) for pid, p in game.players.items()]
+        fields = (("difficulty", game.difficulty), ("start_time", game.start_time), ("spawn_seed", game.spawn_seed),
+                  ("spawn_interval", game.spawn_interval), ("spawn_tick", game.spawn_tick))
+        return {k: v for k, v in fields if v is not None}, players
+
+    def _damage(self, game: GameState, pid: str, amount: int, events: List[Dict]) -> Optional[int]:
+        player = game.players.get(pid)
+        if player is None:
+            return None
+        player.combo = 0
+        player.health -= amount
+        if player.health <= 0:
+            player.health = 0
+            game.status = "finished"
+            if game.end_time is None:
+                game.end_time = time.time()
+            self._rank_players(game)
+            events.append({"type": "status_change", "status": "finished"})
+            events.append({"type": "game_over", "loser": pid})
+        events.append({"type": "health_update", "player_id": pid, "new_health": player.health, "combo": 0})
+        return player.health
+
+    def _rank_players(self, game: GameState):
+        if game.mode == "practice" or game.ranked:
+            return
+        game.ranked = True
+        elapsed = game.end_time - (game.start_time or game.end_time)
+        self.leaderboards.record(game.difficulty, [(pid, p.name, match_score(p.words_cleared, p.health, elapsed))
+                                                   for pid, p in game.players.items()])
+
+    async def damage_player(self, code: str, pid: str, amount: int):
+        game = self._game(code)
+        if game is None:
+            return None
+        events = []
+        health = self._damage(game, pid, int(amount), events)
+        self._send(code, events)
+        return health
+
+    async def expire_due_words(self, key: str = "words:expiry", batch: int = 500) -> bool:
+        now = time.time()
+        groups: Dict[tuple[str, str], List[Dict]] = {}
+        for _ in range(batch):
+            if not self.deadlines or self.deadlines[0][0] > now:
+                break
+            deadline, code, pid, wid = heapq.heappop(self.deadlines)
+            game = self._game(code)
+            player = game.players.get(pid) if game else None
+            word = player.words.get(wid) if player else None
+            if word is None or word.deadline != deadline:
+                continue
+            player.remove_word(word)
+
+            # Words left over from a finished game are dropped silently
+            if game.status == "playing":
+                events = groups.setdefault((code, pid), [])
+                self._damage(game, pid, 10, events)
+                events.append({"type": "word_expired", "target_pid": pid, "word_id": wid})
+
+        for (code, _), events in groups.items():
+            self._send(code, events)
+            self.metrics.words_expired.inc(sum(1 for e in events if e["type"] == "word_expired"))
+        return True
+
+    async def _claim_word(self, code: str, pid: str, word_text: str):
+        game = self._game(code)
+        player = game.players.get(pid) if game else None
+        entries = player.index.get(word_text) if player else None
+        if not entries:
+            return None
+
+        word = player.words[entries[0][1]]
+        player.remove_word(word)
+        player.power += 10 + (50 if word.is_special else 0)
+        player.words_cleared += 1
+
+        triggered = None
+        if player.power >= 100:
+            player.power = 0
+            if game.powers:
+                triggered = game.powers[min(len(game.powers) - 1, int(random.random() * len(game.powers)))]
+
+        self._send(code, [{"type": "word_cleared", "player_id": pid, "word_id": word.id, "new_power": player.power,
+                           "triggered_power": triggered, "combo": player.combo}])
+        return word.id, triggered or ""
+
+    async def _apply_power(self, code: str, attacker_pid: str, power_type: str, barrage: List[Dict]):
+        game = self._game(code)
+        if game is None:
+            return None
+
+        if power_type == "clear_screen":
+            player = game.players.get(attacker_pid)
+            if player is not None:
+                player.clear_words()
+            self._send(code, [{"type": "effect_clear_screen", "target_pid": attacker_pid}])
+            return attacker_pid
+
+        opponent = next((pid for pid in game.players if pid != attacker_pid), None)
+        if opponent is None:
+            return None
+
+        events = []
+        if power_type == "shake":
+            events.append({"type": "effect_shake", "target_pid": opponent, "duration": 3000})
+        elif power_type == "barrage":
+            for word_data in (barrage[5:10] if game.difficulty == "hard" else barrage[:5]):
+                self._store_word(game, opponent, word_data)
+                events.append({"type": "word_spawn", "target_pid": opponent, "word": word_data})
+        elif power_type == "blindness":
+            events.append({"type": "effect_blind", "target_pid": opponent, "duration": 5000})
+        self._send(code, events)
+        return opponent
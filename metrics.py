@@ -0,0 +1,156 @@
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Process-local metrics in the Prometheus text format, without prometheus_client.
+# Recording is an integer add (counters) or a bisect over a dozen bounds (histograms) on the event loop,
+# with no locks, labels resolved once per series, and all formatting deferred to the scrape.
+# Rates such as words spawned per second come from rate() over the *_total counters.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+OVERRUN_BUCKETS = (0, 1, 2, 5, 10, 25, 100)
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Family:
+    # A metric name with its series; unlabelled metrics have a single series under the empty key
+    def __init__(self, name: str, help: str, kind: str, label: Optional[str] = None, buckets: Tuple = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self.buckets = buckets
+        self.series: Dict[str, object] = {}
+
+    def labels(self, value: str = ""):
+        child = self.series.get(value)
+        if child is None:
+            child = self.series[value] = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+        return child
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for value, child in self.series.items():
+            label = f'{self.label}="{_escape(value)}"' if self.label else ""
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip((*child.bounds, "+Inf"), child.counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    out.append(f"{self.name}_bucket{{{label + ',' if label else ''}{le}}} {cumulative}")
+                suffix = f"{{{label}}}" if label else ""
+                out.append(f"{self.name}_sum{suffix} {child.sum}")
+                out.append(f"{self.name}_count{suffix} {child.count}")
+            else:
+                out.append(f"{self.name}{{{label}}} {child.value}" if label else f"{self.name} {child.value}")
+
+class Metrics:
+    def __init__(self):
+        self.families: List[Family] = []
+        # Read from live state at scrape time: (name, help, kind, label, fn returning a value or {label: value})
+        self.callbacks: List[Tuple[str, str, str, Optional[str], Callable]] = []
+
+        self.tick_duration = self.histogram("typingduel_tick_duration_seconds", "Duration of one scheduler job run", "job")
+        self.tick_overruns = self.histogram("typingduel_tick_overruns", "Ticks missed per scheduler pass", buckets=OVERRUN_BUCKETS).labels()
+        self.redis_latency = self.histogram("typingduel_redis_command_seconds", "Redis round-trip latency by command or script", "command")
+        self.submit_latency = self.histogram("typingduel_submit_word_seconds", "submit_word handling time").labels()
+        self.words_spawned = self.counter("typingduel_words_spawned_total", "Words spawned, including barrages").labels()
+        self.words_expired = self.counter("typingduel_words_expired_total", "Words that expired and dealt damage").labels()
+        self.submits = self.counter("typingduel_submits_total", "Words submitted by result", "result")
+        self.game_takeovers = self.counter("typingduel_game_takeovers_total", "Running games claimed after their lease lapsed or was released").labels()
+        self.input_rejected = self.counter("typingduel_input_rejected_total", "Websocket messages rejected before reaching the backend, by reason", "reason")
+        self.word_cache = self.counter("typingduel_word_cache_lookups_total", "Active word lookups served by the local cache, by result", "result")
+        self.state_cache = self.counter("typingduel_state_cache_lookups_total", "Cached game state lookups by result", "result")
+        self.leaderboard_cache = self.counter("typingduel_leaderboard_cache_lookups_total", "Top N leaderboard reads by cache result", "result")
+
+    def counter(self, name: str, help: str, label: Optional[str] = None) -> Family:
+        family = Family(name, help, "counter", label)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name: str, help: str, label: Optional[str] = None, buckets: Tuple = LATENCY_BUCKETS) -> Family:
+        family = Family(name, help, "histogram", label, buckets)
+        self.families.append(family)
+        return family
+
+    def callback(self, name: str, help: str, fn: Callable, kind: str = "gauge", label: Optional[str] = None):
+        self.callbacks.append((name, help, kind, label, fn))
+
+    def render(self) -> str:
+        out: List[str] = []
+        for name, help, kind, label, fn in self.callbacks:
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            value = fn()
+            if label:
+                out.extend(f'{name}{{{label}="{_escape(k)}"}} {v}' for k, v in value.items())
+            else:
+                out.append(f"{name} {value}")
+        for family in self.families:
+            family.render(out)
+        return "\n".join(out) + "\n"
+
+def instrument_redis(redis, metrics: Metrics, scripts: Optional[Dict[str, str]] = None):
+    # Times every call on the client in place: single commands by name, pipelines as PIPELINE or MULTI.
+    # Script calls are told apart by `scripts` (name -> SHA1), as EVALSHA:<name>; unknown SHAs stay EVALSHA.
+    execute_command = redis.execute_command
+    pipeline = redis.pipeline
+    latency = metrics.redis_latency
+    script_names = {sha: name for name, sha in (scripts or {}).items()}
+
+    def command_label(args) -> str:
+        command = str(args[0]).upper()
+        if command == "EVALSHA" and len(args) > 1 and args[1] in script_names:
+            return f"EVALSHA:{script_names[args[1]]}"
+        return command
+
+    async def timed_execute_command(*args, **options):
+        start = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            latency.labels(command_label(args)).observe(time.perf_counter() - start)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+        series = latency.labels("MULTI" if pipe.is_transaction else "PIPELINE")
+
+        async def timed_execute(*eargs, **ekwargs):
+            start = time.perf_counter()
+            try:
+                return await execute(*eargs, **ekwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    redis.execute_command = timed_execute_command
+    redis.pipeline = timed_pipeline
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,91 @@
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+# Cluster-wide ownership of running games.
+# A game in status `playing` is listed in the games:running set and ticked by exactly one node: the holder of
+# its lease, game:{code}:owner = node id with a TTL. The node starting a game takes the lease before it changes
+# the status, so a start that loses the race leaves the game alone. Each node renews its leases several times
+# per TTL. A node that crashes or loses Redis stops renewing, its leases lapse, and another node claims the game
+# on its next sweep. The tick reads start_time and the active words from Redis, so the new owner carries on where
+# the old one stopped.
+#
+# Nodes announce themselves in nodes:alive with a heartbeat. A node claims games until it holds its fair share,
+# ceil(running / live nodes), and hands back any surplus, so work spreads out when nodes join; a draining
+# node releases everything at once.
+
+RUNNING_KEY = "games:running"
+ALIVE_KEY = "nodes:alive"
+
+# Seconds a lease lasts without renewal; failover takes at most this long plus one sweep
+LEASE_TTL = float(os.getenv("GAME_LEASE_TTL", 10.0))
+# Sweeps (renew, claim, rebalance) per lease lifetime
+SWEEPS_PER_TTL = 3
+
+RunScript = Callable[[str, List[str], List], Awaitable]
+
+def owner_key(code: str) -> str:
+    return f"game:{code}:owner"
+
+def default_node_id() -> str:
+    return os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class LeaseTable:
+    def __init__(self, redis, run_script: RunScript, node_id: str = None, ttl: float = LEASE_TTL):
+        self.redis = redis
+        self.run_script = run_script
+        self.node_id = node_id or default_node_id()
+        self.ttl = ttl
+        # code -> monotonic time until which the lease is known to be ours
+        self.held: Dict[str, float] = {}
+
+    @property
+    def sweep_interval(self) -> float:
+        return self.ttl / SWEEPS_PER_TTL
+
+    def holds(self, code: str) -> bool:
+        # Checked before every tick: a lease that could not be renewed in time may already belong to someone else
+        return self.held.get(code, 0.0) > time.monotonic()
+
+    async def acquire(self, code: str) -> bool:
+        # A game that starts here is listed as running and leased to this node in one round trip
+        started = time.monotonic()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(RUNNING_KEY, code)
+            pipe.set(owner_key(code), self.node_id, nx=True, px=int(self.ttl * 1000))
+            _, acquired = await pipe.execute()
+        if acquired:
+            self.held[code] = started + self.ttl
+        return bool(acquired)
+
+    async def renew(self) -> List[str]:
+        started = time.monotonic()
+        codes = list(self.held)
+        lost = await self.run_script("renew_leases", [ALIVE_KEY, *map(owner_key, codes)],
+                                     [self.node_id, int(self.ttl * 1000), time.time(), *codes])
+        for code in codes:
+            if code in lost:
+                del self.held[code]
+            else:
+                self.held[code] = started + self.ttl
+        return lost
+
+    async def claim(self) -> Tuple[List[str], int]:
+        # Returns the games newly leased to this node and its fair share
+        # The script takes every key it touches, so the running games are listed first; games that start in
+        # between are picked up on the next sweep
+        running = list(await self.redis.smembers(RUNNING_KEY))
+        keys = [RUNNING_KEY, ALIVE_KEY, *[key for code in running for key in (f"game:{code}", owner_key(code))]]
+        started = time.monotonic()
+        share, *claimed = await self.run_script("claim_games", keys,
+                                                [self.node_id, int(self.ttl * 1000), time.time(), len(self.held), *running])
+        for code in claimed:
+            self.held[code] = started + self.ttl
+        return claimed, int(share)
+
+    async def release(self, codes: List[str], leave: bool = False):
+        for code in codes:
+            self.held.pop(code, None)
+        await self.run_script("release_leases", [ALIVE_KEY, *map(owner_key, codes)], [self.node_id, int(leave), *codes])
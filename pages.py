@@ -0,0 +1,102 @@
+import hashlib
+import html
+from typing import Callable, Dict, List, Tuple
+
+from fastcore.utils import partition, tuplify
+from fasthtml.common import Link, Title, fh_cfg, is_full_page, respond, to_xml
+from starlette.responses import Response
+
+# Pages rendered through FastHTML once and replayed as bytes.
+# render() does with a page what FastHTML does with a handler's return value, through its public API only:
+# head tags are split off, a page that is not already full is wrapped by respond() with the app's headers,
+# title and canonical link, and the result goes through to_xml. tests/test_pages.py checks the bytes against
+# a real handler, so a FastHTML upgrade that changes the pipeline fails there. A page is rendered per host
+# and per full-page/htmx-fragment variant; the canonical link is the only other input.
+
+# Distinct hosts kept per page; more than a handful means the Host header is not ours to trust
+MAX_VARIANTS = 16
+
+HEAD_TAGS = ("title", "meta", "link", "style", "base")
+
+def render(req, page) -> str:
+    page = tuplify(page)
+    heads, body = partition(page, lambda o: getattr(o, "tag", "") in HEAD_TAGS)
+    if not is_full_page(req, page):
+        title = [] if any(getattr(o, "tag", "") == "title" for o in heads) else [Title(req.app.title)]
+        # Canonical links are always https, as FastHTML writes them
+        url = str(getattr(req, "canonical", req.url)).replace("http://", "https://", 1)
+        canonical = [Link(rel="canonical", href=url)] if req.app.canonical else []
+        page = respond(req, [*heads, *title, *canonical], body)
+    return to_xml(page, indent=fh_cfg.indent)
+
+def _variant(req) -> Tuple[bool, str]:
+    return is_full_page(req, ()), str(req.base_url)
+
+def _html_response(body: bytes, etag: str, req) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "HX-Request, HX-History-Restore-Request"}
+    if etag in [t.strip().removeprefix("W/") for t in req.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+# A page with no per-request content: one render, one ETag, 304 for clients that already have it
+class StaticPage:
+    def __init__(self, build: Callable, path: str = "/"):
+        self.build = build
+        self.path = path
+        self.rendered: Dict[Tuple[bool, str], Tuple[bytes, str]] = {}
+
+    def response(self, req) -> Response:
+        key = _variant(req)
+        cached = self.rendered.get(key)
+        if cached is None:
+            req.canonical = f"{key[1].rstrip('/')}{self.path}"
+            body = render(req, self.build()).encode()
+            cached = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+            if len(self.rendered) < MAX_VARIANTS:
+                self.rendered[key] = cached
+        return _html_response(cached[0], cached[1], req)
+
+# A page whose only dynamic parts are a few string values. It is rendered once with a marker in place of
+# each value and split around the markers; a request joins the pieces with its escaped values.
+class PageTemplate:
+    def __init__(self, build: Callable, fields: List[str], path: str):
+        self.build = build
+        self.fields = fields
+        self.path = path
+        self.compiled: Dict[Tuple[bool, str], List] = {}
+
+    def _marker(self, field: str) -> str:
+        return f"__TEMPLATE_{field.upper()}__"
+
+    def _compile(self, req, key) -> List:
+        markers = {f: self._marker(f) for f in self.fields}
+        req.canonical = f"{key[1].rstrip('/')}{self.path.format(**markers)}"
+        text = render(req, self.build(**markers))
+        # Literal text at even positions, field names at odd ones
+        parts: List[str] = [text]
+        for field, marker in markers.items():
+            split = []
+            for i, part in enumerate(parts):
+                if i % 2:
+                    split.append(part)
+                    continue
+                pieces = part.split(marker)
+                split.append(pieces[0])
+                for piece in pieces[1:]:
+                    split += [field, piece]
+            parts = split
+        return parts
+
+    def render(self, req, **values) -> str:
+        key = _variant(req)
+        parts = self.compiled.get(key)
+        if parts is None:
+            parts = self._compile(req, key)
+            if len(self.compiled) < MAX_VARIANTS:
+                self.compiled[key] = parts
+        escaped = {f: html.escape(str(v), quote=True) for f, v in values.items()}
+        return "".join(escaped[p] if i % 2 else p for i, p in enumerate(parts))
+
+    def response(self, req, **values) -> Response:
+        return Response(self.render(req, **values), media_type="text/html; charset=utf-8",
+                        headers={"Vary": "HX-Request, HX-History-Restore-Request"})
@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+# A tick callback receives the job key and returns False to stop ticking
+TickCallback = Callable[[str], Awaitable[bool]]
+
+@dataclass
+class TickJob:
+    key: str
+    callback: TickCallback
+    next_tick: float
+    interval: float
+    ticks: int = 0
+    overruns: int = 0
+    last_duration: float = 0.0
+    running: bool = False
+
+# Drives every registered job from a single loop, ordered by a heap of next-tick times
+class TickScheduler:
+    def __init__(self, interval: float = 2.0, max_concurrency: int = 256):
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.overruns = 0
+        self.tick_overruns: Deque[int] = deque(maxlen=100)  # Overruns seen per scheduler pass (most recent last)
+        self.metrics = None  # Optional metrics.Metrics fed with job durations and per-pass overruns
+        self._jobs: Dict[str, TickJob] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs))
+
+    @property
+    def tick_rate(self) -> float:
+        return 1.0 / self.interval
+
+    def register(self, key: str, callback: TickCallback, delay: float = 0.0, interval: Optional[float] = None) -> bool:
+        if key in self._jobs:
+            return False
+
+        loop = asyncio.get_running_loop()
+        self._ensure_running(loop)
+        job = TickJob(key=key, callback=callback, next_tick=loop.time() + delay, interval=interval or self.interval)
+        self._jobs[key] = job
+        self._push(job)
+        return True
+
+    def unregister(self, key: str) -> bool:
+        # Stale heap entries are skipped when popped
+        job = self._jobs.pop(key, None)
+        return job is not None
+
+    def get_job(self, key: str) -> Optional[TickJob]:
+        return self._jobs.get(key)
+
+    def stats(self) -> Dict:
+        return {
+            "jobs": len(self._jobs),
+            "interval": self.interval,
+            "overruns": self.overruns,
+            "tick_overruns": list(self.tick_overruns),
+        }
+
+    async def stop(self):
+        self._jobs.clear()
+        self._heap.clear()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ensure_running(self, loop: asyncio.AbstractEventLoop):
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        # Primitives are bound to the loop that created them, so rebuild them with the task
+        self._wakeup = asyncio.Event()
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        for job in self._jobs.values():
+            job.running = False
+        self._heap = [(job.next_tick, next(self._seq), job.key) for job in self._jobs.values()]
+        heapq.heapify(self._heap)
+        self._task = loop.create_task(self._run())
+
+    def _push(self, job: TickJob):
+        was_head = not self._heap or job.next_tick < self._heap[0][0]
+        heapq.heappush(self._heap, (job.next_tick, next(self._seq), job.key))
+        if was_head:
+            self._wakeup.set()
+
+    def _reschedule(self, job: TickJob, now: float) -> int:
+        # Next tick is anchored to the previous schedule, not to "now", so processing time never drifts the cadence.
+        # Whole intervals that already passed are skipped and reported as overruns.
+        job.next_tick += job.interval
+        missed = 0
+        if job.next_tick <= now:
+            missed = int((now - job.next_tick) // job.interval) + 1
+            job.next_tick += missed * job.interval
+        self._push(job)
+        return missed
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Dispatch every job that is due in this pass
+            now = loop.time()
+            pass_overruns = 0
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, key = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None or job.next_tick != deadline:
+                    continue
+
+                if job.running:
+                    # Previous tick of this job is still in flight
+                    job.overruns += 1
+                    pass_overruns += 1
+                    self._reschedule(job, now)
+                    continue
+
+                missed = self._reschedule(job, now)
+                job.overruns += missed
+                pass_overruns += missed
+                job.running = True
+                asyncio.create_task(self._run_job(job))
+
+            self.overruns += pass_overruns
+            self.tick_overruns.append(pass_overruns)
+            if self.metrics is not None:
+                self.metrics.tick_overruns.observe(pass_overruns)
+
+    async def _run_job(self, job: TickJob):
+        loop = asyncio.get_running_loop()
+        keep = False
+        async with self._sem:
+            started = loop.time()
+            try:
+                keep = await job.callback(job.key)
+            except Exception as e:
+                print(f"Tick Error ({job.key}): {e}")
+            finally:
+                job.running = False
+                job.ticks += 1
+                job.last_duration = loop.time() - started
+                if self.metrics is not None:
+                    # Game jobs are keyed by their code; named jobs such as words:expiry keep their own series
+                    self.metrics.tick_duration.labels(job.key if ":" in job.key else "game").observe(job.last_duration)
+
+        if keep is False and self._jobs.get(job.key) is job:
+            self.unregister(job.key)
@@ -0,0 +1,69 @@
+import os
+import random
+from typing import Dict
+
+from wordbank import INSANE_SYMBOLS, WordBank
+
+# Seeded spawn schedules. A game started with a seed spawns, on tick n, exactly the words plan_word returns for
+# (seed, n, pid): text, position, special choice and duration are a pure function of those three. The server
+# still stores every word as before, but publishes one spawn_tick marker per tick instead of a word_spawn per
+# player, and clients run the same generator (game_client.js, planWord) over the same word pools.
+#
+# Both sides must produce bit-identical numbers, so the generator is mulberry32 on uint32 arithmetic, which
+# JavaScript does exactly with Math.imul, and every draw is a double computed in the same order on both sides.
+
+# Optional mode: games get a seed when they start and their spawns go out as tick markers
+SEEDED_SPAWNS = os.getenv("SEEDED_SPAWNS", "0") == "1"
+
+MASK = 0xFFFFFFFF
+
+def new_seed() -> int:
+    return random.getrandbits(32)
+
+def fnv1a(text: str) -> int:
+    h = 0x811C9DC5
+    for byte in text.encode():
+        h = ((h ^ byte) * 0x01000193) & MASK
+    return h
+
+class Mulberry32:
+    def __init__(self, state: int):
+        self.state = state & MASK
+
+    def random(self) -> float:
+        self.state = a = (self.state + 0x6D2B79F5) & MASK
+        t = ((a ^ (a >> 15)) * (1 | a)) & MASK
+        t = ((t + (((t ^ (t >> 7)) * (61 | t)) & MASK)) & MASK) ^ t
+        return ((t ^ (t >> 14)) & MASK) / 4294967296
+
+def spawn_rng(seed: int, tick: int, pid: str) -> Mulberry32:
+    # One stream per (tick, player), so a player's words don't depend on who else is alive
+    return Mulberry32(seed ^ ((tick * 0x9E3779B1) & MASK) ^ fnv1a(pid))
+
+def spawn_duration(tick: int, interval: float) -> float:
+    # Same curve as unseeded games, 10s down to 3s over 3 minutes, with time counted in ticks
+    elapsed = tick * interval
+    return max(3.0, 10.0 - (elapsed / 18.0 * 7.0))
+
+def plan_word(words: WordBank, difficulty: str, seed: int, tick: int, pid: str, interval: float) -> Dict:
+    # Draw order is part of the format: special?, then side and height or text and x
+    rng = spawn_rng(seed, tick, pid)
+    word = {"id": f"t{tick}-{pid}", "vy": None, "vx": 0.0, "y": 10.0}
+    if rng.random() < 0.1:
+        is_left = rng.random() < 0.5
+        word.update(x=-6 if is_left else 6, vx=0.05 if is_left else -0.05, y=2 + 6 * rng.random(),
+                    vy=0.0, duration=5.0, is_special=True)
+        word["text"] = words.sample(difficulty, bonus=True, rng=rng)
+    else:
+        word["text"] = words.sample(difficulty, rng=rng)
+        word.update(x=-4 + 8 * rng.random(), duration=spawn_duration(tick, interval), is_special=False)
+    return word
+
+def spawn_pools(words: WordBank, difficulty: str) -> Dict:
+    # What a client needs to run plan_word: both pools in index order and the insane variants
+    return {
+        "pool": list(words.pool(difficulty)),
+        "bonus": list(words.pool(difficulty, bonus=True)),
+        "variants": 2 * len(INSANE_SYMBOLS) if difficulty == "insane" else 1,
+        "symbols": INSANE_SYMBOLS,
+    }
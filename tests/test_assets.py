@@ -0,0 +1,53 @@
+import gzip
+from starlette.testclient import TestClient
+from main import app, assets
+
+client = TestClient(app)
+
+def test_fingerprinted_asset_is_immutable():
+    url = assets.url("index.css")
+    assert url.startswith("/assets/index.") and url.endswith(".css")
+    res = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert res.headers["cache-control"] == "public, max-age=31536000, immutable"
+    with open("index.css", "rb") as f:
+        assert res.content == f.read()
+
+def test_etag_revalidation():
+    res = client.get("/game_client.js", headers={"Accept-Encoding": "identity"})
+    assert res.headers["cache-control"] == "no-cache"
+    again = client.get("/game_client.js", headers={"Accept-Encoding": "identity", "If-None-Match": res.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+def test_precompressed_variant_for_text_assets():
+    res = client.get(assets.url("game_client.js"), headers={"Accept-Encoding": "gzip"})
+    asset = assets.assets["game_client.js"]
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"] == asset.etag("gzip")
+    # The test client decodes the body; the stored variant must round-trip to the file
+    assert res.content == asset.body
+    assert gzip.decompress(asset.variants["gzip"]) == asset.body
+
+def test_byte_ranges_on_media():
+    size = len(assets.assets["bg.m4a"].body)
+    res = client.get("/bg.m4a", headers={"Range": "bytes=100-199"})
+    assert res.status_code == 206
+    assert res.headers["content-range"] == f"bytes 100-199/{size}"
+    assert res.content == assets.assets["bg.m4a"].body[100:200]
+
+    tail = client.get("/bg.m4a", headers={"Range": "bytes=-10"})
+    assert tail.headers["content-range"] == f"bytes {size - 10}-{size - 1}/{size}"
+    assert client.get("/bg.m4a", headers={"Range": f"bytes={size}-"}).status_code == 416
+
+def test_only_manifest_files_are_served():
+    assert client.get("/main.py").status_code == 404
+    assert client.get("/assets/main.py").status_code == 404
+    assert client.get("/data/easy_words.txt").status_code == 404
+    assert client.get("/..%2Fmain.py").status_code == 404
+
+def test_lobby_links_fingerprinted_client():
+    res = client.post("/practice", data={"name": "Solo"}, follow_redirects=True)
+    assert assets.url("game_client.js") in res.text
+    assert "?v=" not in res.text
@@ -0,0 +1,172 @@
+import pytest
+import asyncio
+import json
+from collections import Counter
+from main import gm
+from dispatcher import LocalEventDispatcher, Subscription, SlowConsumer
+
+requires_redis = pytest.mark.skipif(gm.redis is None, reason="exercises the Redis pub/sub connection")
+
+async def next_message(sub, timeout=1.0):
+    return await asyncio.wait_for(sub.get(), timeout)
+
+async def publish(channel, data):
+    if gm.redis is None:
+        gm.events.publish(channel, data)
+    else:
+        await gm.redis.publish(channel, data)
+
+@requires_redis
+@pytest.mark.asyncio
+async def test_sockets_share_one_redis_subscription():
+    channel = "game:DSPA:events"
+    first = await gm.events.subscribe(channel)
+    second = await gm.events.subscribe(channel)
+
+    # Two local recipients, one Redis subscriber
+    assert gm.events.subscriber_count(channel) == 2
+    assert dict(await gm.redis.pubsub_numsub(channel))[channel] == 1
+
+    await gm.redis.publish(channel, '{"type": "ping"}')
+    a = await next_message(first)
+    b = await next_message(second)
+    assert a == '{"type": "ping"}'
+    assert a is b
+
+    await gm.events.unsubscribe(first)
+    assert dict(await gm.redis.pubsub_numsub(channel))[channel] == 1
+    await gm.events.unsubscribe(second)
+    await gm.events.unsubscribe(second)
+    await asyncio.sleep(0.05)
+    assert dict(await gm.redis.pubsub_numsub(channel))[channel] == 0
+    assert channel not in gm.events.channels
+
+@requires_redis
+@pytest.mark.asyncio
+async def test_churn_does_not_leak_subscriptions():
+    channel = "game:DSPB:events"
+    subs = [await gm.events.subscribe(channel) for _ in range(5)]
+    for sub in subs[:4]:
+        await gm.events.unsubscribe(sub)
+
+    # A socket joining right after others left still receives events
+    late = await gm.events.subscribe(channel)
+    await gm.redis.publish(channel, "hello")
+    assert await next_message(late) == "hello"
+    assert await next_message(subs[4]) == "hello"
+
+    await gm.events.unsubscribe(subs[4])
+    await gm.events.unsubscribe(late)
+    await asyncio.sleep(0.05)
+    assert dict(await gm.redis.pubsub_numsub(channel))[channel] == 0
+
+@pytest.mark.asyncio
+async def test_each_wire_format_is_encoded_once():
+    channel = "game:DSPC:events"
+    calls = []
+
+    def encoder(data):
+        calls.append(data)
+        return data.encode()
+
+    text = await gm.events.subscribe(channel)
+    binary = [await gm.events.subscribe(channel, encoder) for _ in range(3)]
+
+    await publish(channel, '{"type": "ping"}')
+    assert await next_message(text) == '{"type": "ping"}'
+    frames = [await next_message(sub) for sub in binary]
+    assert frames[0] == b'{"type": "ping"}'
+    assert all(frame is frames[0] for frame in frames)
+    assert len(calls) == 1
+
+    for sub in [text, *binary]:
+        await gm.events.unsubscribe(sub)
+
+@pytest.mark.asyncio
+async def test_local_dispatcher_fans_out_in_process():
+    events = LocalEventDispatcher()
+    first = await events.subscribe("game:LOCL:events")
+    second = await events.subscribe("game:LOCL:events")
+
+    events.publish("game:LOCL:events", "hello")
+    assert await next_message(first) == "hello"
+    assert await next_message(second) == "hello"
+
+    await events.unsubscribe(first)
+    await events.unsubscribe(second)
+    assert events.channels == []
+    events.publish("game:LOCL:events", "nobody")
+    assert events.messages_out == 2
+
+def health(pid, value):
+    return json.dumps({"type": "health_update", "player_id": pid, "new_health": value, "combo": 0})
+
+def spawn(wid):
+    return json.dumps({"type": "word_spawn", "target_pid": "p1", "word": {"id": wid, "text": "A"}})
+
+@pytest.mark.asyncio
+async def test_full_queue_collapses_health_updates():
+    sub = Subscription("game:OVFL:events", limit=3)
+    sub.deliver(health("p1", 90))
+    sub.deliver(spawn("w1"))
+    sub.deliver(health("p2", 80))
+    sub.deliver(health("p1", 70))
+
+    frames = [json.loads(await next_message(sub)) for _ in range(3)]
+    # The stale p1 update gave way; order of what is left is preserved
+    assert [f.get("new_health") for f in frames] == [None, 80, 70]
+    assert sub.decisions["collapse_health"] == 1
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_superseded_and_transient_events():
+    sub = Subscription("game:OVFL:events", limit=2)
+    sub.deliver(json.dumps({"type": "effect_shake", "target_pid": "p1", "duration": 3000}))
+    sub.deliver(spawn("w1"))
+    # No older frame with its key, so the queued shake makes room
+    sub.deliver(json.dumps({"type": "status_change", "status": "playing"}))
+    assert [json.loads(e[0])["type"] for e in sub.queue] == ["word_spawn", "status_change"]
+
+    sub.deliver(json.dumps({"type": "status_change", "status": "finished"}))
+    assert json.loads(sub.queue[-1][0])["status"] == "finished"
+    assert sub.decisions["drop_superseded"] == 2
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_cut_off():
+    decisions = Counter()
+    sub = Subscription("game:OVFL:events", limit=2, decisions=decisions)
+    for i in range(3):
+        sub.deliver(spawn(f"w{i}"))
+
+    # Word events cannot be dropped, so the socket is given up on
+    assert sub.overflowed.is_set()
+    assert len(sub) == 0
+    assert decisions["disconnect"] == 1
+    with pytest.raises(SlowConsumer):
+        await next_message(sub)
+    sub.deliver(spawn("late"))
+    assert len(sub) == 0
+
+@pytest.mark.asyncio
+async def test_encoded_frames_keep_their_source_for_the_policies():
+    sub = Subscription("game:OVFL:events", limit=1)
+    sub.deliver(health("p1", 90), b"\x04old")
+    sub.deliver(health("p1", 60), b"\x04new")
+    assert await next_message(sub) == b"\x04new"
+
+@pytest.mark.asyncio
+async def test_resumed_subscription_skips_replayed_events():
+    sub = Subscription("game:RSUM:events")
+    sub.resume_after = 2
+    for seq in range(1, 5):
+        sub.deliver(json.dumps({"seq": seq, "type": "word_expired", "target_pid": "p1", "word_id": f"w{seq}"}))
+    assert [json.loads(await next_message(sub))["seq"] for _ in range(2)] == [3, 4]
+    assert sub.resume_after is None
+
+@pytest.mark.asyncio
+async def test_long_resume_skips_without_nesting():
+    # Far more stale frames than the recursion limit allows nested calls for
+    sub = Subscription("game:RSUM:events", limit=5000)
+    sub.resume_after = 4000
+    for seq in range(1, 4002):
+        sub.deliver(json.dumps({"seq": seq, "type": "word_expired", "target_pid": "p1", "word_id": f"w{seq}"}))
+    assert json.loads(await next_message(sub))["seq"] == 4001
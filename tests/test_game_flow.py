@@ -1,6 +1,12 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
-from main import app, gm
+from main import app
+from memory_backend import MemoryGameManager
+from spawnplan import plan_word
+import main
+import game as game_module
+import memory_backend
+import heapq
 import json
 import asyncio
 import time
@@ -8,8 +14,44 @@ import time
 # Use the app for testing
 transport = ASGITransport(app=app)
 
+# Every test runs against both state backends; the routes see whichever one is under test
+@pytest.fixture(params=["redis", "memory"])
+def gm(request, monkeypatch):
+    if request.param == "memory":
+        engine = MemoryGameManager()
+    else:
+        engine = main.gm
+        if engine.redis is None:
+            pytest.skip("GAME_BACKEND=memory")
+    monkeypatch.setattr(main, "gm", engine)
+    return engine
+
+redis_only = pytest.mark.parametrize("gm", ["redis"], indirect=True)
+
+# Backend-neutral views of the word storage the assertions look at
+async def has_word(gm, code, pid, wid):
+    return wid in await gm.get_words(code, pid)
+
+async def index_size(gm, code, pid):
+    if gm.redis is None:
+        return sum(len(entries) for entries in gm.games[code].players[pid].index.values())
+    return await gm.redis.zcard(f"game:{code}:{pid}:index")
+
+async def queued_deadline(gm, code, pid, wid):
+    # The memory backend leaves cleared words in its heap and skips them, so only live entries count
+    if gm.redis is None:
+        words = gm.games[code].players[pid].words
+        return next((d for d, c, p, w in gm.deadlines if (c, p, w) == (code, pid, wid) and w in words), None)
+    return await gm.redis.zscore("words:deadlines", f"{code}:{pid}:{wid}")
+
+async def delete_game(gm, code):
+    if gm.redis is None:
+        gm.games.pop(code, None)
+    else:
+        await gm.redis.delete(f"game:{code}")
+
 @pytest.mark.asyncio
-async def test_game_flow():
+async def test_game_flow(gm):
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         # 1. Create Game
         response = await ac.post("/create", data={
@@ -44,15 +86,19 @@ async def test_game_flow():
             "spawn_time": time.time(),
             "duration": 10
         }
-        await gm.redis.hset(f"game:{code}:{host_pid}:words", word_id, json.dumps(word_data))
+        await gm.add_word(code, host_pid, word_data)
         
         # Submit correct word
         result = await gm.submit_word(code, host_pid, "TEST")
         assert result == True
         
         # Verify word removed
-        exists = await gm.redis.hexists(f"game:{code}:{host_pid}:words", word_id)
+        exists = await has_word(gm, code, host_pid, word_id)
         assert not exists
+        assert await index_size(gm, code, host_pid) == 0
+        
+        # Unknown text is rejected
+        assert await gm.submit_word(code, host_pid, "TES") == False
         
         # Verify Score
         state = await gm.get_game_state(code)
@@ -63,12 +109,15 @@ async def test_game_flow():
         # 5. Test Power Up Trigger
         # Set power to 90
         players[host_pid]["power"] = 90
-        await gm.redis.hset(f"game:{code}", "players", json.dumps(players))
+        if gm.redis is None:
+            gm.games[code].players[host_pid].power = 90
+        else:
+            await gm.redis.hset(f"game:{code}", "players", json.dumps(players))
         
         # Seed another word
         word_id_2 = "power_word"
         word_data_2 = {"text": "POWER", "id": word_id_2, "x": 0, "spawn_time": time.time(), "duration": 10}
-        await gm.redis.hset(f"game:{code}:{host_pid}:words", word_id_2, json.dumps(word_data_2))
+        await gm.add_word(code, host_pid, word_data_2)
         
         # Submit to trigger power
         await gm.submit_word(code, host_pid, "POWER")
@@ -78,4 +127,363 @@ async def test_game_flow():
         assert state["players"][host_pid]["power"] == 0
         
         # Clean up
-        await gm.redis.delete(f"game:{code}")
+        await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_duplicate_text_clears_soonest_deadline(gm):
+    code, pid = await gm.create_practice_game("Solo", "easy")
+    now = time.time()
+    await gm.add_word(code, pid, {"text": "TWIN", "id": "late", "x": 0, "spawn_time": now, "duration": 10})
+    await gm.add_word(code, pid, {"text": "TWIN", "id": "soon", "x": 0, "spawn_time": now, "duration": 3})
+    await gm.add_word(code, pid, {"text": "TWINS", "id": "other", "x": 0, "spawn_time": now, "duration": 1})
+
+    # Each submit clears exactly one instance, closest to expiring first
+    assert await gm.submit_word(code, pid, "TWIN") == True
+    assert not await has_word(gm, code, pid, "soon")
+    assert await has_word(gm, code, pid, "late")
+
+    assert await gm.submit_word(code, pid, "TWIN") == True
+    assert await gm.submit_word(code, pid, "TWIN") == False
+    assert await has_word(gm, code, pid, "other")
+
+    # Clearing the screen drops the index with the words
+    await gm.trigger_power(code, pid, "clear_screen")
+    assert await index_size(gm, code, pid) == 0
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_expiry_only_touches_overdue_words(gm):
+    code, pid = await gm.create_practice_game("Solo", "easy")
+    await gm.set_game_status(code, "playing")
+    now = time.time()
+    await gm.add_word(code, pid, {"text": "LATE", "id": "overdue", "x": 0, "spawn_time": now - 5, "duration": 3})
+    await gm.add_word(code, pid, {"text": "FRESH", "id": "pending", "x": 0, "spawn_time": now, "duration": 10})
+
+    await gm.expire_due_words()
+
+    assert not await has_word(gm, code, pid, "overdue")
+    assert await has_word(gm, code, pid, "pending")
+    assert await queued_deadline(gm, code, pid, "overdue") is None
+    state = await gm.get_game_state(code)
+    assert state["players"][pid]["health"] == 90
+
+    # Submitting the pending word also takes it off the deadline queue
+    assert await gm.submit_word(code, pid, "FRESH") == True
+    assert await queued_deadline(gm, code, pid, "pending") is None
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_scripted_powers_and_game_over(gm):
+    code, host_pid = await gm.create_game("Host", "hard", ["barrage"])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    await gm.set_game_status(code, "playing")
+
+    # Barrage lands five indexed, queued words on the opponent
+    await gm.trigger_power(code, host_pid, "barrage")
+    words = await gm.get_words(code, joiner_pid)
+    assert len(words) == 5
+    assert await index_size(gm, code, joiner_pid) == 5
+    wid = next(iter(words))
+    assert await queued_deadline(gm, code, joiner_pid, wid) is not None
+
+    # Damage is applied atomically and finishes the game at zero health
+    assert await gm.damage_player(code, joiner_pid, 60) == 40
+    assert await gm.damage_player(code, joiner_pid, 60) == 0
+    state = await gm.get_game_state(code)
+    assert state["status"] == "finished"
+    assert state["players"][joiner_pid]["health"] == 0
+    assert state["players"][host_pid]["health"] == 100
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_barrage_without_an_opponent_is_skipped(gm):
+    code, host_pid = await gm.create_game("Solo", "easy", ["barrage"])
+    await gm.set_game_status(code, "playing")
+    seq = (await gm.get_game_state(code))["seq"]
+    await gm.trigger_power(code, host_pid, "barrage")
+    assert (await gm.get_game_state(code))["seq"] == seq
+    await delete_game(gm, code)
+
+@redis_only
+@pytest.mark.asyncio
+async def test_barrage_reads_a_stale_roster_again(gm):
+    code, host_pid = await gm.create_game("Host", "easy", ["barrage"])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    await gm.set_game_status(code, "playing")
+    # As if kept for an earlier game under the same code
+    gm.rosters[code] = game_module.Roster("easy", [host_pid, "gone1234"])
+    await gm.trigger_power(code, host_pid, "barrage")
+    assert len(await gm.get_words(code, joiner_pid)) == 5
+    assert not await gm.get_words(code, "gone1234")
+    await delete_game(gm, code)
+
+@redis_only
+@pytest.mark.asyncio
+async def test_legacy_players_blob_is_migrated(gm):
+    # A game written by the previous layout, with every player in one JSON field
+    code = "LGCY"
+    host = {"name": "Old", "id": "oldhost1", "health": 70, "power": 40, "words_cleared": 3, "combo": 0, "is_ready": True}
+    await gm.redis.hset(f"game:{code}", mapping={
+        "code": code, "host_id": host["id"], "difficulty": "easy", "status": "lobby",
+        "powers": json.dumps(["shake"]), "players": json.dumps({host["id"]: host})
+    })
+    await gm.redis.expire(f"game:{code}", 3600)
+
+    # The compatibility view reads the blob as before
+    state = await gm.get_game_state(code)
+    assert state["players"][host["id"]]["health"] == 70
+
+    joiner = await gm.join_game(code, "New")
+    assert joiner
+    assert not await gm.redis.hexists(f"game:{code}", "players")
+    assert await gm.redis.lrange(f"game:{code}:pids", 0, -1) == [host["id"], joiner]
+    assert await gm.get_player(code, host["id"]) == host
+
+    state = await gm.get_game_state(code)
+    assert list(state["players"]) == [host["id"], joiner]
+    assert state["players"][joiner]["health"] == 100
+
+    # Capacity is enforced by the join script
+    assert await gm.join_game(code, "Third") is None
+    await gm.redis.delete(f"game:{code}", f"game:{code}:pids")
+
+@pytest.mark.asyncio
+async def test_batched_events_share_one_frame(gm):
+    code, host_pid = await gm.create_game("Host", "easy", ["barrage"])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    await gm.set_game_status(code, "playing")
+
+    sub = await gm.events.subscribe(f"game:{code}:events")
+
+    gm.batch_events = True
+    try:
+        await gm.trigger_power(code, host_pid, "barrage")
+        await gm.damage_player(code, joiner_pid, 100)
+    finally:
+        gm.batch_events = False
+
+    frames = []
+    while True:
+        try:
+            frames.append(json.loads(await asyncio.wait_for(sub.get(), 0.2)))
+        except asyncio.TimeoutError:
+            break
+
+    # One frame per action, each unpacking to the events the unbatched mode would send
+    assert [f["type"] for f in frames] == ["batch", "batch"]
+    assert [e["type"] for e in frames[0]["events"]] == ["word_spawn"] * 5
+    assert [e["type"] for e in frames[1]["events"]] == ["status_change", "game_over", "health_update"]
+    await gm.events.unsubscribe(sub)
+    await delete_game(gm, code)
+
+async def drain(sub):
+    frames = []
+    while True:
+        try:
+            frames.append(await asyncio.wait_for(sub.get(), 0.2))
+        except asyncio.TimeoutError:
+            return frames
+
+@pytest.mark.asyncio
+async def test_events_are_numbered_and_replayed_from_the_log(gm):
+    code, host_pid = await gm.create_game("Host", "easy", ["barrage"])
+    sub = await gm.events.subscribe(f"game:{code}:events")
+    joiner_pid = await gm.join_game(code, "Joiner")
+    await gm.set_game_status(code, "playing")
+    await gm._spawn_word(code, host_pid, "ALPHA")
+    await gm.damage_player(code, joiner_pid, 10)
+
+    frames = await drain(sub)
+    seqs = [json.loads(f)["seq"] for f in frames]
+    assert seqs == list(range(1, len(frames) + 1))
+    assert (await gm.get_game_state(code))["seq"] == len(frames)
+
+    # A client that saw the first two events gets exactly the rest, byte for byte
+    assert await gm.events_since(code, 2) == frames[2:]
+    assert await gm.events_since(code, len(frames)) == []
+    assert await gm.events_since(code, len(frames) + 1) is None
+
+    # Batches carry the number of their last event
+    gm.batch_events = True
+    try:
+        await gm.trigger_power(code, host_pid, "barrage")
+    finally:
+        gm.batch_events = False
+    (batch,) = [json.loads(f) for f in await drain(sub)]
+    assert [e["seq"] for e in batch["events"]] == list(range(len(frames) + 1, len(frames) + 6))
+    assert batch["seq"] == len(frames) + 5
+
+    # Once the log has been trimmed past a client's position it has to start over from a snapshot
+    if gm.redis is None:
+        gm.games[code].log.popleft()
+    else:
+        await gm.redis.xdel(f"game:{code}:stream", "0-1")
+    assert await gm.events_since(code, 0) is None
+    assert len(await gm.events_since(code, 1)) == len(frames) + 4
+
+    await gm.events.unsubscribe(sub)
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_seeded_spawns_go_out_as_tick_markers(gm):
+    code, host_pid = await gm.create_game("Host", "easy", [])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    sub = await gm.events.subscribe(f"game:{code}:events")
+    gm.seeded_spawns = True
+    try:
+        await gm.set_game_status(code, "playing")
+    finally:
+        gm.seeded_spawns = False
+    assert await gm.tick_game(code) and await gm.tick_game(code)
+
+    start, *ticks = [json.loads(f) for f in await drain(sub)]
+    game = await gm.get_game_state(code)
+    assert start["spawn_seed"] == game["spawn_seed"] and start["spawn_interval"] == gm.scheduler.interval
+    assert [(t["type"], t["tick"], t["targets"]) for t in ticks] == [
+        ("spawn_tick", 1, [host_pid, joiner_pid]), ("spawn_tick", 2, [host_pid, joiner_pid])]
+
+    # The stored words are exactly what the seed plans, so clients can work them out from the markers alone
+    for pid in (host_pid, joiner_pid):
+        stored = await gm.get_words(code, pid)
+        planned = [plan_word(gm.words, "easy", game["spawn_seed"], tick, pid, game["spawn_interval"]) for tick in (1, 2)]
+        assert [{k: v for k, v in stored[w["id"]].items() if k != "spawn_time"} for w in planned] == planned
+
+    # A node taking the game over carries on from the stored tick
+    assert (await gm.get_game_state(code))["spawn_tick"] == 2
+    await gm.events.unsubscribe(sub)
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_snapshot_includes_words_on_screen(gm):
+    code, host_pid = await gm.create_game("Host", "easy", [])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    await gm.set_game_status(code, "playing")
+    await gm._spawn_word(code, host_pid, "BRAVO")
+
+    game = await gm.get_snapshot(code)
+    assert [w["text"] for w in game["words"][host_pid]] == ["BRAVO"]
+    assert game["words"][joiner_pid] == []
+    assert 0 <= game["words"][host_pid][0]["age"] < 5
+    assert game["seq"] == (await gm.get_game_state(code))["seq"]
+    await delete_game(gm, code)
+
+@pytest.mark.asyncio
+async def test_cached_state_is_revalidated_by_version(gm):
+    code, host_pid = await gm.create_game("Host", "easy", [])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    hits = gm.metrics.state_cache.labels("hit")
+
+    first = await gm.get_game_state_cached(code)
+    before = hits.value
+    assert await gm.get_game_state_cached(code) is first
+    assert hits.value == before + 1
+
+    # Any event moves the version on, and the next lookup refetches
+    await gm.damage_player(code, joiner_pid, 10)
+    fresh = await gm.get_game_state_cached(code)
+    assert fresh is not first and fresh["seq"] == await gm.state_version(code)
+    assert fresh["players"][joiner_pid]["health"] == 90
+
+    await delete_game(gm, code)
+    assert await gm.get_game_state_cached(code) is None
+    assert code not in gm.state_cache
+
+@pytest.mark.asyncio
+async def test_delta_carries_only_what_changed(gm):
+    code, host_pid = await gm.create_game("Host", "easy", [])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    since = await gm.state_version(code)
+
+    await gm.damage_player(code, joiner_pid, 10)
+    await gm._spawn_word(code, host_pid, "DELTA")
+    delta = await gm.state_delta(code, since)
+    assert delta["version"] == since + 2
+    assert delta["game"] == {}
+    assert list(delta["players"]) == [joiner_pid]
+    assert delta["players"][joiner_pid]["health"] == 90
+
+    await gm.set_game_status(code, "playing")
+    delta = await gm.state_delta(code, since)
+    assert delta["game"]["status"] == "playing" and "start_time" in delta["game"]
+    assert await gm.state_delta(code, since + 100) is None
+    await delete_game(gm, code)
+
+def draw_codes(monkeypatch, *codes):
+    # The allocators draw these candidates first, then random ones again
+    drawn = iter(codes)
+    fallback = game_module.random_code
+    for module in (game_module, memory_backend):
+        monkeypatch.setattr(module, "random_code", lambda: next(drawn, None) or fallback())
+
+@pytest.mark.asyncio
+async def test_allocated_codes_are_unique_and_leased(gm):
+    before = await gm.code_pool_stats()
+    codes = [await gm.allocate_code() for _ in range(200)]
+    assert len(set(codes)) == 200
+    assert all(len(c) == 4 and c.isalpha() and c.isupper() for c in codes)
+
+    after = await gm.code_pool_stats()
+    assert after["leased"] - before["leased"] == 200
+    assert after["free"] == after["capacity"] - after["leased"]
+
+    # Codes handed out in a row are not neighbours in any order an outsider could follow
+    assert len({c[:3] for c in codes}) > 150
+
+    if gm.redis is not None:
+        assert 0 < await gm.redis.ttl(f"code:{codes[0]}") <= 3600
+        await gm.redis.zrem("codes:leases", *codes)
+        await gm.redis.delete(*[f"code:{c}" for c in codes])
+
+@redis_only
+@pytest.mark.asyncio
+async def test_allocator_skips_codes_in_use(gm, monkeypatch):
+    taken, leased = "QQQA", "QQQB"
+    # A game from before the allocator, with no lease on its code, and a code another game holds
+    await gm.redis.hset(f"game:{taken}", "status", "lobby")
+    await gm.redis.set(f"code:{leased}", "1", ex=60)
+    draw_codes(monkeypatch, taken, leased, "QQQC")
+
+    code = await gm.allocate_code()
+    assert code == "QQQC"
+    await gm.redis.delete(f"code:{leased}")
+    await gm.redis.delete(f"game:{taken}", f"code:{code}")
+    await gm.redis.zrem("codes:leases", code)
+
+@redis_only
+@pytest.mark.asyncio
+async def test_expired_leases_return_to_pool(gm):
+    before = await gm.code_pool_stats()
+    await gm.redis.zadd("codes:leases", {"QQQQ": time.time() - 1, "QQQR": time.time() + 60})
+    stats = await gm.code_pool_stats()
+    assert stats["leased"] == before["leased"] + 1
+    assert await gm.redis.zscore("codes:leases", "QQQQ") is None
+    await gm.redis.zrem("codes:leases", "QQQR")
+
+@pytest.mark.parametrize("gm", ["memory"], indirect=True)
+@pytest.mark.asyncio
+async def test_memory_games_expire_with_their_lease(gm, monkeypatch):
+    code, pid = await gm.create_game("Host", "easy", [])
+    draw_codes(monkeypatch, code, "QQQC")
+    assert await gm.allocate_code() == "QQQC"
+
+    # Lapsing the lease drops the game and frees its code
+    gm.code_reservations[code] = gm.games[code].expires_at = time.time() - 1
+    heapq.heappush(gm.reservation_heap, (gm.code_reservations[code], code))
+    assert await gm.get_game_state(code) is None
+    assert code not in gm.code_reservations
+
+@pytest.mark.parametrize("gm", ["memory"], indirect=True)
+@pytest.mark.asyncio
+async def test_memory_backend_starts_and_ticks_games_without_leases(gm):
+    # The startup and shutdown hooks run as on a real server; with one process there is nothing to lease
+    gm.scheduler.interval = 0.05
+    for hook in (gm.load_scripts, gm.migrate_legacy_games, gm.join_cluster):
+        await hook()
+    code, _ = await gm.create_game("Host", "easy", [])
+    await gm.join_game(code, "Joiner")
+    assert await gm.start_game(code)
+    assert code in gm.scheduler
+    await asyncio.sleep(0.2)
+    assert gm.scheduler.get_job(code).ticks > 0
+    await gm.leave_cluster()
+    await gm.scheduler.stop()
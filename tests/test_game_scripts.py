@@ -0,0 +1,72 @@
+import hashlib
+import json
+import time
+
+import pytest
+
+import game
+from main import gm as main_gm, redis_url
+
+pytestmark = pytest.mark.skipif(main_gm.redis is None, reason="scripts run in Redis")
+
+# Prepended to every script: calls go through a check that their keys were passed in KEYS, as script key
+# validation and Redis Cluster require. PUBLISH takes a channel, TIME no key and DEL takes several keys.
+KEY_CHECK = r"""
+local declared = {}
+for _, key in ipairs(KEYS) do declared[key] = true end
+local function checked_call(command, ...)
+    local args = {...}
+    local name = string.upper(command)
+    if name ~= 'PUBLISH' and name ~= 'TIME' then
+        local last = 1
+        if name == 'DEL' then last = #args end
+        for i = 1, last do
+            if not declared[args[i]] then error('undeclared key ' .. tostring(args[i]) .. ' in ' .. name) end
+        end
+    end
+    return redis.call(command, ...)
+end
+"""
+
+@pytest.fixture
+def checked(monkeypatch):
+    for name, src in list(game.SCRIPTS.items()):
+        src = KEY_CHECK + src.replace("redis.call(", "checked_call(")
+        monkeypatch.setitem(game.SCRIPTS, name, src)
+        monkeypatch.setitem(game.SCRIPT_SHAS, name, hashlib.sha1(src.encode()).hexdigest())
+    node = game.GameManager(redis_url)
+    node.scheduler.interval = 60  # Ticks are driven by hand
+    return node
+
+@pytest.mark.asyncio
+async def test_scripts_only_touch_keys_they_are_given(checked):
+    gm = checked
+    await gm.load_scripts()
+    code, host = await gm.create_game("Host", "easy", ["barrage"])
+    # A joiner of the previous layout: the game keeps its players in one JSON field until a script migrates it
+    legacy = {"name": "Old", "id": "oldjoin1", "health": 100, "power": 0, "words_cleared": 0, "combo": 0, "is_ready": True}
+    state = await gm.get_game_state(code)
+    await gm.redis.hset(f"game:{code}", "players", json.dumps({**state["players"], legacy["id"]: legacy}))
+    await gm.redis.delete(f"game:{code}:pids", f"game:{code}:player:{host}")
+
+    await gm.join_cluster()
+    assert await gm.start_game(code)
+    await gm.sweep_leases()
+
+    await gm._spawn_word(code, host, "ALPHA")
+    assert await gm.submit_word(code, host, "ALPHA")
+    assert await gm.get_player(code, legacy["id"]) == legacy
+    for power in ("barrage", "shake", "clear_screen"):
+        await gm.trigger_power(code, host, power)
+    await gm.add_word(code, legacy["id"], {"text": "LATE", "id": "late", "x": 0, "spawn_time": time.time() - 60, "duration": 1})
+    await gm.expire_due_words()
+    assert (await gm.get_player(code, legacy["id"]))["health"] == 90
+    assert await gm.damage_player(code, legacy["id"], 100) == 0
+    assert (await gm.leaderboards.around("easy", "all", host, radius=0))[0]["name"] == "Host"
+    await gm.leave_cluster()
+    await gm.scheduler.stop()
+
+    await gm.redis.zrem("leaderboard:easy:all", host, legacy["id"])
+    await gm.redis.hdel("leaderboard:easy:names", host, legacy["id"])
+    for key in await gm.redis.keys(f"game:{code}*"):
+        await gm.redis.delete(key)
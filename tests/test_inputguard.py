@@ -0,0 +1,59 @@
+import pytest
+import json
+from main import gm
+from inputguard import TokenBucket, VisibleWords
+from spawnplan import plan_word
+from functools import partial
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2, burst=3)
+    start = bucket.updated
+    assert [bucket.take(start) for _ in range(4)] == [True, True, True, False]
+    assert not bucket.take(start + 0.4)
+    assert bucket.take(start + 0.6)
+    # Idle time never banks more than the burst
+    assert sum(bucket.take(start + 100) for _ in range(5)) == 3
+
+def test_visible_words_follow_the_player_events():
+    visible = VisibleWords("p1")
+    visible.load({"w1": {"id": "w1", "text": "ALPHA"}})
+    spawn = lambda pid, wid, text: {"type": "word_spawn", "target_pid": pid, "word": {"id": wid, "text": text}}
+    visible.observe(json.dumps({"type": "batch", "events": [
+        spawn("p1", "w2", "BRAVO"), spawn("p1", "w3", "BRAVO"), spawn("p2", "w4", "OTHER")]}))
+    assert "BRAVO" in visible and "OTHER" not in visible
+
+    visible.observe(json.dumps({"seq": 9, "type": "word_cleared", "player_id": "p1", "word_id": "w2"}))
+    assert "BRAVO" in visible  # Still on screen once more
+    visible.observe(json.dumps({"type": "word_expired", "target_pid": "p1", "word_id": "w3"}))
+    assert "BRAVO" not in visible and len(visible) == 1
+
+    visible.observe(json.dumps({"type": "health_update", "player_id": "p1", "new_health": 90}))
+    visible.observe(json.dumps({"type": "effect_clear_screen", "target_pid": "p1"}))
+    assert "ALPHA" not in visible and len(visible) == 0
+
+@pytest.mark.asyncio
+async def test_visible_words_track_published_spawns():
+    code, pid = await gm.create_game("Host", "easy", [])
+    await gm.set_game_status(code, "playing")
+    sub = await gm.events.subscribe(f"game:{code}:events")
+    visible = VisibleWords(pid)
+    sub.watch = visible.observe
+
+    await gm._spawn_word(code, pid, "CHARLIE")
+    await sub.get()
+    assert "CHARLIE" in visible
+    await gm.submit_word(code, pid, "CHARLIE")
+    await sub.get()
+    assert "CHARLIE" not in visible
+    await gm.events.unsubscribe(sub)
+
+def test_visible_words_expand_seeded_spawn_ticks():
+    visible = VisibleWords("p1")
+    visible.planner = partial(plan_word, gm.words, "easy")
+    visible.observe(json.dumps({"seq": 1, "type": "status_change", "status": "playing", "spawn_seed": 7, "spawn_interval": 2.0}))
+    visible.observe(json.dumps({"seq": 2, "type": "spawn_tick", "tick": 1, "targets": ["p1", "p2"]}))
+    visible.observe(json.dumps({"seq": 3, "type": "spawn_tick", "tick": 2, "targets": ["p2"]}))
+    word = plan_word(gm.words, "easy", 7, 1, "p1", 2.0)
+    assert word["text"] in visible and len(visible) == 1
+    visible.observe(json.dumps({"type": "word_cleared", "player_id": "p1", "word_id": word["id"]}))
+    assert len(visible) == 0
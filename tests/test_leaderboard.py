@@ -0,0 +1,113 @@
+import uuid
+
+import pytest
+
+import main
+from game import Roster
+from leaderboard import Leaderboards, MemoryLeaderboards, leaderboard_key, match_score, names_key
+from memory_backend import MemoryGameManager
+
+@pytest.fixture(params=["redis", "memory"])
+def gm(request):
+    engine = MemoryGameManager() if request.param == "memory" else main.gm
+    if engine.redis is None and request.param == "redis":
+        pytest.skip("GAME_BACKEND=memory")
+    return engine
+
+async def drop(gm, players):
+    if gm.redis is not None:
+        for window in ("daily", "weekly", "all"):
+            await gm.redis.zrem(leaderboard_key("hard", window), *players)
+        await gm.redis.hdel(names_key("hard"), *players)
+
+def test_window_keys():
+    # 2026-10-18 is a Sunday, day 20744; its week started on Monday 2026-10-12
+    sunday = 20744 * 86400 + 3600
+    assert leaderboard_key("hard", "daily", sunday) == "leaderboard:hard:daily:20744"
+    assert leaderboard_key("hard", "weekly", sunday) == leaderboard_key("hard", "weekly", sunday - 6 * 86400)
+    assert leaderboard_key("hard", "weekly", sunday) != leaderboard_key("hard", "weekly", sunday + 86400)
+    assert leaderboard_key("easy", "all", sunday) == "leaderboard:easy:all"
+    assert match_score(30, 40, 120) == 300 + 40 + 15
+    assert match_score(0, -10, 0) == 0
+
+@pytest.mark.asyncio
+async def test_game_over_ranks_both_players_once(gm):
+    # Two players may share a name; each keeps their own entry
+    name = f"N{uuid.uuid4().hex[:8]}"
+    code, host_pid = await gm.create_game(name, "hard", [])
+    joiner_pid = await gm.join_game(code, name)
+    await gm.set_game_status(code, "playing")
+    await gm._spawn_word(code, host_pid, "ALPHA")
+    await gm.submit_word(code, host_pid, "ALPHA")
+    await gm.damage_player(code, joiner_pid, 100)
+    ended = (await gm.get_game_state(code))["end_time"]
+    # Further damage after the end neither re-ranks, lowers anything nor moves the end of the match
+    await gm.damage_player(code, host_pid, 100)
+    assert (await gm.get_game_state(code))["end_time"] == ended
+
+    for window in ("daily", "weekly", "all"):
+        entries = await gm.leaderboards._range("hard", leaderboard_key("hard", window), 0, -1)
+        ranked = {e["player"]: (e["name"], e["score"]) for e in entries}
+        # One word cleared within the first minute: 10 points, 100 health, 60 words per minute at most
+        assert ranked[host_pid] == (name, 10 + 100 + 60)
+        assert ranked[joiner_pid] == (name, 0)
+    assert (await gm.leaderboards.around("hard", "all", joiner_pid, radius=0))[0]["player"] == joiner_pid
+    await drop(gm, [host_pid, joiner_pid])
+
+@pytest.mark.asyncio
+async def test_stale_roster_is_read_again_before_the_match_ends(gm):
+    if gm.redis is None:
+        pytest.skip("Redis only")
+    host, joiner = f"H{uuid.uuid4().hex[:8]}", f"J{uuid.uuid4().hex[:8]}"
+    code, host_pid = await gm.create_game(host, "hard", [])
+    joiner_pid = await gm.join_game(code, joiner)
+    await gm.set_game_status(code, "playing")
+    # As if kept for an earlier game under the same code
+    gm.rosters[code] = Roster("easy", [host_pid])
+    assert await gm.damage_player(code, joiner_pid, 100) == 0
+    ranked = {e["player"] for e in await gm.leaderboards._range("hard", leaderboard_key("hard", "all"), 0, -1)}
+    assert {host_pid, joiner_pid} <= ranked
+    assert gm.rosters[code] == Roster("hard", [host_pid, joiner_pid])
+    await drop(gm, [host_pid, joiner_pid])
+
+@pytest.mark.asyncio
+async def test_practice_games_are_not_ranked(gm):
+    name = f"S{uuid.uuid4().hex[:8]}"
+    code, pid = await gm.create_practice_game(name, "hard")
+    await gm.set_game_status(code, "playing")
+    await gm.damage_player(code, pid, 100)
+    assert await gm.leaderboards.around("hard", "all", pid) is None
+
+@pytest.mark.asyncio
+async def test_top_is_cached_and_around_finds_neighbours():
+    boards = MemoryLeaderboards(cache_ttl=60)
+    boards.record("easy", [(f"p{i:02d}", f"Player {i}", i * 10) for i in range(30)])
+    # A worse result later does not replace a player's best
+    boards.record("easy", [("p05", "Player 5", 1), ("p06", "Player 6", 500)])
+
+    top = await boards.top("easy", "daily", n=3)
+    assert top == [{"rank": 1, "player": "p06", "name": "Player 6", "score": 500},
+                   {"rank": 2, "player": "p29", "name": "Player 29", "score": 290},
+                   {"rank": 3, "player": "p28", "name": "Player 28", "score": 280}]
+    boards.record("easy", [("late", "Late", 1000)])
+    assert (await boards.top("easy", "daily", n=3))[0]["player"] == "p06"
+    boards.cache.clear()
+    assert (await boards.top("easy", "daily", n=3))[0]["player"] == "late"
+
+    around = await boards.around("easy", "daily", "p05", radius=2)
+    assert [(e["rank"], e["player"]) for e in around] == [(24, "p08"), (25, "p07"), (26, "p05"), (27, "p04"), (28, "p03")]
+    assert await boards.around("easy", "daily", "nobody") is None
+
+@pytest.mark.asyncio
+async def test_redis_boards_agree_with_memory(gm):
+    if gm.redis is None:
+        pytest.skip("Redis only")
+    players = [f"r{uuid.uuid4().hex[:6]}{i}" for i in range(8)]
+    key = leaderboard_key("hard", "daily")
+    await gm.redis.zadd(key, {player: 1_000_000 + i for i, player in enumerate(players)})
+    await gm.redis.hset(names_key("hard"), mapping={player: "Same" for player in players})
+    boards, memory = Leaderboards(gm.redis), MemoryLeaderboards()
+    memory.record("hard", [(player, "Same", 1_000_000 + i) for i, player in enumerate(players)])
+    assert (await boards.top("hard", "daily", n=8)) == await memory.top("hard", "daily", n=8)
+    assert await boards.around("hard", "daily", players[3], radius=1) == await memory.around("hard", "daily", players[3], radius=1)
+    await drop(gm, players)
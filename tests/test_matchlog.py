@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import main
+import wire
+from matchlog import MatchReader, MatchRecorder, MatchStats, MatchWriter, replay
+from memory_backend import MemoryGameManager
+
+@pytest.fixture(params=["redis", "memory"])
+def gm(request, tmp_path):
+    engine = MemoryGameManager() if request.param == "memory" else main.gm
+    if engine.redis is None and request.param == "redis":
+        pytest.skip("GAME_BACKEND=memory")
+    engine.recorder = MatchRecorder(str(tmp_path))
+    yield engine
+    engine.scheduler.unregister("matches:flush")
+    engine.recorder = None
+
+def spawn(seq, pid, wid, text, x=1.5):
+    return {"seq": seq, "type": "word_spawn", "target_pid": pid,
+            "word": {"id": wid, "text": text, "x": x, "y": 10.0, "vx": 0.0, "vy": None, "duration": 8.5, "is_special": False}}
+
+def test_round_trip_interns_texts_and_numbers_events(tmp_path):
+    path = str(tmp_path / "m.tdm")
+    events = [
+        spawn(1, "p1", "w1", "KEYBOARD"),
+        spawn(2, "p1", "w2", "KEYBOARD", x=-3.25),
+        {"seq": 3, "type": "word_cleared", "player_id": "p1", "word_id": "w1", "new_power": 10, "combo": 1, "triggered_power": None},
+        {"seq": 7, "type": "health_update", "player_id": "p1", "new_health": -5},
+        {"seq": 8, "type": "spawn_tick", "tick": 300, "targets": ["p1", "p2"]},
+        {"seq": 9, "type": "game_over", "loser": "p1"},
+    ]
+    writer = MatchWriter(path, "ABCD", "hard", 1_000_000)
+    # Two events published as one batch share a record time
+    writer.write([(1_000_250, json.dumps(events[0])),
+                  (1_000_400, json.dumps({"seq": 3, "type": "batch", "events": events[1:3]})),
+                  (1_002_000, json.dumps(events[3])), (1_002_000, json.dumps(events[4])), (1_009_999, json.dumps(events[5]))])
+    writer.close()
+
+    with MatchReader(path) as reader:
+        assert (reader.code, reader.difficulty, reader.start_ms) == ("ABCD", "hard", 1_000_000)
+        records = list(reader)
+    assert [t for t, _, _ in records] == [1_000_250, 1_000_400, 1_000_400, 1_002_000, 1_002_000, 1_009_999]
+    assert [{"seq": seq, **e} for _, seq, e in records] == events
+    with open(path, "rb") as f:
+        assert f.read().count(b"KEYBOARD") == 1
+
+def test_truncated_log_ends_at_last_whole_record(tmp_path):
+    path = str(tmp_path / "m.tdm")
+    writer = MatchWriter(path, "ABCD", "easy", 0)
+    writer.write([(5, json.dumps(spawn(1, "p1", "w1", "ALPHA"))), (9, json.dumps(spawn(2, "p1", "w2", "BRAVO")))])
+    writer.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+    with MatchReader(path) as reader:
+        assert [e["word"]["text"] for _, _, e in reader] == ["ALPHA"]
+
+@pytest.mark.asyncio
+async def test_recorded_match_replays_and_summarises(gm, tmp_path):
+    code, host_pid = await gm.create_game("Host", "easy", [])
+    joiner_pid = await gm.join_game(code, "Joiner")
+    sub = await gm.events.subscribe(f"game:{code}:events")
+    await gm._start_recording(code)
+    await gm.set_game_status(code, "playing")
+    await gm._spawn_word(code, host_pid, "ALPHA")
+    await gm._spawn_word(code, joiner_pid, "BRAVO")
+    await asyncio.sleep(0.05)
+    await gm.submit_word(code, host_pid, "ALPHA")
+    await gm.damage_player(code, joiner_pid, 100)
+    await asyncio.sleep(0.2)
+    # The first tick after game over finishes the recording
+    assert not await gm.tick_game(code)
+    await gm.recorder.flush()
+
+    published = []
+    while sub.queue:
+        msg = json.loads(await sub.get())
+        published += msg["events"] if msg.get("type") == "batch" else [msg]
+    await gm.events.unsubscribe(sub)
+    (path,) = [os.path.join(tmp_path, name) for name in os.listdir(tmp_path)]
+    with MatchReader(path) as reader:
+        assert reader.code == code and reader.difficulty == "easy"
+        recorded = [{"seq": seq, **event} for _, seq, event in reader]
+    # Same events in the same order; spawn_time is not kept and coordinates are fixed point
+    assert [(e["seq"], e["type"]) for e in recorded] == [(e["seq"], e["type"]) for e in published]
+    assert recorded[1]["word"]["text"] == "ALPHA" and recorded[1]["word"]["id"] == published[1]["word"]["id"]
+
+    frames = [frame async for frame in replay(path, speed=0, protocol=wire.BINARY_PROTOCOL)]
+    assert [e for f in frames for e in wire.decode_frame(f)] == [wire.decode_frame(wire.encode_frame(json.dumps(e)))[0] for e in recorded]
+
+    stats = MatchStats()
+    stats.add(path)
+    summary = stats.summary()
+    assert summary["matches"] == 1 and summary["reaction_seconds"]["n"] == 1
+    assert summary["reaction_seconds"]["mean"] >= 0.05
+    assert summary["accuracy"]["n"] == 1 and summary["wpm"]["n"] == 1
+    if gm.redis is None:
+        gm.games.pop(code, None)
+    else:
+        await gm.redis.delete(f"game:{code}")
@@ -0,0 +1,52 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from main import app
+from metrics import Metrics
+import main
+import time
+
+transport = ASGITransport(app=app)
+
+def test_histogram_buckets_are_cumulative():
+    m = Metrics()
+    for value in (0.0002, 0.003, 0.003, 7.0):
+        m.submit_latency.observe(value)
+    text = m.render()
+    assert 'typingduel_submit_word_seconds_bucket{le="0.0005"} 1' in text
+    assert 'typingduel_submit_word_seconds_bucket{le="0.005"} 3' in text
+    assert 'typingduel_submit_word_seconds_bucket{le="+Inf"} 4' in text
+    assert "typingduel_submit_word_seconds_count 4" in text
+
+def test_labelled_series_and_callbacks():
+    m = Metrics()
+    m.redis_latency.labels("HGETALL").observe(0.001)
+    m.submits.labels("hit").inc(3)
+    m.callback("typingduel_websockets", "Open game websockets", lambda: 7)
+    text = m.render()
+    assert "# TYPE typingduel_websockets gauge\ntypingduel_websockets 7" in text
+    assert 'typingduel_redis_command_seconds_count{command="HGETALL"} 1' in text
+    assert 'typingduel_submits_total{result="hit"} 3' in text
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_tracks_gameplay():
+    gm = main.gm
+    code, host = await gm.create_game("Host", "easy", [])
+    await gm.join_game(code, "Guest")
+    await gm.set_game_status(code, "playing")
+    await gm.add_word(code, host, {"text": "METRIC", "id": "m0000001", "x": 0, "y": 10.0, "vx": 0.0, "vy": None,
+                                   "spawn_time": time.time(), "duration": 10.0, "is_special": False})
+    before = gm.metrics.submits.labels("hit").value
+    assert await gm.submit_word(code, host, "METRIC")
+    assert await gm.tick_game(code)
+
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        res = await ac.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert gm.metrics.submits.labels("hit").value == before + 1
+    assert "typingduel_words_spawned_total" in res.text
+    assert "typingduel_active_games" in res.text
+    assert "typingduel_send_queue_depth{stat=\"max\"}" in res.text
+    if gm.redis is not None:
+        # Script calls are told apart by script, not lumped together as EVALSHA
+        assert 'typingduel_redis_command_seconds_count{command="EVALSHA:submit_word"}' in res.text
@@ -0,0 +1,107 @@
+import pytest
+import asyncio
+import json
+from main import gm, redis_url
+from game import GameManager
+from matchlog import MatchRecorder
+from ownership import RUNNING_KEY, ALIVE_KEY
+
+pytestmark = pytest.mark.skipif(gm.redis is None, reason="leases live in Redis")
+
+async def make_node(name, ttl=0.3):
+    node = GameManager(redis_url)
+    node.scheduler.interval = 60  # Ticks are not what these tests look at
+    node.leases.node_id = name
+    node.leases.ttl = ttl
+    return node
+
+async def cleanup(*nodes):
+    for node in nodes:
+        await node.scheduler.stop()
+    await gm.redis.delete(RUNNING_KEY, ALIVE_KEY)
+
+@pytest.mark.asyncio
+async def test_lapsed_lease_fails_over_to_another_node():
+    await gm.redis.delete(RUNNING_KEY, ALIVE_KEY)
+    a, b = await make_node("node-a"), await make_node("node-b")
+    code, _ = await a.create_game("Host", "easy", [])
+    assert await a.start_game(code)
+    assert code in a.scheduler
+
+    # While the lease is live nobody else takes the game
+    await b.sweep_leases()
+    assert code not in b.scheduler
+
+    # node-a goes quiet: no more renewals, and its own tick stands down once the lease runs out
+    await a.scheduler.stop()
+    await asyncio.sleep(0.4)
+    assert not await a._tick_owned(code)
+
+    takeovers = b.metrics.game_takeovers.value
+    await b.sweep_leases()
+    assert code in b.scheduler
+    assert b.metrics.game_takeovers.value == takeovers + 1
+    assert await gm.redis.get(f"game:{code}:owner") == "node-b"
+    # The new owner resumes from the stored state
+    assert await b._tick_owned(code)
+    await cleanup(a, b)
+
+@pytest.mark.asyncio
+async def test_games_rebalance_when_nodes_join_and_drain():
+    await gm.redis.delete(RUNNING_KEY, ALIVE_KEY)
+    a, b = await make_node("node-a", ttl=5), await make_node("node-b", ttl=5)
+    codes = []
+    for _ in range(4):
+        code, _ = await a.create_game("Host", "easy", [])
+        assert await a.start_game(code)
+        codes.append(code)
+    await a.sweep_leases()
+    assert sorted(a.leases.held) == sorted(codes)
+
+    # node-b joins: node-a hands back everything above its share, node-b picks it up
+    await b.sweep_leases()
+    await a.sweep_leases()
+    await b.sweep_leases()
+    assert len(a.leases.held) == len(b.leases.held) == 2
+    assert not set(a.leases.held) & set(b.leases.held)
+    assert all(code in b.scheduler for code in b.leases.held)
+
+    # Draining node-a releases at once instead of waiting for its leases to lapse
+    await a.leave_cluster()
+    assert not a.leases.held and not any(code in a.scheduler for code in codes)
+    await b.sweep_leases()
+    assert sorted(b.leases.held) == sorted(codes)
+
+    # Games that end drop out of the running set
+    await b.set_game_status(codes[0], "finished")
+    assert not await b._tick_owned(codes[0])
+    await b.sweep_leases()
+    assert codes[0] not in b.leases.held
+    assert not await gm.redis.sismember(RUNNING_KEY, codes[0])
+    await cleanup(a, b)
+
+@pytest.mark.asyncio
+async def test_losing_start_leaves_the_running_game_alone(tmp_path):
+    await gm.redis.delete(RUNNING_KEY, ALIVE_KEY)
+    a, b = await make_node("node-a", ttl=5), await make_node("node-b", ttl=5)
+    a.recorder = MatchRecorder(str(tmp_path))
+    code, _ = await a.create_game("Host", "easy", [])
+
+    # Between the lease and the status change the game is still in its lobby; sweeps keep it listed
+    assert await a.leases.acquire(code)
+    await b.sweep_leases()
+    assert await gm.redis.sismember(RUNNING_KEY, code)
+    await a.leases.release([code])
+
+    assert await a.start_game(code)
+    started = await gm.redis.hmget(f"game:{code}", "start_time", "spawn_seed")
+    assert not await b.start_game(code)
+    assert not await a.start_game(code)
+    # The clock and the schedule did not move, the match was announced once, and node-a kept its recording
+    assert await gm.redis.hmget(f"game:{code}", "start_time", "spawn_seed") == started
+    events = [json.loads(fields["e"]) for _, fields in await gm.redis.xrange(f"game:{code}:stream")]
+    assert [e["status"] for e in events if e["type"] == "status_change"] == ["playing"]
+    assert code not in b.scheduler
+    assert code in a.recorder
+    await a.leave_cluster()
+    await cleanup(a, b)
@@ -0,0 +1,48 @@
+from starlette.testclient import TestClient
+from main import app, landing_page, lobby_page
+
+client = TestClient(app)
+
+def test_landing_page_is_cached_with_etag():
+    first = client.get("/")
+    assert first.status_code == 200
+    assert "Typing Duel 3D" in first.text
+    assert '<link rel="canonical" href="https://testserver/">' in first.text
+    etag = first.headers["etag"]
+    assert client.get("/").content == first.content
+
+    again = client.get("/", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+# Handlers returning the pages as they are built, so FastHTML renders them itself; pages.render must match
+# them byte for byte, whatever FastHTML version is installed
+@app.get("/test/direct/landing")
+def direct_landing(req):
+    req.canonical = "http://testserver/"
+    return landing_page()
+
+@app.get("/test/direct/lobby/{code}")
+def direct_lobby(req, code: str, pid: str):
+    req.canonical = f"http://testserver/lobby/{code}?pid={pid}"
+    return lobby_page(code, pid, "true", "")
+
+def test_landing_page_matches_a_direct_render():
+    for headers in ({}, {"HX-Request": "true"}):
+        assert client.get("/", headers=headers).text == client.get("/test/direct/landing", headers=headers).text
+
+def test_lobby_template_matches_a_direct_render():
+    res = client.post("/practice", data={"name": "Solo"}, follow_redirects=False)
+    url = res.headers["location"]
+    code, pid = url.split("/")[-1].split("?pid=")
+    for headers in ({}, {"HX-Request": "true"}):
+        page = client.get(url, headers=headers)
+        assert page.text == client.get(f"/test/direct/lobby/{code}", params={"pid": pid}, headers=headers).text
+
+def test_lobby_values_are_escaped():
+    res = client.post("/practice", data={"name": "Solo"}, follow_redirects=False)
+    code = res.headers["location"].split("/")[-1].split("?")[0]
+    page = client.get(f"/lobby/{code}", params={"pid": '"><script>alert(1)</script>'})
+    assert "<script>alert(1)</script>" not in page.text
+    assert 'value="&quot;&gt;&lt;script&gt;' in page.text
+    assert 'style="display: none;"' in page.text
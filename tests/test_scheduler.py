@@ -0,0 +1,82 @@
+import pytest
+import asyncio
+from scheduler import TickScheduler
+
+@pytest.mark.asyncio
+async def test_refuses_duplicate_registration():
+    scheduler = TickScheduler(interval=0.05)
+
+    async def tick(key):
+        return True
+
+    assert scheduler.register("ABCD", tick) == True
+    assert scheduler.register("ABCD", tick) == False
+    assert len(scheduler) == 1
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_ticks_are_drift_compensated():
+    scheduler = TickScheduler(interval=0.05)
+    loop = asyncio.get_running_loop()
+    stamps = []
+
+    async def tick(key):
+        stamps.append(loop.time())
+        # Processing time must not push later ticks back
+        await asyncio.sleep(0.02)
+        return len(stamps) < 6
+
+    scheduler.register("ABCD", tick)
+    await asyncio.sleep(0.4)
+
+    assert len(stamps) == 6
+    # Total span stays on the 50ms grid instead of growing by 20ms per tick
+    assert stamps[-1] - stamps[0] == pytest.approx(0.25, abs=0.03)
+    assert "ABCD" not in scheduler
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_counts_overruns():
+    scheduler = TickScheduler(interval=0.02)
+    calls = []
+
+    async def slow_tick(key):
+        calls.append(key)
+        await asyncio.sleep(0.07)
+        return len(calls) < 2
+
+    scheduler.register("SLOW", slow_tick)
+    await asyncio.sleep(0.25)
+
+    assert scheduler.overruns >= 2
+    assert sum(scheduler.tick_overruns) == scheduler.overruns
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_failing_tick_unregisters():
+    scheduler = TickScheduler(interval=0.01)
+
+    async def broken(key):
+        raise RuntimeError("boom")
+
+    scheduler.register("BRKN", broken)
+    await asyncio.sleep(0.05)
+    assert "BRKN" not in scheduler
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_per_job_interval():
+    scheduler = TickScheduler(interval=1.0)
+    counts = {"fast": 0, "slow": 0}
+
+    async def tick(key):
+        counts[key] += 1
+        return True
+
+    scheduler.register("fast", tick, interval=0.02)
+    scheduler.register("slow", tick)
+    await asyncio.sleep(0.15)
+
+    assert counts["slow"] == 1
+    assert counts["fast"] >= 6
+    await scheduler.stop()
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from main import gm
+from spawnplan import Mulberry32, fnv1a, plan_word, spawn_duration, spawn_pools
+
+PIDS = ["abc12345", "zz9xk0q1"]
+
+def test_plan_is_a_pure_function_of_seed_tick_and_player():
+    a = plan_word(gm.words, "easy", 1234, 7, PIDS[0], 2.0)
+    assert a == plan_word(gm.words, "easy", 1234, 7, PIDS[0], 2.0)
+    assert a["id"] == f"t7-{PIDS[0]}" and "spawn_time" not in a
+    # Other ticks, players and seeds get their own draws
+    others = [plan_word(gm.words, "easy", 1234, 8, PIDS[0], 2.0), plan_word(gm.words, "easy", 1234, 7, PIDS[1], 2.0),
+              plan_word(gm.words, "easy", 4321, 7, PIDS[0], 2.0)]
+    assert all((w["text"], w["x"]) != (a["text"], a["x"]) for w in others)
+
+def test_plan_follows_the_unseeded_distribution():
+    words = [plan_word(gm.words, "easy", 99, tick, pid, 2.0) for tick in range(1, 501) for pid in PIDS]
+    special = [w for w in words if w["is_special"]]
+    assert 50 <= len(special) <= 150
+    assert all(w["duration"] == 5.0 and w["x"] in (-6, 6) and 2 <= w["y"] <= 8 for w in special)
+    normal = [w for w in words if not w["is_special"]]
+    assert all(-4 <= w["x"] <= 4 and w["vy"] is None for w in normal)
+    # Tick n counts as n intervals into the game: 10s at the start, down to the 3s floor after three minutes
+    assert spawn_duration(0, 2.0) == 10.0 and spawn_duration(4, 2.0) == 10.0 - 8 / 18 * 7
+    assert {w["duration"] for w in normal if w["id"].startswith("t500-")} == {3.0}
+
+def test_mulberry32_reference_values():
+    # Pinned, so a seed schedule can't change silently between releases
+    rng = Mulberry32(0)
+    assert [int(rng.random() * 2**32) for _ in range(3)] == [1144304738, 1416247, 958946056]
+    assert fnv1a("a") == 0xE40C292C
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+@pytest.mark.parametrize("difficulty", ["easy", "hard", "insane"])
+def test_js_generator_matches_python(difficulty):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "game_client.js")) as f:
+        source = f.read()
+    start = source.index("function fnv1a")
+    end = source.index("\n}\n", source.index("function planWord")) + 3
+    seed, interval, ticks = 3141592653, 1.7, range(1, 301)
+
+    script = source[start:end] + (
+        "const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));\n"
+        "const out = [];\n"
+        "for (let tick = input.first; tick <= input.last; tick++)\n"
+        "    input.pids.forEach(pid => out.push(planWord(input.pools, input.seed, input.interval, tick, pid)));\n"
+        "console.log(JSON.stringify(out));\n"
+    )
+    data = {"pools": spawn_pools(gm.words, difficulty), "seed": seed, "interval": interval,
+            "first": ticks[0], "last": ticks[-1], "pids": PIDS}
+    out = subprocess.run(["node", "-e", script], input=json.dumps(data), capture_output=True, text=True, check=True).stdout
+    expected = [plan_word(gm.words, difficulty, seed, tick, pid, interval) for tick in ticks for pid in PIDS]
+    assert json.loads(out) == json.loads(json.dumps(expected))
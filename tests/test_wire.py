@@ -0,0 +1,95 @@
+import pytest
+import json
+import os
+import shutil
+import subprocess
+import wire
+
+PID = "ab12cd34"
+
+EVENTS = [
+    {"type": "word_spawn", "target_pid": PID, "word": {"text": "hello", "id": "w0000001", "x": -3.217, "y": 10.0,
+     "vx": 0.0, "vy": None, "spawn_time": 1700000000.123, "duration": 7.5, "is_special": False}},
+    {"type": "word_spawn", "target_pid": PID, "word": {"text": "@ÉCLAIR", "id": "w0000002", "x": 6, "y": 4.25,
+     "vx": -0.05, "vy": 0.0, "spawn_time": 1700000000.5, "duration": 5.0, "is_special": True}},
+    {"type": "word_cleared", "player_id": PID, "word_id": "w0000001", "new_power": 0, "triggered_power": "barrage", "combo": 3},
+    {"type": "word_cleared", "player_id": PID, "word_id": "w0000002", "new_power": 60, "triggered_power": None, "combo": 0},
+    {"type": "word_expired", "target_pid": PID, "word_id": "w0000003"},
+    {"type": "health_update", "player_id": PID, "new_health": 90, "combo": 0},
+    {"type": "health_update", "player_id": PID, "new_health": 80},
+    {"type": "status_change", "status": "finished"},
+    {"type": "game_over", "loser": PID},
+    {"type": "effect_shake", "target_pid": PID, "duration": 3000},
+    {"type": "effect_blind", "target_pid": PID, "duration": 5000},
+    {"type": "effect_clear_screen", "target_pid": PID},
+    {"type": "player_joined", "player": {"name": "Rival", "id": "zz99yy88", "health": 100}},
+]
+
+def expected(event):
+    # What survives the trip: spawn_time is dropped and coordinates are quantized
+    if event["type"] != "word_spawn":
+        return event
+    word = {k: v for k, v in event["word"].items() if k != "spawn_time"}
+    word["x"] = round(word["x"] * 1000) / 1000
+    return {**event, "word": word}
+
+def test_round_trip():
+    frame = wire.encode_frame(json.dumps({"type": "batch", "events": EVENTS}))
+    assert wire.decode_frame(frame) == [expected(e) for e in EVENTS]
+
+def test_sequence_numbers_round_trip():
+    numbered = [{"seq": 41 + i, **e} for i, e in enumerate(EVENTS[:3])] + [{"seq": 90, **EVENTS[5]}, EVENTS[7]]
+    frame = wire.encode_events(numbered, sequenced=True)
+    # One SEQ record for the run of three, one for the jump, one to stop numbering
+    assert frame.count(bytes([wire.TAG_SEQ])) >= 3
+    assert wire.decode_frame(frame) == [expected(e) for e in numbered]
+    # The previous protocol version leaves them out
+    assert wire.decode_frame(wire.encode_legacy_frame(json.dumps(numbered[0]))) == [expected(EVENTS[0])]
+
+def test_binary_is_smaller_than_json():
+    for event in EVENTS[:-1]:
+        assert len(wire.encode_frame(json.dumps(event))) < len(json.dumps(event).encode()) / 2
+
+def test_values_outside_the_layout_fall_back_to_json():
+    odd = [
+        {"type": "word_spawn", "target_pid": PID, "word": {"text": "far", "id": "w1", "x": 1e6, "y": 0, "vx": 0,
+         "vy": None, "duration": 1.0, "is_special": False}},
+        {"type": "health_update", "player_id": PID, "new_health": 1.5},
+        {"type": "brand_new_event", "data": [1, 2, 3]},
+    ]
+    frame = wire.encode_events(odd)
+    assert frame[0] == wire.TAG_JSON
+    assert wire.decode_frame(frame) == odd
+
+def test_spawn_ticks_are_compact_in_version_2_only():
+    tick = {"seq": 3, "type": "spawn_tick", "tick": 70000, "targets": ["abc12345", "zz9xk0q1"]}
+    frame = wire.encode_events([tick], sequenced=True)
+    assert wire.decode_frame(frame) == [tick] and len(frame) < 30
+    assert frame[5] == wire.TAG_SPAWN_TICK
+    assert wire.encode_events([tick])[0] == wire.TAG_JSON
+    # The status change that starts a seeded game keeps its seed
+    start = {"type": "status_change", "status": "playing", "spawn_seed": 12345, "spawn_interval": 2.0}
+    assert wire.decode_frame(wire.encode_events([start], sequenced=True)) == [start]
+
+def test_negotiation():
+    assert wire.negotiate([wire.JSON_PROTOCOL, wire.BINARY_PROTOCOL]) == wire.BINARY_PROTOCOL
+    assert wire.negotiate([wire.LEGACY_BINARY_PROTOCOL, wire.BINARY_PROTOCOL]) == wire.BINARY_PROTOCOL
+    assert wire.negotiate([wire.LEGACY_BINARY_PROTOCOL, wire.JSON_PROTOCOL]) == wire.LEGACY_BINARY_PROTOCOL
+    assert wire.negotiate([wire.JSON_PROTOCOL]) == wire.JSON_PROTOCOL
+    assert wire.negotiate([]) is None
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_js_decoder_matches_python():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "game_client.js")) as f:
+        source = f.read()
+    start = source.index("const textDecoder")
+    end = source.index("\n}\n", source.index("function decodeFrame")) + 3
+    frame = wire.encode_events([{"seq": 7 + i, **e} for i, e in enumerate(EVENTS)], sequenced=True)
+
+    script = source[start:end] + (
+        "const buf = Buffer.from(process.argv[1], 'hex');\n"
+        "console.log(JSON.stringify(decodeFrame(buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.length))));\n"
+    )
+    out = subprocess.run(["node", "-e", script, frame.hex()], capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == wire.decode_frame(frame)
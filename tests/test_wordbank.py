@@ -0,0 +1,71 @@
+import random
+import os
+import time
+from wordbank import WordBank, WordPool, INSANE_SYMBOLS
+
+EASY = ["CAT", "DOG", "HOUSE", "GARDEN", "CAT"]
+HARD = ["ELEPHANT", "ALGORITHM", "MOUNTAINS", "TELESCOPE"]
+
+def test_pool_indexes_across_length_buckets():
+    pool = WordPool.from_words(EASY)
+    assert len(pool) == 4
+    assert sorted(pool) == ["CAT", "DOG", "GARDEN", "HOUSE"]
+    assert sorted(pool[i] for i in range(len(pool))) == sorted(pool)
+    # Two buckets of three letters share one string
+    assert pool.blobs[pool.lengths.index(3)] == "CATDOG"
+
+def test_sampling_matches_difficulty_and_tier():
+    bank = WordBank.from_lists(EASY, HARD)
+    rng = random.Random(1)
+    for _ in range(200):
+        assert bank.sample("easy", rng=rng) in EASY
+        assert bank.sample("hard", rng=rng) in HARD
+        assert 5 <= len(bank.sample("easy", bonus=True, rng=rng)) <= 8
+        assert 8 <= len(bank.sample("hard", bonus=True, rng=rng)) <= 10
+
+def test_insane_words_carry_one_symbol():
+    bank = WordBank.from_lists(EASY, HARD)
+    bonus_hard = set(bank.pools["bonus_hard"])
+    rng = random.Random(2)
+    seen = set()
+    for _ in range(500):
+        word = bank.sample("insane", rng=rng)
+        if word[0] in INSANE_SYMBOLS:
+            seen.add(("start", word[0]))
+            assert word[1:] in bonus_hard
+        else:
+            seen.add(("end", word[-1]))
+            assert word[-1] in INSANE_SYMBOLS and word[:-1] in bonus_hard
+    assert len(seen) == 2 * len(INSANE_SYMBOLS)
+
+def test_avoids_words_already_on_screen():
+    bank = WordBank.from_lists(EASY, HARD)
+    rng = random.Random(3)
+    on_screen = {"CAT", "DOG", "HOUSE"}
+    assert all(bank.sample("easy", avoid=on_screen, rng=rng) == "GARDEN" for _ in range(50))
+    # A full screen still yields a word
+    assert bank.sample("easy", avoid=set(EASY + ["GARDEN", "HOUSE"]), rng=rng) in EASY + ["GARDEN", "HOUSE"]
+
+def test_empty_lists_fall_back_to_defaults():
+    bank = WordBank.from_lists([], [])
+    assert len(bank.pools["easy"]) > 0
+    assert len(bank.pools["bonus_hard"]) > 0
+
+def test_snapshot_round_trip(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "easy_words.txt").write_text("\n".join(EASY))
+    (data / "hard_words.txt").write_text("\n".join(HARD))
+    bank = WordBank.load(str(data))
+
+    snapshot = str(tmp_path / "words.bank")
+    bank.write_snapshot(snapshot)
+    loaded = WordBank.load(str(data), snapshot)
+    for name, pool in bank.pools.items():
+        assert list(loaded.pools[name]) == list(pool)
+
+    # Edited word lists win over an older snapshot
+    later = time.time() + 10
+    (data / "easy_words.txt").write_text("ZEBRA\n")
+    os.utime(data / "easy_words.txt", (later, later))
+    assert list(WordBank.load(str(data), snapshot).pools["easy"]) == ["ZEBRA"]
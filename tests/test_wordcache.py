@@ -0,0 +1,96 @@
+import pytest
+import asyncio
+import json
+from main import gm
+from wordcache import WordCache, GameWords, WordCacheMismatch
+
+requires_redis = pytest.mark.skipif(gm.redis is None, reason="the cache fronts the Redis backend")
+
+def event(seq, kind, **fields):
+    return json.dumps({"seq": seq, "type": kind, **fields})
+
+def test_events_apply_in_order_and_a_gap_marks_the_entry_stale():
+    cache = WordCache(limit=2)
+    cache.track("AAAA", GameWords(3, {"p1": {"w1": {"id": "w1", "text": "ALPHA"}}}))
+    cache.observe("AAAA", event(2, "word_expired", target_pid="p1", word_id="w1"))  # Already reflected
+    cache.observe("AAAA", event(4, "word_spawn", target_pid="p1", word={"id": "w2", "text": "BRAVO"}))
+    cache.observe("AAAA", event(5, "word_cleared", player_id="p1", word_id="w1"))
+    assert cache.get("AAAA", 5).texts("p1") == {"BRAVO"}
+    assert cache.get("AAAA", 6) is None
+
+    cache.observe("AAAA", event(7, "word_expired", target_pid="p1", word_id="w2"))
+    assert cache.get("AAAA") is None
+
+def test_texts_are_counted_per_player():
+    entry = GameWords(0, {"p1": {"w1": {"id": "w1", "text": "ALPHA"}, "w2": {"id": "w2", "text": "ALPHA"}}})
+    entry.remove("p1", "w1")
+    assert entry.has_text("p1", "ALPHA") and not entry.has_text("p2", "ALPHA")
+    entry.put("p1", {"id": "w2", "text": "BRAVO"})  # Same id again replaces the word
+    assert entry.texts("p1") == {"BRAVO"}
+    entry.clear("p1")
+    assert not entry.has_text("p1", "BRAVO")
+
+def test_least_recently_used_games_are_evicted():
+    cache = WordCache(limit=2)
+    for code in ("AAAA", "BBBB"):
+        cache.track(code, GameWords(0, {}))
+    cache.get("AAAA")
+    evicted = cache.track("CCCC", GameWords(0, {}))
+    assert len(evicted) == 1 and "BBBB" not in cache and "AAAA" in cache
+
+async def caught_up(code):
+    for _ in range(50):
+        seq = int(await gm.redis.hget(f"game:{code}", "seq") or 0)
+        if gm.word_cache.get(code, seq) is not None:
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+@requires_redis
+@pytest.mark.asyncio
+async def test_owner_serves_words_locally_and_stays_consistent():
+    gm.word_cache.check = True
+    try:
+        code, host = await gm.create_game("Host", "easy", [])
+        rival = await gm.join_game(code, "Rival")
+        await gm.set_game_status(code, "playing")
+        hits = gm.metrics.word_cache.labels("hit")
+
+        assert await gm.tick_game(code)
+        assert await caught_up(code)
+        before = hits.value
+        assert await gm.tick_game(code)
+        assert hits.value == before + 1
+
+        # Submits from anywhere reach the cache through the events; misses stop at the cache
+        text = next(iter(gm.word_cache.get(code).texts(host)))
+        assert await gm.submit_word(code, host, text)
+        assert await caught_up(code)
+        assert gm.word_cache.get(code).texts(host) == {w["text"] for w in (await gm.get_words(code, host)).values()}
+        misses = gm.metrics.submits.labels("miss").value
+        assert not await gm.submit_word(code, rival, "NOT ON SCREEN")
+        assert gm.metrics.submits.labels("miss").value == misses + 1
+        await gm.verify_word_cache(code)
+
+        # A word whose event has not reached this process yet still goes to the script
+        await gm.add_word(code, rival, {"text": "IN FLIGHT", "id": "inflight", "x": 0, "spawn_time": 0, "duration": 1e10})
+        await gm.redis.hincrby(f"game:{code}", "seq", 1)
+        assert not gm.word_cache.get(code).has_text(rival, "IN FLIGHT")
+        assert await gm.submit_word(code, rival, "IN FLIGHT")
+        # That event never went out, so the cache saw a gap and the next tick loads it again
+        assert await gm.tick_game(code)
+        assert await caught_up(code)
+
+        # A write that bypassed the events is caught by the check mode
+        wid = next(iter(gm.word_cache.get(code).players[rival]))
+        await gm.redis.hdel(f"game:{code}:{rival}:words", wid)
+        with pytest.raises(WordCacheMismatch):
+            await gm.verify_word_cache(code)
+
+        # A finished game leaves the cache with its subscription
+        await gm.set_game_status(code, "finished")
+        assert not await gm.tick_game(code)
+        assert code not in gm.word_cache
+        assert gm.events.subscriber_count(f"game:{code}:events") == 0
+    finally:
+        gm.word_cache.check = False
@@ -0,0 +1,213 @@
+import json
+import struct
+from typing import Dict, List, Optional
+
+# Compact binary encoding of the game websocket events, negotiated per socket as a WebSocket subprotocol.
+# Clients that don't offer it (or offer only JSON) keep getting the JSON text frames unchanged.
+#
+# A binary frame is a sequence of records, one per event, in publish order; a batch frame simply holds several.
+# Every record starts with a one byte type tag. Strings are a u8 length plus UTF-8 bytes, integers are
+# little-endian, and coordinates are quantized to fixed point. Events without a layout (game_state,
+# player_joined, anything new) travel as a JSON record, so the binary protocol never loses a message type.
+#
+# spawn_time is server-side bookkeeping for expiry and is not sent in binary frames.
+#
+# Version 2 adds event sequence numbers: a SEQ record (u32) sets the number of the next record, and each record
+# after it counts up by one, so a run of consecutive events costs five bytes per frame. SEQ 0 means the
+# records that follow are unnumbered. Version 1 frames leave the numbers out.
+#
+# Also new in version 2: the SPAWN_TICK record of seeded games (spawnplan.py), a u32 tick and a u8 count of
+# target player ids. Version 1 frames carry it as JSON.
+
+BINARY_PROTOCOL = "typingduel.bin.2"
+LEGACY_BINARY_PROTOCOL = "typingduel.bin.1"
+JSON_PROTOCOL = "typingduel.json"
+
+TAG_JSON = 0
+TAG_WORD_SPAWN = 1
+TAG_WORD_CLEARED = 2
+TAG_WORD_EXPIRED = 3
+TAG_HEALTH_UPDATE = 4
+TAG_STATUS_CHANGE = 5
+TAG_GAME_OVER = 6
+TAG_EFFECT_SHAKE = 7
+TAG_EFFECT_BLIND = 8
+TAG_EFFECT_CLEAR_SCREEN = 9
+TAG_SEQ = 10
+TAG_SPAWN_TICK = 11
+
+# Positions in 1/1000 units, velocities (per frame) in 1/10000 units, durations in ms
+POS_SCALE = 1000
+VEL_SCALE = 10000
+NO_VALUE = -32768
+
+SPECIAL_FLAG = 1
+VY_FLAG = 2
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_SPAWN = struct.Struct("<BhhhhH")
+_CLEARED = struct.Struct("<BH")
+_HEALTH = struct.Struct("<hH")
+
+def negotiate(subprotocols: List[str]) -> Optional[str]:
+    # The client lists what it understands; binary wins when offered, the newest version first
+    for protocol in (BINARY_PROTOCOL, LEGACY_BINARY_PROTOCOL):
+        if protocol in subprotocols:
+            return protocol
+    if JSON_PROTOCOL in subprotocols:
+        return JSON_PROTOCOL
+    return None
+
+def _str(value) -> bytes:
+    data = ("" if value is None else str(value)).encode()
+    return _U8.pack(len(data)) + data
+
+def _fixed(value, scale) -> int:
+    if value is None:
+        return NO_VALUE
+    quantized = round(float(value) * scale)
+    if not -32767 <= quantized <= 32767:
+        raise ValueError("out of range")
+    return quantized
+
+def _encode_event(event: Dict, sequenced: bool) -> bytes:
+    kind = event.get("type")
+    if kind == "word_spawn":
+        w = event["word"]
+        flags = (SPECIAL_FLAG if w.get("is_special") else 0) | (VY_FLAG if w.get("vy") is not None else 0)
+        return (_U8.pack(TAG_WORD_SPAWN) + _str(event["target_pid"]) + _str(w["id"]) + _str(w["text"])
+                + _SPAWN.pack(flags, _fixed(w["x"], POS_SCALE), _fixed(w["y"], POS_SCALE),
+                              _fixed(w.get("vx") or 0.0, VEL_SCALE), _fixed(w.get("vy"), VEL_SCALE),
+                              round(float(w["duration"]) * 1000)))
+    if kind == "word_cleared":
+        return (_U8.pack(TAG_WORD_CLEARED) + _str(event["player_id"]) + _str(event["word_id"])
+                + _CLEARED.pack(event["new_power"], event.get("combo") or 0) + _str(event.get("triggered_power")))
+    if kind == "word_expired":
+        return _U8.pack(TAG_WORD_EXPIRED) + _str(event["target_pid"]) + _str(event["word_id"])
+    if kind == "health_update":
+        combo = event.get("combo")
+        return (_U8.pack(TAG_HEALTH_UPDATE) + _str(event["player_id"])
+                + _HEALTH.pack(event["new_health"], 0xFFFF if combo is None else combo))
+    if kind == "status_change":
+        # The status change that starts a seeded game also carries its seed
+        if "spawn_seed" in event:
+            raise ValueError(kind)
+        return _U8.pack(TAG_STATUS_CHANGE) + _str(event["status"])
+    if kind == "game_over":
+        return _U8.pack(TAG_GAME_OVER) + _str(event["loser"])
+    if kind == "effect_shake":
+        return _U8.pack(TAG_EFFECT_SHAKE) + _str(event["target_pid"]) + _U16.pack(event["duration"])
+    if kind == "effect_blind":
+        return _U8.pack(TAG_EFFECT_BLIND) + _str(event["target_pid"]) + _U16.pack(event["duration"])
+    if kind == "effect_clear_screen":
+        return _U8.pack(TAG_EFFECT_CLEAR_SCREEN) + _str(event["target_pid"])
+    if kind == "spawn_tick" and sequenced:
+        targets = event["targets"]
+        return _U8.pack(TAG_SPAWN_TICK) + _U32.pack(event["tick"]) + _U8.pack(len(targets)) + b"".join(map(_str, targets))
+    raise ValueError(kind)
+
+def _encode_json(event: Dict) -> bytes:
+    data = json.dumps(event).encode()
+    return _U8.pack(TAG_JSON) + _U32.pack(len(data)) + data
+
+def encode_events(events: List[Dict], sequenced: bool = False) -> bytes:
+    records = []
+    expected = None
+    for event in events:
+        if sequenced:
+            seq = event.get("seq")
+            if seq != expected:
+                records.append(_U8.pack(TAG_SEQ) + _U32.pack(seq or 0))
+            expected = seq + 1 if seq else None
+            event = {k: v for k, v in event.items() if k != "seq"}
+        try:
+            records.append(_encode_event(event, sequenced))
+        except (KeyError, TypeError, ValueError, struct.error):
+            # No layout, or a value the layout can't hold exactly enough: send it as JSON
+            records.append(_encode_json(event))
+    return b"".join(records)
+
+def encode_frame(data: str, sequenced: bool = True) -> bytes:
+    # Takes the JSON text published on the game channel, single event or batch
+    msg = json.loads(data)
+    return encode_events(msg["events"] if msg.get("type") == "batch" else [msg], sequenced)
+
+def encode_legacy_frame(data: str) -> bytes:
+    return encode_frame(data, sequenced=False)
+
+class _Reader:
+    def __init__(self, buf: bytes):
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, fmt: struct.Struct):
+        values = fmt.unpack_from(self.buf, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def str(self) -> str:
+        (n,) = self.unpack(_U8)
+        self.pos += n
+        return self.buf[self.pos - n:self.pos].decode()
+
+def decode_frame(buf: bytes) -> List[Dict]:
+    # Mirror of the decoder in game_client.js, used by tests and the benchmark
+    r = _Reader(buf)
+    events = []
+    seq = None
+    while r.pos < len(buf):
+        (tag,) = r.unpack(_U8)
+        if tag == TAG_SEQ:
+            (seq,) = r.unpack(_U32)
+            seq = seq or None
+            continue
+        if tag == TAG_JSON:
+            (n,) = r.unpack(_U32)
+            r.pos += n
+            events.append(json.loads(buf[r.pos - n:r.pos]))
+        elif tag == TAG_WORD_SPAWN:
+            pid, wid, text = r.str(), r.str(), r.str()
+            flags, x, y, vx, vy, duration = r.unpack(_SPAWN)
+            events.append({"type": "word_spawn", "target_pid": pid, "word": {
+                "id": wid, "text": text, "x": x / POS_SCALE, "y": y / POS_SCALE, "vx": vx / VEL_SCALE,
+                "vy": vy / VEL_SCALE if flags & VY_FLAG else None, "duration": duration / 1000,
+                "is_special": bool(flags & SPECIAL_FLAG)}})
+        elif tag == TAG_WORD_CLEARED:
+            pid, wid = r.str(), r.str()
+            power, combo = r.unpack(_CLEARED)
+            events.append({"type": "word_cleared", "player_id": pid, "word_id": wid, "new_power": power,
+                           "combo": combo, "triggered_power": r.str() or None})
+        elif tag == TAG_WORD_EXPIRED:
+            events.append({"type": "word_expired", "target_pid": r.str(), "word_id": r.str()})
+        elif tag == TAG_HEALTH_UPDATE:
+            pid = r.str()
+            health, combo = r.unpack(_HEALTH)
+            event = {"type": "health_update", "player_id": pid, "new_health": health}
+            if combo != 0xFFFF:
+                event["combo"] = combo
+            events.append(event)
+        elif tag == TAG_STATUS_CHANGE:
+            events.append({"type": "status_change", "status": r.str()})
+        elif tag == TAG_GAME_OVER:
+            events.append({"type": "game_over", "loser": r.str()})
+        elif tag in (TAG_EFFECT_SHAKE, TAG_EFFECT_BLIND):
+            pid = r.str()
+            (duration,) = r.unpack(_U16)
+            kind = "effect_shake" if tag == TAG_EFFECT_SHAKE else "effect_blind"
+            events.append({"type": kind, "target_pid": pid, "duration": duration})
+        elif tag == TAG_EFFECT_CLEAR_SCREEN:
+            events.append({"type": "effect_clear_screen", "target_pid": r.str()})
+        elif tag == TAG_SPAWN_TICK:
+            tick, count = r.unpack(_U32)[0], r.unpack(_U8)[0]
+            events.append({"type": "spawn_tick", "tick": tick, "targets": [r.str() for _ in range(count)]})
+        else:
+            raise ValueError(f"Unknown record tag {tag}")
+        if seq is not None:
+            events[-1]["seq"] = seq
+            seq += 1
+    return events
+
+# Encoders the dispatcher applies once per published message, keyed by negotiated subprotocol
+CODECS = {BINARY_PROTOCOL: encode_frame, LEGACY_BINARY_PROTOCOL: encode_legacy_frame}
@@ -0,0 +1,187 @@
+import bisect
+import os
+import random
+import struct
+import sys
+from typing import Container, Dict, Iterable, List, Optional
+
+# Word pools loaded once into length buckets. Every bucket is a single string of same-length words laid
+# end to end, so a pool is a handful of objects instead of thousands, and the i-th word of a bucket is
+# a slice at i * length. Sampling draws one index over the whole pool and finds its bucket among the
+# few cumulative offsets.
+
+INSANE_SYMBOLS = "!@#$%^&*?"
+
+# Random draws before scanning for a word that is not on screen; screens hold a few dozen words, pools hundreds
+MAX_REDRAWS = 8
+
+SNAPSHOT_MAGIC = b"WBK1"
+
+DEFAULT_WORDS = ["HELLO", "WORLD", "TYPING", "DUEL", "FAST", "HTML", "CODE", "PYTHON", "REDIS", "THREEJS"]
+
+# Extra words for Hard Bonus (8-10 chars)
+EXTRA_HARD_WORDS = [
+    "COMPUTER", "KEYBOARD", "DEVELOPER", "ENGINEER", "DATABASE",
+    "FRONTEND", "BACKEND", "PLATFORM", "VARIABLE", "FUNCTION",
+    "ITERATION", "PROTOCOL", "SECURITY", "SOFTWARE", "HARDWARE",
+    "INTERNET", "WIRELESS", "GRAPHICS", "OVERLOAD", "TERMINAL"
+]
+
+class WordPool:
+    def __init__(self, buckets: Dict[int, str]):
+        # length -> concatenated words of that length
+        self.lengths: List[int] = sorted(buckets)
+        self.blobs: List[str] = [buckets[n] for n in self.lengths]
+        self.offsets: List[int] = []
+        total = 0
+        for n, blob in zip(self.lengths, self.blobs):
+            self.offsets.append(total)
+            total += len(blob) // n
+        self.size = total
+
+    @classmethod
+    def from_words(cls, words: Iterable[str]) -> "WordPool":
+        buckets: Dict[int, List[str]] = {}
+        seen = set()
+        for word in words:
+            if word and word not in seen:
+                seen.add(word)
+                buckets.setdefault(len(word), []).append(word)
+        return cls({n: "".join(group) for n, group in buckets.items()})
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i: int) -> str:
+        b = bisect.bisect_right(self.offsets, i) - 1
+        n = self.lengths[b]
+        start = (i - self.offsets[b]) * n
+        return self.blobs[b][start:start + n]
+
+    def __iter__(self):
+        for n, blob in zip(self.lengths, self.blobs):
+            for start in range(0, len(blob), n):
+                yield blob[start:start + n]
+
+class WordBank:
+    def __init__(self, pools: Dict[str, WordPool]):
+        self.pools = pools
+
+    @classmethod
+    def from_lists(cls, easy: List[str], hard: List[str]) -> "WordBank":
+        # Same pools GameManager used to rebuild by hand; sorting keeps the bonus pools stable across runs
+        all_words = sorted(set(easy + hard + DEFAULT_WORDS + EXTRA_HARD_WORDS))
+        bonus_easy = [w for w in all_words if 5 <= len(w) <= 8] or ["BONUS"]
+        bonus_hard = [w for w in all_words if 8 <= len(w) <= 10] or ["SUPERBONUS"]
+        return cls({
+            "easy": WordPool.from_words(easy or DEFAULT_WORDS),
+            "hard": WordPool.from_words(hard or DEFAULT_WORDS),
+            "bonus_easy": WordPool.from_words(bonus_easy),
+            "bonus_hard": WordPool.from_words(bonus_hard),
+        })
+
+    @classmethod
+    def from_files(cls, easy_path: str, hard_path: str) -> "WordBank":
+        return cls.from_lists(_read_words(easy_path), _read_words(hard_path))
+
+    @classmethod
+    def load(cls, data_dir: str = "data", snapshot: Optional[str] = None) -> "WordBank":
+        # A prebuilt snapshot is used while it is newer than the word lists it came from
+        easy_path = os.path.join(data_dir, "easy_words.txt")
+        hard_path = os.path.join(data_dir, "hard_words.txt")
+        if snapshot and os.path.exists(snapshot):
+            sources = [os.path.getmtime(p) for p in (easy_path, hard_path) if os.path.exists(p)]
+            if os.path.getmtime(snapshot) >= max(sources, default=0):
+                try:
+                    return cls.read_snapshot(snapshot)
+                except (OSError, ValueError, struct.error) as e:
+                    print(f"Ignoring word bank snapshot {snapshot}: {e}")
+        return cls.from_files(easy_path, hard_path)
+
+    def write_snapshot(self, path: str):
+        # Layout: magic, pool count, then per pool its name, bucket count and (length, count, bytes) per bucket
+        out = [SNAPSHOT_MAGIC, struct.pack("<H", len(self.pools))]
+        for name, pool in self.pools.items():
+            encoded = name.encode()
+            out.append(struct.pack("<B", len(encoded)) + encoded + struct.pack("<H", len(pool.lengths)))
+            for n, blob in zip(pool.lengths, pool.blobs):
+                data = blob.encode()
+                out.append(struct.pack("<HII", n, len(blob) // n, len(data)) + data)
+        with open(path, "wb") as f:
+            f.write(b"".join(out))
+
+    @classmethod
+    def read_snapshot(cls, path: str) -> "WordBank":
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != SNAPSHOT_MAGIC:
+            raise ValueError("not a word bank snapshot")
+        pos = 4
+        (pool_count,) = struct.unpack_from("<H", data, pos)
+        pos += 2
+        pools = {}
+        for _ in range(pool_count):
+            name_len = data[pos]
+            name = data[pos + 1:pos + 1 + name_len].decode()
+            pos += 1 + name_len
+            (bucket_count,) = struct.unpack_from("<H", data, pos)
+            pos += 2
+            buckets = {}
+            for _ in range(bucket_count):
+                n, count, size = struct.unpack_from("<HII", data, pos)
+                pos += 10
+                blob = data[pos:pos + size].decode()
+                pos += size
+                if len(blob) != n * count:
+                    raise ValueError(f"bucket {n} of pool {name} is truncated")
+                buckets[n] = blob
+            pools[name] = WordPool(buckets)
+        return cls(pools)
+
+    def pool(self, difficulty: str, bonus: bool = False) -> WordPool:
+        if bonus:
+            return self.pools["bonus_hard" if difficulty in ("hard", "insane") else "bonus_easy"]
+        if difficulty == "hard":
+            return self.pools["hard"]
+        if difficulty == "insane":
+            # Base pool is 8-10 chars
+            return self.pools["bonus_hard"]
+        return self.pools["easy"]
+
+    def sample(self, difficulty: str, bonus: bool = False, avoid: Container[str] = (), rng=random) -> str:
+        # Insane words carry one symbol at the start or the end: 18 variants per word, drawn with the word
+        pool = self.pool(difficulty, bonus)
+        variants = 2 * len(INSANE_SYMBOLS) if difficulty == "insane" else 1
+        space = len(pool) * variants
+        for _ in range(MAX_REDRAWS):
+            # random() is several times cheaper than randrange() and uniform enough at these sizes
+            i = int(rng.random() * space)
+            word = _variant(pool, i, variants)
+            if word not in avoid:
+                return word
+        # A nearly full screen: walk on from the last draw, settling for a repeat only if every word is taken
+        for step in range(1, space):
+            candidate = _variant(pool, (i + step) % space, variants)
+            if candidate not in avoid:
+                return candidate
+        return word
+
+def _variant(pool: WordPool, i: int, variants: int) -> str:
+    if variants == 1:
+        return pool[i]
+    i, variant = divmod(i, variants)
+    symbol = INSANE_SYMBOLS[variant >> 1]
+    return symbol + pool[i] if variant & 1 else pool[i] + symbol
+
+def _read_words(path: str) -> List[str]:
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return [line.strip().upper() for line in f if line.strip()]
+    return []
+
+if __name__ == "__main__":
+    # Usage: python wordbank.py [snapshot path] -- builds a snapshot from data/*.txt
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "words.bank")
+    bank = WordBank.from_files(os.path.join("data", "easy_words.txt"), os.path.join("data", "hard_words.txt"))
+    bank.write_snapshot(path)
+    print(f"Wrote {path}: " + ", ".join(f"{name}={len(pool)}" for name, pool in bank.pools.items()))
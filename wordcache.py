@@ -0,0 +1,136 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, KeysView, List, Optional, Tuple
+
+# Active words of the games this process ticks, held next to the durable copy in Redis.
+# Spawns made here are written through; every other change (submits and barrages from other nodes, expiry)
+# arrives as a numbered game event and is applied in order. An entry is valid for the event seq it has
+# reached: a reader that knows the game's current seq uses the entry only when the two agree, and a gap in
+# the numbering (an event this process never saw) marks the entry stale until it is loaded again.
+
+# Games kept; the least recently used entry is dropped first, finished games as soon as they end
+WORD_CACHE_GAMES = int(os.getenv("WORD_CACHE_GAMES", 512))
+
+class WordCacheMismatch(Exception):
+    pass
+
+class GameWords:
+    __slots__ = ("seq", "players", "counts", "stale", "sub")
+
+    def __init__(self, seq: int, players: Dict[str, Dict[str, Dict]], sub=None):
+        self.seq = seq
+        # pid -> word id -> word
+        self.players = players
+        # pid -> text -> words on screen with that text, kept in step so lookups never rebuild a set
+        self.counts: Dict[str, Dict[str, int]] = {}
+        for pid, words in players.items():
+            counts = self.counts[pid] = {}
+            for word in words.values():
+                counts[word["text"]] = counts.get(word["text"], 0) + 1
+        self.stale = False
+        # The watch-only event subscription feeding this entry
+        self.sub = sub
+
+    def texts(self, pid: str) -> KeysView:
+        return self.counts.get(pid, {}).keys()
+
+    def has_text(self, pid: str, text: str) -> bool:
+        return text in self.counts.get(pid, ())
+
+    def put(self, pid: str, word: Dict):
+        self.remove(pid, word["id"])
+        self.players.setdefault(pid, {})[word["id"]] = word
+        counts = self.counts.setdefault(pid, {})
+        counts[word["text"]] = counts.get(word["text"], 0) + 1
+
+    def remove(self, pid: str, wid: str):
+        word = self.players.get(pid, {}).pop(wid, None)
+        if word is not None:
+            counts = self.counts[pid]
+            counts[word["text"]] -= 1
+            if not counts[word["text"]]:
+                del counts[word["text"]]
+
+    def clear(self, pid: str):
+        self.players.get(pid, {}).clear()
+        self.counts.get(pid, {}).clear()
+
+class WordCache:
+    def __init__(self, limit: int = WORD_CACHE_GAMES, check: bool = os.getenv("WORD_CACHE_CHECK", "0") == "1"):
+        self.limit = limit
+        # Consistency check mode: cached reads are compared against Redis and a difference raises
+        self.check = check
+        self.games: "OrderedDict[str, GameWords]" = OrderedDict()
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.games
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def get(self, code: str, seq: Optional[int] = None) -> Optional[GameWords]:
+        entry = self.games.get(code)
+        if entry is None or entry.stale or (seq is not None and entry.seq != seq):
+            return None
+        self.games.move_to_end(code)
+        return entry
+
+    def track(self, code: str, entry: GameWords) -> List[GameWords]:
+        # Returns the entries evicted to make room, whose subscriptions the caller closes
+        previous = self.games.pop(code, None)
+        if previous is not None and previous.sub is not None and entry.sub is None:
+            entry.sub = previous.sub
+        self.games[code] = entry
+        evicted = []
+        while len(self.games) > self.limit:
+            evicted.append(self.games.popitem(last=False)[1])
+        return evicted
+
+    def drop(self, code: str) -> Optional[GameWords]:
+        return self.games.pop(code, None)
+
+    def add(self, code: str, pid: str, word: Dict):
+        # Write-through for spawns made by this process; the event that follows adds it again harmlessly
+        entry = self.games.get(code)
+        if entry is not None:
+            entry.put(pid, word)
+
+    def observe(self, code: str, data: str):
+        entry = self.games.get(code)
+        if entry is None or entry.stale:
+            return
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return
+        for event in msg["events"] if msg.get("type") == "batch" else [msg]:
+            seq = event.get("seq")
+            if seq is None or seq <= entry.seq:
+                continue
+            if seq != entry.seq + 1:
+                entry.stale = True
+                return
+            entry.seq = seq
+            self._apply(entry, event)
+
+    def _apply(self, entry: GameWords, event: Dict):
+        kind = event.get("type")
+        if kind == "word_spawn":
+            entry.put(event["target_pid"], event["word"])
+        elif kind == "word_cleared":
+            entry.remove(event["player_id"], event["word_id"])
+        elif kind == "word_expired":
+            entry.remove(event["target_pid"], event["word_id"])
+        elif kind == "effect_clear_screen":
+            entry.clear(event["target_pid"])
+        elif kind == "player_joined":
+            entry.players.setdefault(event["player"]["id"], {})
+
+def compare(code: str, cached: GameWords, stored: Dict[str, Dict[str, Dict]]):
+    # Word ids per player must agree; the stored copy is the truth
+    for pid in set(cached.players) | set(stored):
+        mine, theirs = set(cached.players.get(pid, {})), set(stored.get(pid, {}))
+        if mine != theirs:
+            raise WordCacheMismatch(f"{code}/{pid}: cached {sorted(mine - theirs)} extra, "
+                                    f"{sorted(theirs - mine)} missing")